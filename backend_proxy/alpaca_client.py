@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Alpaca trading API client for AlphaSphere.
+
+Account and positions are served from short-lived snapshots so dashboard
+polling (many tabs, health checks) costs at most one upstream request per
+resource per ALPACA_SNAPSHOT_TTL. Refreshes are single-flight: concurrent
+callers wait for the one request in progress instead of issuing their own.
+Every snapshot carries an ETag over its content, so routes can answer
+304 Not Modified when a client already holds the same data.
+
+Snapshots are invalidated whenever an order is placed, since fills change
+both account balances and positions. The same goes for order and position
+changes made through the generic proxy.
+
+Batches of orders are validated up front, then dispatched concurrently over
+the pooled session under a client-side rate limit. Every order carries a
+client_order_id (generated when missing), so a retry after a timeout or
+5xx never creates a second order: Alpaca rejects the duplicate and the
+original is looked up instead.
+"""
+
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from response_encoding import content_etag
+
+logger = logging.getLogger(__name__)
+
+# Seconds a snapshot is served without asking Alpaca again
+ALPACA_SNAPSHOT_TTL = float(os.getenv('ALPACA_SNAPSHOT_TTL', '5'))
+# Health checks accept an older snapshot before probing Alpaca themselves
+ALPACA_HEALTH_MAX_AGE = float(os.getenv('ALPACA_HEALTH_MAX_AGE', '30'))
+ALPACA_TIMEOUT = float(os.getenv('ALPACA_TIMEOUT', '10'))
+
+# Batch orders: concurrent requests, requests per minute (Alpaca allows 200), size limit
+ALPACA_ORDER_CONCURRENCY = int(os.getenv('ALPACA_ORDER_CONCURRENCY', '8'))
+ALPACA_RATE_LIMIT = int(os.getenv('ALPACA_RATE_LIMIT', '190'))
+ALPACA_ORDER_RETRIES = 2
+MAX_BATCH_ORDERS = 100
+
+ORDER_SIDES = ('buy', 'sell')
+ORDER_TYPES = ('market', 'limit', 'stop', 'stop_limit', 'trailing_stop')
+TIME_IN_FORCE = ('day', 'gtc', 'opg', 'cls', 'ioc', 'fok')
+MAX_CLIENT_ORDER_ID = 128
+
+# Snapshot resource -> trading API path
+SNAPSHOT_PATHS = {
+    'account': '/v2/account',
+    'positions': '/v2/positions',
+}
+
+# Methods and trading API paths whose success changes the account or positions
+MUTATING_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+ACCOUNT_MUTATION_PATHS = ('v2/orders', 'v2/positions')
+
+def changes_account(method: str, path: str) -> bool:
+    """True for a request that can change account balances or positions"""
+    path = path.strip('/')
+    return method.upper() in MUTATING_METHODS and any(
+        path == prefix or path.startswith(prefix + '/') for prefix in ACCOUNT_MUTATION_PATHS
+    )
+
+def _positive_number(order: Dict[str, Any], field: str, label: str) -> str:
+    if order.get(field) is None:
+        raise ValueError(f"{label}: {field} is required")
+    try:
+        value = float(order[field])
+    except (TypeError, ValueError):
+        raise ValueError(f"{label}: {field} must be a number")
+    if not value > 0:
+        raise ValueError(f"{label}: {field} must be positive")
+    return str(order[field])
+
+def validate_order(order: Any, label: str = 'order') -> Dict[str, Any]:
+    """
+    Check an order's fields before it is sent; raises ValueError. Returns a
+    copy with normalized enums and a client_order_id.
+    """
+    if not isinstance(order, dict):
+        raise ValueError(f"{label} must be an object")
+    order = dict(order)
+    if not str(order.get('symbol') or '').strip():
+        raise ValueError(f"{label}: symbol is required")
+    order['symbol'] = str(order['symbol']).strip().upper()
+
+    for field, allowed in (('side', ORDER_SIDES), ('type', ORDER_TYPES), ('time_in_force', TIME_IN_FORCE)):
+        value = str(order.get(field) or '').lower()
+        if value not in allowed:
+            raise ValueError(f"{label}: {field} must be one of {', '.join(allowed)}")
+        order[field] = value
+
+    if ('qty' in order) == ('notional' in order):
+        raise ValueError(f"{label}: exactly one of qty or notional is required")
+    for field in ('qty', 'notional'):
+        if field in order:
+            order[field] = _positive_number(order, field, label)
+    if order['type'] in ('limit', 'stop_limit'):
+        order['limit_price'] = _positive_number(order, 'limit_price', label)
+    if order['type'] in ('stop', 'stop_limit'):
+        order['stop_price'] = _positive_number(order, 'stop_price', label)
+    if order['type'] == 'trailing_stop':
+        given = [field for field in ('trail_price', 'trail_percent') if order.get(field) is not None]
+        if len(given) != 1:
+            raise ValueError(f"{label}: exactly one of trail_price or trail_percent is required")
+        order[given[0]] = _positive_number(order, given[0], label)
+
+    client_order_id = str(order.get('client_order_id') or uuid.uuid4())
+    if len(client_order_id) > MAX_CLIENT_ORDER_ID:
+        raise ValueError(f"{label}: client_order_id is longer than {MAX_CLIENT_ORDER_ID} characters")
+    order['client_order_id'] = client_order_id
+    return order
+
+class RateLimiter:
+    """Spaces calls evenly so at most `per_minute` start in any minute"""
+
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / max(per_minute, 1)
+        self._lock = Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+class Snapshot:
+    """One fetched resource: its data, content ETag and fetch time"""
+
+    __slots__ = ('data', 'etag', 'fetched_at')
+
+    def __init__(self, data: Any):
+        self.data = data
+        self.etag = content_etag(data)
+        self.fetched_at = time.time()
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+class AlpacaClient:
+    """Trading API access with cached account / positions snapshots"""
+
+    def __init__(self, base_url: str, key_id: Optional[str], secret_key: Optional[str],
+                 ttl: float = ALPACA_SNAPSHOT_TTL):
+        self.base_url = base_url
+        self.ttl = ttl
+        self.session = requests.Session()
+        self.session.headers.update({
+            'APCA-API-KEY-ID': key_id or '',
+            'APCA-API-SECRET-KEY': secret_key or '',
+        })
+        # Enough pooled connections for concurrent batch dispatch
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max(ALPACA_ORDER_CONCURRENCY, 10))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.configured = bool(key_id and secret_key)
+        self.rate_limiter = RateLimiter(ALPACA_RATE_LIMIT)
+        self._lock = Lock()
+        self._snapshots: Dict[str, Snapshot] = {}
+        self._fetch_locks = {resource: Lock() for resource in SNAPSHOT_PATHS}
+        # Bumped by invalidate(); a fetch started before it is not stored
+        self._generation = 0
+        self._stats = {'hits': 0, 'fetches': 0, 'invalidations': 0}
+
+    def _fresh(self, resource: str, max_age: float) -> Optional[Snapshot]:
+        with self._lock:
+            snapshot = self._snapshots.get(resource)
+        if snapshot is not None and snapshot.age < max_age:
+            return snapshot
+        return None
+
+    def get_snapshot(self, resource: str, max_age: Optional[float] = None) -> Snapshot:
+        """
+        Snapshot of 'account' or 'positions' no older than max_age (default:
+        the TTL). Raises requests exceptions when Alpaca can't be reached.
+        """
+        if resource not in SNAPSHOT_PATHS:
+            raise ValueError(f"Unknown Alpaca snapshot: {resource}")
+        max_age = self.ttl if max_age is None else max_age
+
+        snapshot = self._fresh(resource, max_age)
+        if snapshot is not None:
+            with self._lock:
+                self._stats['hits'] += 1
+            return snapshot
+
+        with self._fetch_locks[resource]:
+            # Another caller may have refreshed it while we waited
+            snapshot = self._fresh(resource, max_age)
+            if snapshot is not None:
+                with self._lock:
+                    self._stats['hits'] += 1
+                return snapshot
+
+            with self._lock:
+                generation = self._generation
+                self._stats['fetches'] += 1
+            response = self.session.get(f"{self.base_url}{SNAPSHOT_PATHS[resource]}", timeout=ALPACA_TIMEOUT)
+            response.raise_for_status()
+            snapshot = Snapshot(response.json())
+
+            with self._lock:
+                if generation == self._generation:
+                    self._snapshots[resource] = snapshot
+            return snapshot
+
+    def get_account(self) -> Snapshot:
+        return self.get_snapshot('account')
+
+    def get_positions(self) -> Snapshot:
+        return self.get_snapshot('positions')
+
+    def invalidate(self):
+        """Drop every snapshot (after orders or anything else that changes the account)"""
+        with self._lock:
+            self._snapshots.clear()
+            self._generation += 1
+            self._stats['invalidations'] += 1
+
+    def place_order(self, order_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Submit an order; snapshots are invalidated once Alpaca accepts it"""
+        response = self.session.post(f"{self.base_url}/v2/orders", json=order_data, timeout=ALPACA_TIMEOUT)
+        response.raise_for_status()
+        self.invalidate()
+        return response.json()
+
+    def _submit(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Post one validated order, retrying timeouts, 429s and 5xx with the
+        same client_order_id. Returns a per-order result; never raises.
+        """
+        base = {'client_order_id': order['client_order_id'], 'symbol': order['symbol']}
+        result = base
+        for attempt in range(ALPACA_ORDER_RETRIES + 1):
+            if attempt:
+                time.sleep(0.5 * 2 ** (attempt - 1))
+            result = dict(base)
+            self.rate_limiter.wait()
+            try:
+                response = self.session.post(f"{self.base_url}/v2/orders", json=order, timeout=ALPACA_TIMEOUT)
+            except requests.RequestException as e:
+                result.update({'status': 'failed', 'error': str(e)})
+                continue
+
+            if response.ok:
+                result.update({'status': 'accepted', 'http_status': response.status_code, 'order': response.json()})
+                return result
+            if response.status_code == 429 or response.status_code >= 500:
+                result.update({'status': 'failed', 'http_status': response.status_code, 'error': response.text[:500]})
+                continue
+            if response.status_code == 422 and 'client_order_id' in response.text:
+                # Already placed by an earlier attempt (ours or the client's retry)
+                existing = self._order_by_client_id(order['client_order_id'])
+                if existing is not None:
+                    result.update({'status': 'accepted', 'http_status': 200, 'order': existing, 'duplicate': True})
+                    return result
+            result.update({'status': 'rejected', 'http_status': response.status_code, 'error': response.text[:500]})
+            return result
+        return result
+
+    def _order_by_client_id(self, client_order_id: str) -> Optional[Dict[str, Any]]:
+        self.rate_limiter.wait()
+        try:
+            response = self.session.get(f"{self.base_url}/v2/orders:by_client_order_id",
+                                        params={'client_order_id': client_order_id}, timeout=ALPACA_TIMEOUT)
+        except requests.RequestException:
+            return None
+        return response.json() if response.ok else None
+
+    def place_orders(self, orders: List[Any]) -> Dict[str, Any]:
+        """
+        Validate every order, then submit them concurrently. Nothing is sent
+        if any order is invalid (ValueError). Results keep the input order.
+        """
+        if not isinstance(orders, list) or not orders:
+            raise ValueError("orders must be a non-empty list")
+        if len(orders) > MAX_BATCH_ORDERS:
+            raise ValueError(f"At most {MAX_BATCH_ORDERS} orders per batch")
+        validated = [validate_order(order, f"order {i + 1}") for i, order in enumerate(orders)]
+        client_ids = [order['client_order_id'] for order in validated]
+        if len(set(client_ids)) != len(client_ids):
+            raise ValueError("client_order_id values must be unique within a batch")
+
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=min(ALPACA_ORDER_CONCURRENCY, len(validated))) as pool:
+            results = list(pool.map(self._submit, validated))
+        for i, result in enumerate(results):
+            result['index'] = i
+
+        accepted = sum(1 for r in results if r['status'] == 'accepted')
+        if accepted:
+            self.invalidate()
+        logger.info(f"Batch of {len(results)} orders: {accepted} accepted in {time.time() - started:.2f}s")
+        return {
+            'results': results,
+            'accepted': accepted,
+            'rejected': sum(1 for r in results if r['status'] == 'rejected'),
+            'failed': sum(1 for r in results if r['status'] == 'failed'),
+            'elapsed': round(time.time() - started, 3),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                'ttl': self.ttl,
+                'snapshots': {resource: round(s.age, 2) for resource, s in self._snapshots.items()},
+            }
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Upstream fetching and caching for the generic /alpaca/api/<path> proxy.
+
+Idempotent market-data GETs (bars, trades, quotes, snapshots, ...) are
+cached by upstream URL plus normalized query args, with a TTL per path
+pattern; only paths listed in PROXY_CACHE_TTLS are cached. Concurrent
+identical requests are coalesced: one goes upstream, the others wait for
+its result.
+
+Bodies are kept as the raw upstream bytes, never parsed and re-serialized,
+and relayed with the upstream headers that matter to clients (content type,
+validators, rate-limit state). When the client accepts gzip, the proxy asks
+Alpaca for gzip too and passes the compressed bytes through undecoded.
+Responses larger than ALPACA_PROXY_BUFFER_LIMIT are streamed through to
+the client chunk by chunk and not cached.
+"""
+
+import gzip
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from itertools import chain
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+ALPACA_PROXY_CACHE = os.getenv('ALPACA_PROXY_CACHE', 'true').lower() == 'true'
+# Total cached bytes before least recently used entries are evicted
+ALPACA_PROXY_CACHE_MAX_BYTES = int(os.getenv('ALPACA_PROXY_CACHE_MAX_MB', '64')) * 1024 * 1024
+# Bodies above this are streamed through instead of buffered (and not cached)
+ALPACA_PROXY_BUFFER_LIMIT = int(os.getenv('ALPACA_PROXY_BUFFER_LIMIT', str(4 * 1024 * 1024)))
+ALPACA_PROXY_TIMEOUT = float(os.getenv('ALPACA_PROXY_TIMEOUT', '30'))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Endpoint pattern -> seconds cached; first match wins, unlisted paths are never cached
+PROXY_CACHE_TTLS: List[Tuple[re.Pattern, float]] = [
+    (re.compile(r'(^|/)(bars|trades|quotes)/latest$'), 1),
+    (re.compile(r'(^|/)snapshots?$'), 2),
+    (re.compile(r'(^|/)bars$'), 60),
+    (re.compile(r'(^|/)(trades|quotes)$'), 30),
+    (re.compile(r'(^|/)clock$'), 5),
+    (re.compile(r'(^|/)(calendar|assets)(/[^/]+)?$'), 3600),
+]
+
+# Upstream headers relayed to the client
+RELAYED_HEADERS = (
+    'Content-Type', 'Content-Encoding', 'ETag', 'Last-Modified',
+    'X-RateLimit-Limit', 'X-RateLimit-Remaining', 'X-RateLimit-Reset', 'X-Request-ID',
+)
+
+# Query args holding comma-separated symbol lists (order doesn't change the response)
+SYMBOL_LIST_ARGS = ('symbols',)
+
+# Shared connection pool for proxied requests
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_maxsize=20))
+
+class UpstreamResponse:
+    """A buffered upstream response: status, relayed headers and raw body"""
+
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get('Content-Type', 'application/json')
+
+    def text(self) -> str:
+        """Decoded body, for the few places that need to look inside it"""
+        body = gzip.decompress(self.body) if self.headers.get('Content-Encoding') == 'gzip' else self.body
+        return body.decode('utf-8', errors='replace')
+
+class StreamedResponse:
+    """An upstream response too large to buffer; body is a chunk iterator"""
+
+    __slots__ = ('status', 'headers', 'chunks')
+
+    def __init__(self, status: int, headers: Dict[str, str], chunks: Iterator[bytes]):
+        self.status = status
+        self.headers = headers
+        self.chunks = chunks
+
+ProxyResult = Union[UpstreamResponse, StreamedResponse]
+
+def cache_ttl(endpoint: str) -> Optional[float]:
+    """Seconds to cache GETs of endpoint, or None when it isn't cacheable"""
+    if not ALPACA_PROXY_CACHE:
+        return None
+    for pattern, ttl in PROXY_CACHE_TTLS:
+        if pattern.search(endpoint):
+            return ttl
+    return None
+
+def normalize_args(args) -> List[Tuple[str, str]]:
+    """Query args in a canonical order, symbol lists upper-cased, deduplicated and sorted"""
+    normalized = []
+    for key, value in args.items(multi=True):
+        if value == '':
+            continue
+        if key in SYMBOL_LIST_ARGS:
+            value = ','.join(sorted({s.strip().upper() for s in value.split(',') if s.strip()}))
+        normalized.append((key, value))
+    return sorted(normalized)
+
+def fetch_upstream(url: str, headers: Dict[str, str], params, method: str = 'GET', json_body: Any = None,
+                   accept_gzip: bool = False) -> ProxyResult:
+    """
+    Request url upstream. Bodies up to ALPACA_PROXY_BUFFER_LIMIT come back
+    buffered; larger ones as a StreamedResponse over the open connection.
+    With accept_gzip the body stays exactly as Alpaca encoded it.
+    """
+    headers = {**headers, 'Accept-Encoding': 'gzip' if accept_gzip else 'identity'}
+    response = session.request(method, url, headers=headers, params=params, json=json_body,
+                               stream=True, timeout=ALPACA_PROXY_TIMEOUT)
+    relayed = {name: response.headers[name] for name in RELAYED_HEADERS if name in response.headers}
+    relayed.setdefault('Content-Type', 'application/json')
+
+    if accept_gzip:
+        # Raw socket bytes: no decompression, whatever the encoding
+        chunks = response.raw.stream(STREAM_CHUNK_SIZE, decode_content=False)
+    else:
+        # requests decodes anything Alpaca compressed regardless
+        relayed.pop('Content-Encoding', None)
+        chunks = response.iter_content(STREAM_CHUNK_SIZE)
+    buffered, size = [], 0
+    for chunk in chunks:
+        buffered.append(chunk)
+        size += len(chunk)
+        if size > ALPACA_PROXY_BUFFER_LIMIT:
+            logger.info(f"Streaming large Alpaca response for {url} (> {ALPACA_PROXY_BUFFER_LIMIT} bytes)")
+            return StreamedResponse(response.status_code, relayed, _stream(response, chain(buffered, chunks)))
+    response.close()
+    return UpstreamResponse(response.status_code, relayed, b''.join(buffered))
+
+def _stream(response, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    try:
+        yield from chunks
+    finally:
+        response.close()
+
+class _Flight:
+    """An upstream request in progress that identical requests wait on"""
+
+    def __init__(self):
+        self.done = Event()
+        self.result: Optional[UpstreamResponse] = None
+
+class ProxyCache:
+    """LRU byte cache of successful upstream GETs, with request coalescing"""
+
+    def __init__(self, max_bytes: int = ALPACA_PROXY_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = Lock()
+        self._entries: 'OrderedDict[str, Tuple[float, UpstreamResponse]]' = OrderedDict()
+        self._bytes = 0
+        self._flights: Dict[str, _Flight] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'streamed': 0}
+
+    def _lookup(self, key: str) -> Optional[UpstreamResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def _remove(self, key: str):
+        _, response = self._entries.pop(key)
+        self._bytes -= len(response.body)
+
+    def _store(self, key: str, ttl: float, response: UpstreamResponse):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.time() + ttl, response)
+        self._bytes += len(response.body)
+        while self._bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def get(self, key: str, ttl: float, loader: Callable[[], ProxyResult]) -> ProxyResult:
+        """
+        Cached response for key, else the result of loader(). Only one
+        loader runs per key at a time; 200 responses are cached for ttl.
+        """
+        with self._lock:
+            cached = self._lookup(key)
+            if cached is not None:
+                self._stats['hits'] += 1
+                return cached
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait(ALPACA_PROXY_TIMEOUT)
+            # A streamed, failed or timed-out leader leaves nothing to share
+            return flight.result if flight.result is not None else loader()
+
+        result = None
+        try:
+            result = loader()
+        finally:
+            with self._lock:
+                if isinstance(result, UpstreamResponse):
+                    if result.status == 200:
+                        self._store(key, ttl, result)
+                    flight.result = result
+                elif isinstance(result, StreamedResponse):
+                    self._stats['streamed'] += 1
+                self._flights.pop(key, None)
+            flight.done.set()
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries), 'bytes': self._bytes, 'enabled': ALPACA_PROXY_CACHE}
+
+proxy_cache = ProxyCache()
@@ -1,7 +1,7 @@
 import os
 import sys
 import requests
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from dotenv import load_dotenv
 from flask_cors import CORS
 import threading
@@ -9,17 +9,31 @@ import time
 import logging
 from datetime import datetime, timedelta
 import json
+import hashlib
+import numpy as np
 
 # Add the current directory to the Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 import yahoo_finance # Import the new module
 from llm_analysis import llm_analysis_service # Import LLM analysis service
+from quote_stream import quote_hub, QUOTE_STREAM_MAX_SYMBOLS
+import indicators
+from screener import screener
+from recommendations import get_trade_recommendations
+import option_payoff
+import portfolio_risk
+import backtest
+import response_encoding
+import columnar
+from alpaca_client import AlpacaClient, ALPACA_HEALTH_MAX_AGE, changes_account
+from alpaca_proxy import proxy_cache, cache_ttl, normalize_args, fetch_upstream, StreamedResponse
 
 load_dotenv() # Load environment variables from .env file
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes, allowing your frontend to connect
+response_encoding.init_app(app)  # orjson-backed jsonify, gzip/brotli compression
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY') or os.getenv('VITE_DEEPSEEK_API_KEY')
 
 ALPACA_API_KEY_ID = os.getenv('ALPACA_API_KEY_ID')
@@ -32,6 +46,9 @@ ALPACA_LIVE_URL = 'https://api.alpaca.markets' # Alpaca's live trading URL
 ALPACA_IS_PAPER = os.getenv('ALPACA_PAPER_TRADING', 'true').lower() == 'true'
 ALPACA_BASE_URL = ALPACA_PAPER_URL if ALPACA_IS_PAPER else ALPACA_LIVE_URL
 
+# Shared trading API client: cached account / positions snapshots
+alpaca_client = AlpacaClient(ALPACA_BASE_URL, ALPACA_API_KEY_ID, ALPACA_API_SECRET_KEY)
+
 # Make Alpaca optional - only warn if keys are missing
 if not ALPACA_API_KEY_ID or not ALPACA_API_SECRET_KEY:
     print("INFO: Alpaca API keys are not configured. Alpaca functionality will be disabled.")
@@ -43,14 +60,16 @@ def periodic_cache_cleanup():
         try:
             time.sleep(300)  # Run every 5 minutes
             yahoo_finance.periodic_cache_cleanup()
+            llm_analysis_service.cleanup_expired_cache()
         except Exception as e:
             print(f"Error in cache cleanup: {e}")
 
-# Start cache cleanup thread
-cache_cleanup_thread = threading.Thread(target=periodic_cache_cleanup, daemon=True)
-cache_cleanup_thread.start()
+# Start cache cleanup thread (not in backtest worker processes, which import this script as __mp_main__)
+if __name__ != '__mp_main__':
+    cache_cleanup_thread = threading.Thread(target=periodic_cache_cleanup, daemon=True)
+    cache_cleanup_thread.start()
 
-@app.route('/alpaca/api/<path:endpoint>', methods=['GET', 'POST', 'PUT', 'DELETE']) # Allow various methods
+@app.route('/alpaca/api/<path:endpoint>', methods=['GET', 'POST', 'PUT', 'PATCH', 'DELETE']) # Allow various methods
 def alpaca_proxy(endpoint):
     if not ALPACA_API_KEY_ID or not ALPACA_API_SECRET_KEY:
         return jsonify({"error": "API keys not configured on server"}), 500
@@ -74,27 +93,37 @@ def alpaca_proxy(endpoint):
 
     try:
         # Make the request to Alpaca
+        # gzip bodies pass through compressed when the client can take them
+        accept_gzip = request.accept_encodings['gzip'] > 0
         if request.method == 'GET':
-            alpaca_response = requests.get(alpaca_url, headers=headers, params=request.args)
-        elif request.method == 'POST':
-            alpaca_response = requests.post(alpaca_url, headers=headers, params=request.args, json=request.json)
-        # Add other methods (PUT, DELETE) if needed
+            # Market-data GETs are cached per path TTL and coalesced across clients
+            ttl = cache_ttl(endpoint)
+            params = normalize_args(request.args)
+            if ttl:
+                cache_key = f"{alpaca_url}?{params}|{'gzip' if accept_gzip else 'identity'}"
+                result = proxy_cache.get(
+                    cache_key, ttl, lambda: fetch_upstream(alpaca_url, headers, params, accept_gzip=accept_gzip)
+                )
+            else:
+                result = fetch_upstream(alpaca_url, headers, params, accept_gzip=accept_gzip)
         else:
-            return jsonify({"error": "Unsupported HTTP method"}), 405
-
-        # Raise an exception for bad status codes (4xx or 5xx)
-        alpaca_response.raise_for_status()
+            result = fetch_upstream(alpaca_url, headers, request.args, method=request.method,
+                                    json_body=request.get_json(silent=True), accept_gzip=accept_gzip)
+            if result.status < 400 and changes_account(request.method, endpoint):
+                # Orders and position closes change the cached account / positions snapshots
+                alpaca_client.invalidate()
 
-        # Return the JSON response from Alpaca
-        return jsonify(alpaca_response.json()), alpaca_response.status_code
+        if isinstance(result, StreamedResponse):
+            response = Response(result.chunks, status=result.status, headers=result.headers)
+        elif result.status >= 400 and 'json' not in result.content_type:
+            # Alpaca's error response isn't JSON
+            return jsonify({"error": f"Alpaca API error {result.status}", "details": result.text()}), result.status
+        else:
+            # Alpaca's body and headers as received, without decoding or re-serializing
+            response = Response(result.body, status=result.status, headers=result.headers)
+        response.vary.add('Accept-Encoding')
+        return response
 
-    except requests.exceptions.HTTPError as http_err:
-        # Attempt to return Alpaca's error message if available
-        try:
-            error_details = http_err.response.json()
-        except ValueError: # If Alpaca's error response isn't JSON
-            error_details = {"error": str(http_err), "details": http_err.response.text}
-        return jsonify(error_details), http_err.response.status_code
     except requests.exceptions.RequestException as req_err:
         return jsonify({"error": "Failed to connect to Alpaca API", "details": str(req_err)}), 503 # Service Unavailable
     except Exception as e:
@@ -102,28 +131,133 @@ def alpaca_proxy(endpoint):
 
 # --- Yahoo Finance Routes ---
 
+def set_cache_headers(response, max_age, etag, last_modified, weak=False):
+    response.headers['Cache-Control'] = f"public, max-age={max(int(max_age), 0)}"
+    if etag:
+        response.set_etag(etag, weak=weak)
+    response.last_modified = last_modified
+    return response
+
+def not_modified(cache_key, fmt=None):
+    """
+    304 when the client's If-None-Match still matches the Yahoo cache entry
+    (in response format fmt; None for JSON), else None.
+    """
+    if not request.if_none_match:
+        return None
+    entry = yahoo_finance.get_cache_entry(cache_key)
+    if entry is None or not entry['etag']:
+        return None
+    etag = response_encoding.matching_etag(f"{entry['etag']}-{fmt}" if fmt else entry['etag'])
+    if etag is None:
+        return None
+    remaining = entry['timestamp'] + entry['duration'] - time.time()
+    response = set_cache_headers(Response(status=304), remaining, etag, entry['timestamp'])
+    response.vary.add('Accept-Encoding')
+    if fmt:
+        response.vary.add('Accept')
+    return response
+
+def with_entry_headers(response, cache_key, data, fmt=None):
+    """
+    Cache-Control, ETag and Last-Modified taken from the Yahoo cache entry
+    data came from (its remaining TTL and stored ETag).
+    """
+    entry = yahoo_finance.get_cache_entry(cache_key)
+    if entry is None or entry['data'] is not data:
+        # Fallback or error data that wasn't cached
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    etag = f"{entry['etag']}-{fmt}" if fmt else entry['etag']
+    remaining = entry['timestamp'] + entry['duration'] - time.time()
+    return set_cache_headers(response, remaining, etag, entry['timestamp'])
+
+def cached_json(cache_key, data):
+    """jsonify(data) with caching headers from its Yahoo cache entry"""
+    return with_entry_headers(jsonify(data), cache_key, data)
+
+def news_cache_state(feeds):
+    """
+    (weak ETag, max-age, last modified) for news rendered from the given
+    news store feeds, or None unless every feed is still fresh.
+    """
+    fetched = [yahoo_finance.news.news_store.fetched_at(feed) for feed in feeds]
+    ttl = yahoo_finance.CACHE_DURATION['news']
+    now = time.time()
+    if not fetched or any(t is None or now - t > ttl for t in fetched):
+        return None
+    # Weak: "time ago" strings in the rendered items drift while the feeds are unchanged
+    digest = hashlib.sha1(repr(list(zip(feeds, fetched))).encode('utf-8')).hexdigest()
+    return digest, min(fetched) + ttl - now, max(fetched)
+
+def news_not_modified(feeds):
+    state = news_cache_state(feeds) if request.if_none_match else None
+    if state is None or not request.if_none_match.contains_weak(state[0]):
+        return None
+    return set_cache_headers(Response(status=304), state[1], state[0], state[2], weak=True)
+
+def news_json(feeds, data):
+    response = jsonify(data)
+    state = news_cache_state(feeds)
+    if state is None:
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return set_cache_headers(response, state[1], state[0], state[2], weak=True)
+
+# Column order of the columnar (Arrow / MessagePack) responses
+QUOTE_COLUMNS = ('symbol', 'name', 'price', 'change', 'changePercent', 'volume', 'timestamp')
+HISTORY_COLUMNS = ('date', 'open', 'high', 'low', 'close', 'volume')
+
 @app.route('/api/yahoo/quote/<string:symbol>', methods=['GET'])
 def get_quote(symbol):
     """
     Endpoint to get a stock quote.
     """
     try:
+        cache_key = yahoo_finance.get_cache_key('quote', symbol.upper().strip())
+        unchanged = not_modified(cache_key)
+        if unchanged:
+            return unchanged
         quote = yahoo_finance.get_stock_quote(symbol)
         if quote:
-            return jsonify(quote)
+            return cached_json(cache_key, quote)
         return jsonify({'error': 'Symbol not found or data unavailable'}), 404
     except Exception as e:
         return jsonify({'error': 'Failed to fetch quote', 'details': str(e)}), 500
 
+@app.route('/api/yahoo/quotes', methods=['GET'])
+def get_quotes():
+    """
+    Endpoint to get quotes for many symbols in one request.
+    Example: /api/yahoo/quotes?symbols=AAPL,MSFT
+    """
+    try:
+        symbols = [s for s in request.args.get('symbols', '').split(',') if s.strip()]
+        if not symbols:
+            return jsonify({'error': 'No symbols provided'}), 400
+        quotes = yahoo_finance.get_stock_quotes(symbols)
+        fmt = columnar.negotiate_format()
+        if fmt:
+            # One row per requested symbol; unknown symbols have null fields
+            rows = [quote or {'symbol': symbol} for symbol, quote in quotes.items()]
+            return columnar.columnar_response(fmt, columnar.rows_to_columns(rows, QUOTE_COLUMNS))
+        return jsonify(quotes)
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch quotes', 'details': str(e)}), 500
+
 @app.route('/api/yahoo/info/<string:symbol>', methods=['GET'])
 def get_info(symbol):
     """
     Endpoint to get company information.
     """
     try:
+        cache_key = yahoo_finance.get_cache_key('info', symbol.upper())
+        unchanged = not_modified(cache_key)
+        if unchanged:
+            return unchanged
         info = yahoo_finance.get_company_info(symbol)
         if info:
-            return jsonify(info)
+            return cached_json(cache_key, info)
         return jsonify({'error': 'Symbol not found or data unavailable'}), 404
     except Exception as e:
         return jsonify({'error': 'Failed to fetch company info', 'details': str(e)}), 500
@@ -136,11 +270,83 @@ def get_history(symbol):
     try:
         period = request.args.get('period', '1y')
         interval = request.args.get('interval', '1d')
+        fmt = columnar.negotiate_format()
+        if fmt:
+            # Served straight from the cached columns, no per-row objects
+            cache_key = yahoo_finance.get_cache_key('history_columns', f"{symbol}_{period}_{interval}")
+            unchanged = not_modified(cache_key, fmt)
+            if unchanged:
+                return unchanged
+            columns = yahoo_finance.get_historical_columns(symbol, period, interval)
+            table = columns or columnar.rows_to_columns([], HISTORY_COLUMNS)
+            metadata = {'symbol': symbol.upper(), 'period': period, 'interval': interval}
+            return with_entry_headers(columnar.columnar_response(fmt, table, metadata), cache_key, columns, fmt)
+        cache_key = yahoo_finance.get_cache_key('history', f"{symbol}_{period}_{interval}")
+        unchanged = not_modified(cache_key)
+        if unchanged:
+            return unchanged
         history = yahoo_finance.get_historical_prices(symbol, period, interval)
-        return jsonify(history)
+        return cached_json(cache_key, history)
     except Exception as e:
         return jsonify({'error': 'Failed to fetch history', 'details': str(e)}), 500
 
+@app.route('/api/indicators/<string:symbol>', methods=['GET'])
+def get_indicators(symbol):
+    """
+    Endpoint to get technical indicators computed on the cached history.
+    Example: /api/indicators/AAPL?set=rsi14,macd,bb20&points=100
+    """
+    try:
+        indicator_set = request.args.get('set')
+        period = request.args.get('period', '1y')
+        interval = request.args.get('interval', '1d')
+        points = request.args.get('points', 1, type=int)
+        result = indicators.get_indicators(symbol, indicator_set, period, interval, points)
+        if result:
+            return jsonify(result)
+        return jsonify({'error': 'No historical data available'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Failed to compute indicators', 'details': str(e)}), 500
+
+@app.route('/api/screener', methods=['GET'])
+def run_screener():
+    """
+    Endpoint to screen symbols with a filter over the shared price panel.
+    Example: /api/screener?filter=rsi14 < 30 and volume_ratio > 2&symbols=AAPL,MSFT&sort=rsi14&order=asc&limit=20
+    Without symbols the default universe is screened.
+    """
+    try:
+        expression = request.args.get('filter', '')
+        symbols = [s for s in request.args.get('symbols', '').split(',') if s.strip()]
+        sort = request.args.get('sort', 'change_pct')
+        descending = request.args.get('order', 'desc').lower() != 'asc'
+        limit = request.args.get('limit', 50, type=int)
+        return jsonify(screener.screen(expression, symbols, sort, descending, limit))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Failed to run screener', 'details': str(e)}), 500
+
+@app.route('/api/backtest', methods=['POST'])
+def run_backtest():
+    """
+    Backtest a signal rule over daily bars from the local bar store.
+    Body: {"symbols": [...], "period": "10y", "rule": "recommendation"} or
+    {"rule": "filter", "entry": "rsi14 < 30", "exit": "rsi14 > 55"}, plus
+    optional long_only, threshold, commission_bps, commission_per_share and
+    slippage_bps. Without symbols the default universe is tested.
+    """
+    try:
+        payload = request.get_json(silent=True) or {}
+        spec = backtest.parse_spec(payload)
+        return jsonify(backtest.run_backtest(payload.get('symbols'), spec))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Failed to run backtest', 'details': str(e)}), 500
+
 @app.route('/api/yahoo/recommendation/<string:symbol>', methods=['GET'])
 def get_recommendation(symbol):
     """
@@ -154,6 +360,22 @@ def get_recommendation(symbol):
     except Exception as e:
         return jsonify({'error': 'Failed to generate recommendation', 'details': str(e)}), 500
 
+@app.route('/api/yahoo/recommendations', methods=['GET'])
+def get_recommendations():
+    """
+    Endpoint to get ranked trade recommendations for many symbols at once.
+    Example: /api/yahoo/recommendations?symbols=AAPL,MSFT,NVDA
+    """
+    try:
+        symbols = [s for s in request.args.get('symbols', '').split(',') if s.strip()]
+        if not symbols:
+            return jsonify({'error': 'No symbols provided'}), 400
+        return jsonify(get_trade_recommendations(symbols))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Failed to generate recommendations', 'details': str(e)}), 500
+
 @app.route('/api/yahoo/options_recommendation/<string:symbol>', methods=['GET'])
 def get_options_recommendation_route(symbol):
     """
@@ -167,15 +389,56 @@ def get_options_recommendation_route(symbol):
     except Exception as e:
         return jsonify({'error': 'Failed to generate options recommendation', 'details': str(e)}), 500
 
+@app.route('/api/stream/quotes', methods=['GET'])
+def stream_quotes():
+    """
+    Server-sent events stream of quote updates.
+    Example: /api/stream/quotes?symbols=AAPL,MSFT
+    Sends a `quotes` event ({symbol: quote}) whenever any of the symbols
+    changes, and a heartbeat comment while nothing does.
+    """
+    symbols = [s for s in request.args.get('symbols', '').split(',') if s.strip()]
+    if not symbols:
+        return jsonify({'error': 'No symbols provided'}), 400
+    if len(symbols) > QUOTE_STREAM_MAX_SYMBOLS:
+        return jsonify({'error': f'At most {QUOTE_STREAM_MAX_SYMBOLS} symbols per stream'}), 400
+    try:
+        subscriber = quote_hub.subscribe(symbols)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+    return Response(
+        quote_hub.stream(subscriber),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/yahoo/news', methods=['GET'])
 def get_market_news():
     """
     Endpoint to get market news from Yahoo Finance.
+    Page with ?before=<id of the last article received>.
+    With ?symbols=A,B,C returns watchlist news instead:
+    {"feed": [...merged, newest first], "bySymbol": {"A": [...], ...}}
     """
     try:
         limit = request.args.get('limit', 10, type=int)
-        news = yahoo_finance.get_market_news(limit)
-        return jsonify(news)
+        symbols = [s for s in request.args.get('symbols', '').split(',') if s.strip()]
+        if symbols:
+            if len(symbols) > yahoo_finance.BULK_NEWS_MAX_SYMBOLS:
+                return jsonify({'error': f'At most {yahoo_finance.BULK_NEWS_MAX_SYMBOLS} symbols per request'}), 400
+            feeds = list(dict.fromkeys(s.upper().strip() for s in symbols))
+            unchanged = news_not_modified(feeds)
+            if unchanged:
+                return unchanged
+            return news_json(feeds, yahoo_finance.get_bulk_symbol_news(symbols, limit))
+        
+        before = request.args.get('before')
+        feeds = [yahoo_finance.news.MARKET_FEED]
+        unchanged = news_not_modified(feeds)
+        if unchanged:
+            return unchanged
+        news = yahoo_finance.get_market_news(limit, before)
+        return news_json(feeds, news)
     except Exception as e:
         return jsonify({'error': 'Failed to fetch market news', 'details': str(e)}), 500
 
@@ -183,11 +446,17 @@ def get_market_news():
 def get_symbol_news(symbol):
     """
     Endpoint to get news for a specific symbol from Yahoo Finance.
+    Page with ?before=<id of the last article received>.
     """
     try:
         limit = request.args.get('limit', 10, type=int)
-        news = yahoo_finance.get_symbol_news(symbol.upper(), limit)
-        return jsonify(news)
+        before = request.args.get('before')
+        feeds = [symbol.upper()]
+        unchanged = news_not_modified(feeds)
+        if unchanged:
+            return unchanged
+        news = yahoo_finance.get_symbol_news(symbol.upper(), limit, before)
+        return news_json(feeds, news)
     except Exception as e:
         return jsonify({'error': f'Failed to fetch news for {symbol}', 'details': str(e)}), 500
 
@@ -197,11 +466,42 @@ def get_sector_performance():
     Endpoint to get sector performance data.
     """
     try:
+        cache_key = yahoo_finance.get_cache_key('sectors', 'performance')
+        unchanged = not_modified(cache_key)
+        if unchanged:
+            return unchanged
         sectors = yahoo_finance.get_sector_performance()
-        return jsonify(sectors)
+        return cached_json(cache_key, sectors)
     except Exception as e:
         return jsonify({'error': 'Failed to fetch sector performance', 'details': str(e)}), 500
 
+@app.route('/api/yahoo/symbols', methods=['GET'])
+def get_symbols_metadata():
+    """
+    Endpoint to get static metadata (name, sector, exchange) for many symbols.
+    Example: /api/yahoo/symbols?symbols=AAPL,MSFT
+    """
+    try:
+        symbols = [s for s in request.args.get('symbols', '').split(',') if s.strip()]
+        if not symbols:
+            return jsonify({'error': 'No symbols provided'}), 400
+        return jsonify(yahoo_finance.get_symbol_metadata(symbols))
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch symbol metadata', 'details': str(e)}), 500
+
+@app.route('/api/yahoo/symbols/search', methods=['GET'])
+def search_symbols():
+    """
+    Endpoint for ticker autocomplete over the local metadata index.
+    Example: /api/yahoo/symbols/search?q=AA&limit=10
+    """
+    try:
+        query = request.args.get('q', '')
+        limit = request.args.get('limit', 10, type=int)
+        return jsonify(yahoo_finance.search_symbols(query, limit))
+    except Exception as e:
+        return jsonify({'error': 'Failed to search symbols', 'details': str(e)}), 500
+
 @app.route('/api/yahoo/options/<string:symbol>', methods=['GET'])
 def get_options_chain(symbol):
     """
@@ -296,6 +596,12 @@ def get_cache_status():
         import yahoo_finance
         cache_info = {
             'total_entries': len(yahoo_finance.cache_storage),
+            'news_articles': len(yahoo_finance.news.news_store),
+            'quote_stream': quote_hub.stats(),
+            'screener': screener.stats(),
+            'alpaca_snapshots': alpaca_client.stats(),
+            'alpaca_proxy': proxy_cache.stats(),
+            'bar_store': yahoo_finance.history_store.stats(),
             'cache_file_exists': os.path.exists(yahoo_finance.CACHE_FILE),
             'cache_file_size': os.path.getsize(yahoo_finance.CACHE_FILE) if os.path.exists(yahoo_finance.CACHE_FILE) else 0
         }
@@ -311,6 +617,10 @@ def clear_cache():
     try:
         import yahoo_finance
         yahoo_finance.cache_storage.clear()
+        yahoo_finance.news.news_store.clear()
+        indicators.indicator_engine.clear()
+        alpaca_client.invalidate()
+        proxy_cache.clear()
         if os.path.exists(yahoo_finance.CACHE_FILE):
             os.remove(yahoo_finance.CACHE_FILE)
         return jsonify({'message': 'Cache cleared successfully'})
@@ -372,7 +682,8 @@ def analyze_market_context():
             'volatility': context.volatility_level,
             'trend': context.market_trend,
             'key_events': context.key_events,
-            'sector_performance': context.sector_performance
+            'sector_performance': context.sector_performance,
+            'volatility_metrics': context.volatility_metrics
         })
         
     except Exception as e:
@@ -456,32 +767,14 @@ def analyze_recommendations():
         if not symbols:
             return jsonify({'error': 'No symbols provided'}), 400
         
-        # Generate market context and analysis
-        market_context = llm_analysis_service.analyze_market_context(
-            symbols=symbols,
-            market_data=market_data,
-            rl_predictions=rl_predictions
-        )
-        
-        opportunities = llm_analysis_service.identify_trading_opportunities(
-            symbols=symbols,
-            rl_predictions=rl_predictions,
-            market_data=market_data
-        )
-        
-        risk_factors = llm_analysis_service.identify_risk_factors(
+        # Reuses the context/opportunity/risk stages already computed for
+        # this payload by the other /api/analyze* endpoints
+        recommendations = llm_analysis_service.analyze_recommendations(
             symbols=symbols,
             market_data=market_data,
             rl_predictions=rl_predictions
         )
         
-        # Generate recommendations
-        recommendations = llm_analysis_service.generate_recommendations(
-            market_context=market_context,
-            opportunities=opportunities,
-            risk_factors=risk_factors
-        )
-        
         return jsonify([{
             'action': rec.action,
             'reasoning': rec.reasoning,
@@ -494,6 +787,19 @@ def analyze_recommendations():
 
 # --- Alpaca Trading Routes ---
 
+def snapshot_response(snapshot):
+    """JSON response for an Alpaca snapshot, or 304 when the client's ETag matches"""
+    etag = response_encoding.matching_etag(snapshot.etag)
+    if etag is not None:
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+    else:
+        response = jsonify(snapshot.data)
+        response.set_etag(snapshot.etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @app.route('/api/alpaca/account', methods=['GET'])
 def get_alpaca_account():
     """Get Alpaca account information"""
@@ -501,15 +807,7 @@ def get_alpaca_account():
         return jsonify({"error": "Alpaca API keys not configured"}), 500
     
     try:
-        headers = {
-            'APCA-API-KEY-ID': ALPACA_API_KEY_ID,
-            'APCA-API-SECRET-KEY': ALPACA_API_SECRET_KEY
-        }
-        
-        response = requests.get(f"{ALPACA_BASE_URL}/v2/account", headers=headers)
-        response.raise_for_status()
-        
-        return jsonify(response.json())
+        return snapshot_response(alpaca_client.get_account())
     except Exception as e:
         return jsonify({"error": f"Failed to get account info: {str(e)}"}), 500
 
@@ -521,21 +819,29 @@ def place_alpaca_order():
     
     try:
         order_data = request.json
-        headers = {
-            'APCA-API-KEY-ID': ALPACA_API_KEY_ID,
-            'APCA-API-SECRET-KEY': ALPACA_API_SECRET_KEY,
-            'Content-Type': 'application/json'
-        }
-        
-        response = requests.post(f"{ALPACA_BASE_URL}/v2/orders", 
-                               headers=headers, 
-                               json=order_data)
-        response.raise_for_status()
-        
-        return jsonify(response.json())
+        # Invalidates the account / positions snapshots on success
+        return jsonify(alpaca_client.place_order(order_data))
     except Exception as e:
         return jsonify({"error": f"Failed to place order: {str(e)}"}), 500
 
+@app.route('/api/alpaca/orders/batch', methods=['POST'])
+def place_alpaca_orders_batch():
+    """
+    Place many orders at once. Body: {"orders": [...]} (Alpaca order objects).
+    All orders are validated before any is sent; the response has one
+    result per order, in request order.
+    """
+    if not ALPACA_API_KEY_ID or not ALPACA_API_SECRET_KEY:
+        return jsonify({"error": "Alpaca API keys not configured"}), 500
+    
+    try:
+        payload = request.get_json(silent=True) or {}
+        return jsonify(alpaca_client.place_orders(payload.get('orders')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to place orders: {str(e)}"}), 500
+
 @app.route('/api/alpaca/positions', methods=['GET'])
 def get_alpaca_positions():
     """Get current positions from Alpaca"""
@@ -543,20 +849,77 @@ def get_alpaca_positions():
         return jsonify({"error": "Alpaca API keys not configured"}), 500
     
     try:
-        headers = {
-            'APCA-API-KEY-ID': ALPACA_API_KEY_ID,
-            'APCA-API-SECRET-KEY': ALPACA_API_SECRET_KEY
-        }
-        
-        response = requests.get(f"{ALPACA_BASE_URL}/v2/positions", headers=headers)
-        response.raise_for_status()
-        
-        return jsonify(response.json())
+        return snapshot_response(alpaca_client.get_positions())
     except Exception as e:
         return jsonify({"error": f"Failed to get positions: {str(e)}"}), 500
 
+@app.route('/api/alpaca/portfolio/risk', methods=['GET'])
+def get_alpaca_portfolio_risk():
+    """Portfolio risk (VaR, CVaR, beta to SPY, correlation clusters, Greeks) for current positions"""
+    if not ALPACA_API_KEY_ID or not ALPACA_API_SECRET_KEY:
+        return jsonify({"error": "Alpaca API keys not configured"}), 500
+    
+    try:
+        positions = alpaca_client.get_positions()
+        return jsonify(portfolio_risk.analyze_portfolio(positions.data))
+    except Exception as e:
+        return jsonify({"error": f"Failed to compute portfolio risk: {str(e)}"}), 500
+
 # --- Options Trading Routes ---
 
+def chain_side_rows(side, expiry):
+    """Columnar chain side (see yahoo_finance.get_option_chain) -> response rows"""
+    return [
+        {
+            'symbol': contract,
+            'strike': strike,
+            'expiry': expiry,
+            'bid': bid,
+            'ask': ask,
+            'last': last,
+            'volume': int(volume),
+            'openInterest': int(open_interest),
+            'impliedVolatility': iv,
+            'percentChange': change
+        }
+        for contract, strike, bid, ask, last, volume, open_interest, iv, change in zip(
+            side['contractSymbol'], side['strike'].tolist(), side['bid'].tolist(), side['ask'].tolist(),
+            side['lastPrice'].tolist(), side['volume'].tolist(), side['openInterest'].tolist(),
+            side['impliedVolatility'].tolist(), side['percentChange'].tolist()
+        )
+    ]
+
+# Response column -> cached chain column (see yahoo_finance.get_option_chain)
+CHAIN_COLUMNS = {
+    'symbol': 'contractSymbol', 'strike': 'strike', 'bid': 'bid', 'ask': 'ask', 'last': 'lastPrice',
+    'volume': 'volume', 'openInterest': 'openInterest', 'impliedVolatility': 'impliedVolatility',
+    'percentChange': 'percentChange',
+}
+
+def chain_table(calls, puts):
+    """Both sides of a columnar chain as one table with a 'type' column"""
+    table = columnar.concat_columns([
+        {name: side[source] for name, source in CHAIN_COLUMNS.items()} for side in (calls, puts)
+    ])
+    table['volume'] = np.asarray(table['volume']).astype(np.int64)
+    table['openInterest'] = np.asarray(table['openInterest']).astype(np.int64)
+    table['type'] = ['call'] * len(calls['strike']) + ['put'] * len(puts['strike'])
+    return table
+
+def chain_response(chain, fmt):
+    """Chain payload (same shape as the JSON route) as an Arrow / MessagePack table"""
+    if isinstance(chain['calls'], list):
+        # Mock chains come as rows
+        calls = columnar.rows_to_columns(chain['calls'], CHAIN_COLUMNS)
+        puts = columnar.rows_to_columns(chain['puts'], CHAIN_COLUMNS)
+        table = columnar.concat_columns([calls, puts])
+        table['type'] = ['call'] * len(chain['calls']) + ['put'] * len(chain['puts'])
+        chain = {**chain, 'expiry': chain['calls'][0]['expiry'] if chain['calls'] else None}
+    else:
+        table = chain_table(chain['calls'], chain['puts'])
+    metadata = {key: value for key, value in chain.items() if key not in ('calls', 'puts')}
+    return columnar.columnar_response(fmt, table, metadata)
+
 @app.route('/api/options/chain', methods=['GET'])
 def get_real_options_chain():
     """Get real-time options chain for a symbol"""
@@ -567,59 +930,44 @@ def get_real_options_chain():
         if not symbol:
             return jsonify({'error': 'Symbol is required'}), 400
         
-        # Try to get options chain from Yahoo Finance
-        import yfinance as yf
+        quote = yahoo_finance.get_stock_quote(symbol)
+        current_price = quote['price'] if quote else 150
+        # Arrow / MessagePack when the client asks for it, else JSON
+        fmt = columnar.negotiate_format()
         
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
-        current_price = info.get('currentPrice', info.get('regularMarketPrice', 150))
+        def mock_chain():
+            chain = generate_mock_options_chain(symbol, current_price)
+            return chain_response(chain, fmt) if fmt else jsonify(chain)
         
         # Get available expiration dates
         try:
-            expirations = ticker.options
+            expirations = yahoo_finance.get_listed_expirations(symbol)
             if not expirations:
                 # Return mock data if no real options available
-                return jsonify(generate_mock_options_chain(symbol, current_price))
+                return mock_chain()
                 
             # Use specified expiry or first available
             target_expiry = expiry if expiry in expirations else expirations[0]
             
-            # Get options chain for the expiry
-            options_chain = ticker.option_chain(target_expiry)
+            # Get options chain for the expiry (cached, as columns)
+            options_chain = yahoo_finance.get_option_chain(symbol, target_expiry)
+            if not options_chain:
+                return mock_chain()
             
-            # Process calls and puts
-            calls = []
-            puts = []
+            if fmt:
+                # The cached columns go out as they are
+                return chain_response({
+                    'underlying': symbol,
+                    'underlyingPrice': current_price,
+                    'expiry': target_expiry,
+                    'expirationDates': list(expirations),
+                    'calls': options_chain['calls'],
+                    'puts': options_chain['puts'],
+                    'timestamp': time.time()
+                }, fmt)
             
-            if hasattr(options_chain, 'calls') and not options_chain.calls.empty:
-                for _, call in options_chain.calls.iterrows():
-                    calls.append({
-                        'symbol': call.get('contractSymbol', ''),
-                        'strike': float(call.get('strike', 0)),
-                        'expiry': target_expiry,
-                        'bid': float(call.get('bid', 0)),
-                        'ask': float(call.get('ask', 0)),
-                        'last': float(call.get('lastPrice', 0)),
-                        'volume': int(call.get('volume', 0)) if call.get('volume') else 0,
-                        'openInterest': int(call.get('openInterest', 0)) if call.get('openInterest') else 0,
-                        'impliedVolatility': float(call.get('impliedVolatility', 0)) if call.get('impliedVolatility') else 0,
-                        'percentChange': float(call.get('percentChange', 0)) if call.get('percentChange') else 0
-                    })
-            
-            if hasattr(options_chain, 'puts') and not options_chain.puts.empty:
-                for _, put in options_chain.puts.iterrows():
-                    puts.append({
-                        'symbol': put.get('contractSymbol', ''),
-                        'strike': float(put.get('strike', 0)),
-                        'expiry': target_expiry,
-                        'bid': float(put.get('bid', 0)),
-                        'ask': float(put.get('ask', 0)),
-                        'last': float(put.get('lastPrice', 0)),
-                        'volume': int(put.get('volume', 0)) if put.get('volume') else 0,
-                        'openInterest': int(put.get('openInterest', 0)) if put.get('openInterest') else 0,
-                        'impliedVolatility': float(put.get('impliedVolatility', 0)) if put.get('impliedVolatility') else 0,
-                        'percentChange': float(put.get('percentChange', 0)) if put.get('percentChange') else 0
-                    })
+            calls = chain_side_rows(options_chain['calls'], target_expiry)
+            puts = chain_side_rows(options_chain['puts'], target_expiry)
             
             return jsonify({
                 'underlying': symbol,
@@ -632,12 +980,38 @@ def get_real_options_chain():
             
         except Exception as e:
             logging.warning(f"Could not fetch real options for {symbol}: {e}")
-            return jsonify(generate_mock_options_chain(symbol, current_price))
+            return mock_chain()
             
     except Exception as e:
         logging.error(f"Error fetching options chain for {symbol}: {e}")
         return jsonify({'error': 'Failed to fetch options chain'}), 500
 
+@app.route('/api/options/payoff', methods=['POST'])
+def get_options_payoff():
+    """
+    P&L grid for a multi-leg options position.
+    Body: {"symbol": "AAPL" or "spot": 190.5,
+           "legs": [{"type": "call", "quantity": 1, "strike": 190, "expiry": "2025-01-17", "iv": 0.25, "premium": 5.1}, ...],
+           "grid": {"priceSteps": 200, "dateSteps": 30, "volShifts": [-0.1, 0, 0.1], "priceRange": 0.3}}
+    """
+    try:
+        data = request.get_json() or {}
+        spot = None
+        if data.get('spot') is None:
+            symbol = str(data.get('symbol', '')).upper()
+            if not symbol:
+                return jsonify({'error': 'Either spot or symbol is required'}), 400
+            quote = yahoo_finance.get_stock_quote(symbol)
+            if not quote:
+                return jsonify({'error': 'Symbol not found or data unavailable'}), 404
+            spot = quote['price']
+        return jsonify(option_payoff.evaluate_position(data, spot))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error evaluating options payoff: {e}")
+        return jsonify({'error': 'Failed to evaluate position', 'details': str(e)}), 500
+
 @app.route('/api/options/flow', methods=['GET'])
 def get_real_options_flow():
     """Get options flow and unusual activity"""
@@ -776,16 +1150,17 @@ def health_alpaca():
         })
     
     try:
-        headers = {
-            'APCA-API-KEY-ID': ALPACA_API_KEY_ID,
-            'APCA-API-SECRET-KEY': ALPACA_API_SECRET_KEY
-        }
-        
-        response = requests.get(f"{ALPACA_BASE_URL}/v2/account", headers=headers)
+        # A recent account snapshot proves connectivity without another request
+        try:
+            snapshot = alpaca_client.get_snapshot('account', max_age=ALPACA_HEALTH_MAX_AGE)
+            status, checked_at = 'healthy', snapshot.fetched_at
+        except requests.HTTPError:
+            status, checked_at = 'degraded', time.time()
         return jsonify({
-            'status': 'healthy' if response.ok else 'degraded',
+            'status': status,
             'service': 'alpaca',
             'is_paper': ALPACA_IS_PAPER,
+            'checked_at': checked_at,
             'timestamp': time.time()
         })
     except Exception as e:
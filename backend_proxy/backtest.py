@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Vectorized backtests over the local bar store for AlphaSphere.
+
+A rule turns daily bars into a target position per symbol and bar:
+- 'recommendation' replays the multi-factor score behind
+  get_trade_recommendation on every bar: BUY goes long, SELL goes short
+  (flat when long_only), HOLD keeps the current position;
+- 'filter' uses screener filter expressions: long while `entry` holds, or,
+  with an `exit` expression too, from an entry until the next exit.
+
+Signals are taken at a bar's close and the position is held from the next
+bar, so no bar's return is traded on its own close. Every position change
+pays commission (bps of traded notional plus a per-share fee) and slippage.
+Fields, signals, positions, returns and costs are all dates x symbols arrays.
+
+Bars are first brought up to date in the bar store (batched downloads of
+missing ranges only); then symbol chunks fan out to a process pool whose
+workers memory-map the same files, so no bar data crosses processes.
+Results hold per-symbol metrics and an equal-weight portfolio, rebalanced
+daily across the symbols trading that day.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
+from itertools import repeat
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import yahoo_finance
+from bar_store import BarStore, history_store, slice_period
+from recommendations import FACTOR_WEIGHTS, SIGNAL_THRESHOLD, score_factors
+from screener import SCREENER_FIELDS, SCREENER_UNIVERSE, compile_filter
+
+logger = logging.getLogger(__name__)
+
+BACKTEST_MAX_SYMBOLS = int(os.getenv('BACKTEST_MAX_SYMBOLS', '1000'))
+BACKTEST_WORKERS = int(os.getenv('BACKTEST_WORKERS', str(os.cpu_count() or 1)))
+BACKTEST_CHUNK_SIZE = int(os.getenv('BACKTEST_CHUNK_SIZE', '50'))
+# Workers fork from a single-threaded fork server rather than from the server
+# process, whose threads may hold locks at fork time. 'fork' starts faster but
+# is only safe when nothing else runs threads.
+BACKTEST_START_METHOD = os.getenv(
+    'BACKTEST_START_METHOD', 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+BACKTEST_DEFAULT_PERIOD = os.getenv('BACKTEST_DEFAULT_PERIOD', '5y')
+BACKTEST_COMMISSION_BPS = float(os.getenv('BACKTEST_COMMISSION_BPS', '0'))
+BACKTEST_COMMISSION_PER_SHARE = float(os.getenv('BACKTEST_COMMISSION_PER_SHARE', '0'))
+BACKTEST_SLIPPAGE_BPS = float(os.getenv('BACKTEST_SLIPPAGE_BPS', '5'))
+TRADING_DAYS = 252
+INTERVAL = '1d'
+
+RULES = ('recommendation', 'filter')
+
+@dataclass(frozen=True)
+class BacktestSpec:
+    """A validated backtest request (sent to the workers as is)"""
+    rule: str = 'recommendation'
+    period: str = BACKTEST_DEFAULT_PERIOD
+    entry: Optional[str] = None
+    exit: Optional[str] = None
+    long_only: bool = True
+    threshold: float = SIGNAL_THRESHOLD
+    commission_bps: float = BACKTEST_COMMISSION_BPS
+    commission_per_share: float = BACKTEST_COMMISSION_PER_SHARE
+    slippage_bps: float = BACKTEST_SLIPPAGE_BPS
+
+def _number(payload: Dict[str, Any], field: str, default: float, minimum: float = 0.0) -> float:
+    value = payload.get(field)
+    if value is None:
+        return default
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a number")
+    if not math.isfinite(value) or value < minimum:
+        raise ValueError(f"{field} must be at least {minimum:g}")
+    return value
+
+def _flag(payload: Dict[str, Any], field: str, default: bool) -> bool:
+    value = payload.get(field)
+    if value is None:
+        return default
+    if not isinstance(value, bool):
+        raise ValueError(f"{field} must be true or false")
+    return value
+
+def parse_spec(payload: Dict[str, Any]) -> BacktestSpec:
+    """BacktestSpec from a request body; raises ValueError on bad input"""
+    rule = str(payload.get('rule') or ('filter' if payload.get('entry') else 'recommendation')).lower()
+    if rule not in RULES:
+        raise ValueError(f"rule must be one of {', '.join(RULES)}")
+    period = str(payload.get('period') or BACKTEST_DEFAULT_PERIOD)
+    if not history_store.serves(period, INTERVAL):
+        raise ValueError(f"Unsupported backtest period: {period}")
+
+    entry = str(payload['entry']).strip() if payload.get('entry') else None
+    exit_ = str(payload['exit']).strip() if payload.get('exit') else None
+    if rule == 'filter':
+        if not entry:
+            raise ValueError("entry is required for the filter rule")
+        # Fail here, not in a worker
+        compile_filter(entry)
+        if exit_:
+            compile_filter(exit_)
+
+    return BacktestSpec(
+        rule=rule,
+        period=period,
+        entry=entry if rule == 'filter' else None,
+        exit=exit_ if rule == 'filter' else None,
+        long_only=_flag(payload, 'long_only', True),
+        threshold=_number(payload, 'threshold', SIGNAL_THRESHOLD),
+        commission_bps=_number(payload, 'commission_bps', BACKTEST_COMMISSION_BPS),
+        commission_per_share=_number(payload, 'commission_per_share', BACKTEST_COMMISSION_PER_SHARE),
+        slippage_bps=_number(payload, 'slippage_bps', BACKTEST_SLIPPAGE_BPS),
+    )
+
+# --- Fields over time ---
+
+class BarFields(dict):
+    """
+    Screener fields as dates x symbols arrays, each computed on first use
+    with the same definitions as screener.compute_fields on the latest bar.
+    """
+
+    def __init__(self, close: np.ndarray, high: np.ndarray, low: np.ndarray, volume: np.ndarray):
+        super().__init__()
+        self.raw_close = close
+        self.closes = pd.DataFrame(close).ffill()
+        self.high = pd.DataFrame(high)
+        self.low = pd.DataFrame(low)
+        self.volumes = pd.DataFrame(volume).fillna(0)
+        self.valid = np.cumsum(~np.isnan(close), axis=0)
+
+    def lagged(self, days: int) -> np.ndarray:
+        return np.where(self.valid > days, self.closes.shift(days).to_numpy(), np.nan)
+
+    def __missing__(self, name: str) -> np.ndarray:
+        if name not in SCREENER_FIELDS:
+            raise KeyError(name)
+        closes, valid = self.closes, self.valid
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if name == 'price':
+                value = closes.to_numpy()
+            elif name == 'change_pct':
+                value = (self['price'] / self.lagged(1) - 1) * 100
+            elif name == 'volume':
+                value = self.volumes.to_numpy(dtype=float)
+            elif name == 'avg_volume20':
+                value = self.volumes.rolling(20).mean().shift(1).to_numpy()
+            elif name == 'volume_ratio':
+                average = self['avg_volume20']
+                value = self['volume'] / np.where(average > 0, average, np.nan)
+            elif name == 'rsi14':
+                delta = closes.diff()
+                gains = delta.clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean().to_numpy()
+                losses = (-delta).clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean().to_numpy()
+                rsi = np.where(losses == 0, np.where(gains > 0, 100.0, 50.0), 100.0 - 100.0 / (1.0 + gains / losses))
+                value = np.where(valid > 14, rsi, np.nan)
+            elif name.startswith('sma'):
+                value = closes.rolling(int(name[3:])).mean().to_numpy()
+            elif name.startswith('return_'):
+                days = {'return_5d': 5, 'return_20d': 20, 'return_1y': 251}[name]
+                value = (self['price'] / self.lagged(days) - 1) * 100
+            elif name == 'volatility20':
+                log_returns = np.log(closes / closes.shift(1))
+                value = np.where(valid > 20, log_returns.rolling(20).std().to_numpy() * math.sqrt(TRADING_DAYS), np.nan)
+            elif name == 'high_52w':
+                value = self.high.rolling(TRADING_DAYS, min_periods=1).max().to_numpy()
+            elif name == 'low_52w':
+                value = self.low.rolling(TRADING_DAYS, min_periods=1).min().to_numpy()
+            elif name == 'pct_from_high':
+                value = (self['price'] / self['high_52w'] - 1) * 100
+            else:  # bars
+                value = valid.astype(float)
+        self[name] = value
+        return value
+
+class _Flattened(dict):
+    """Fields raveled to 1-d, the shape compile_filter's masks expect"""
+
+    def __init__(self, fields: BarFields):
+        super().__init__()
+        self.fields = fields
+
+    def __missing__(self, name: str) -> np.ndarray:
+        value = self[name] = self.fields[name].ravel()
+        return value
+
+# --- Signals and positions ---
+
+def hold_until_changed(state: np.ndarray) -> np.ndarray:
+    """Forward-fill a dates x symbols array of new positions (NaN: no change); starts flat"""
+    rows = np.where(np.isnan(state), 0, np.arange(len(state))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    filled = state[rows, np.arange(state.shape[1])]
+    return np.nan_to_num(filled, nan=0.0)
+
+def target_positions(fields: BarFields, spec: BacktestSpec) -> np.ndarray:
+    """Position (-1, 0 or 1) to hold after each bar's close"""
+    shape = fields.raw_close.shape
+    flat = _Flattened(fields)
+    if spec.rule == 'filter':
+        entry = compile_filter(spec.entry)(flat).reshape(shape)
+        if not spec.exit:
+            return entry.astype(float)
+        leave = compile_filter(spec.exit)(flat).reshape(shape)
+        state = np.where(entry, 1.0, np.where(leave, 0.0, np.nan))
+        return hold_until_changed(state)
+
+    features = {name: pd.Series(flat[name]) for name in ('sma50', 'sma200', 'return_20d', 'rsi14', 'volume_ratio')}
+    factors = score_factors(flat['change_pct'], flat['price'], features)
+    score = sum(FACTOR_WEIGHTS[name] * values for name, values in factors.items()).reshape(shape)
+    # Only bars with a close of their own trade; HOLD keeps the position
+    traded = ~np.isnan(fields.raw_close)
+    sell = 0.0 if spec.long_only else -1.0
+    state = np.where(traded & (score >= spec.threshold), 1.0,
+                     np.where(traded & (score <= -spec.threshold), sell, np.nan))
+    return hold_until_changed(state)
+
+# --- Returns and metrics ---
+
+def strategy_returns(fields: BarFields, target: np.ndarray, spec: BacktestSpec) -> Dict[str, np.ndarray]:
+    """
+    Per-bar arrays for each symbol: the underlying's returns, the position
+    held through the bar, turnover at its close, costs and net returns.
+    """
+    close = fields.closes.to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bar_returns = np.nan_to_num(close / np.roll(close, 1, axis=0) - 1, nan=0.0, posinf=0.0, neginf=0.0)
+        per_share = np.nan_to_num(spec.commission_per_share / close, nan=0.0, posinf=0.0)
+    bar_returns[0] = 0.0
+    held = np.roll(target, 1, axis=0)
+    held[0] = 0.0
+    turnover = np.abs(np.diff(target, axis=0, prepend=0.0))
+    costs = turnover * ((spec.commission_bps + spec.slippage_bps) / 1e4 + per_share)
+    return {
+        'bar_returns': bar_returns,
+        'held': held,
+        'turnover': turnover,
+        'costs': costs,
+        'net': held * bar_returns - costs,
+    }
+
+def performance(net: np.ndarray, active: np.ndarray) -> Dict[str, np.ndarray]:
+    """Metrics per column of a dates x columns array of returns, over the bars where active"""
+    returns = np.where(active, net, np.nan)
+    count = active.sum(axis=0)
+    equity = np.cumprod(1 + np.nan_to_num(returns), axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total = equity[-1] - 1
+        years = count / TRADING_DAYS
+        cagr = np.where((years > 0) & (equity[-1] > 0), equity[-1] ** (1 / years) - 1, np.nan)
+        std = np.nanstd(returns, axis=0, ddof=1)
+        sharpe = np.where(std > 0, np.nanmean(returns, axis=0) / std * math.sqrt(TRADING_DAYS), np.nan)
+        drawdown = (equity / np.maximum.accumulate(equity, axis=0) - 1).min(axis=0)
+    return {'total_return': total, 'cagr': cagr, 'sharpe': sharpe, 'max_drawdown': drawdown,
+            'bars': count, 'equity': equity}
+
+def _round(value: float, digits: int = 4) -> Optional[float]:
+    return round(float(value), digits) + 0.0 if np.isfinite(value) else None
+
+def run_chunk(symbols: List[str], spec: BacktestSpec) -> Dict[str, Any]:
+    """
+    Backtest one chunk of symbols from the bar store (in a worker process).
+    Returns per-symbol metrics and the chunk's daily return sums for the
+    portfolio.
+    """
+    bars = {symbol: slice_period(history_store.read(symbol, INTERVAL), spec.period) for symbol in symbols}
+    bars = {symbol: records for symbol, records in bars.items() if len(records)}
+    if not bars:
+        return {'symbols': [], 'dates': np.empty(0, 'M8[D]'), 'net_sum': np.empty(0), 'active': np.empty(0)}
+
+    dates = np.unique(np.concatenate([records['date'] for records in bars.values()]))
+    columns = {field: np.full((len(dates), len(bars)), np.nan) for field in ('close', 'high', 'low', 'volume')}
+    for j, records in enumerate(bars.values()):
+        rows = np.searchsorted(dates, records['date'])
+        for field, values in columns.items():
+            values[rows, j] = records[field]
+
+    fields = BarFields(columns['close'], columns['high'], columns['low'], columns['volume'])
+    target = target_positions(fields, spec)
+    result = strategy_returns(fields, target, spec)
+
+    # A symbol is active from its first bar on (later gaps count as flat days)
+    active = fields.valid > 0
+    metrics = performance(result['net'], active)
+    buy_hold = performance(result['bar_returns'], active)
+
+    last = fields.closes.to_numpy()[-1]
+    symbol_results = []
+    for j, symbol in enumerate(bars):
+        span = max(int(metrics['bars'][j]), 1)
+        symbol_results.append({
+            'symbol': symbol,
+            'bars': int(metrics['bars'][j]),
+            'total_return': _round(metrics['total_return'][j]),
+            'cagr': _round(metrics['cagr'][j]),
+            'sharpe': _round(metrics['sharpe'][j]),
+            'max_drawdown': _round(metrics['max_drawdown'][j]),
+            'buy_hold_return': _round(buy_hold['total_return'][j]),
+            'trades': int(np.count_nonzero(result['turnover'][:, j])),
+            'exposure': _round(np.count_nonzero(result['held'][:, j]) / span),
+            'costs': _round(result['costs'][:, j].sum()),
+            'position': int(target[-1, j]),
+            'last_price': _round(last[j], 4),
+        })
+    listed = ~np.isnan(fields.raw_close)
+    return {
+        'symbols': symbol_results,
+        'dates': dates,
+        'net_sum': np.where(listed, result['net'], 0.0).sum(axis=1),
+        'active': listed.sum(axis=1),
+    }
+
+# --- Orchestration ---
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = Lock()
+
+def _init_worker(root: str):
+    """Worker start: a store of its own over the parent's store root"""
+    global history_store
+    history_store = BarStore(root=root, intervals=(INTERVAL,))
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            context = multiprocessing.get_context(BACKTEST_START_METHOD)
+            if BACKTEST_START_METHOD == 'forkserver':
+                # The fork server imports this module and its dependencies once, instead of __main__
+                context.set_forkserver_preload([__name__])
+            _pool = ProcessPoolExecutor(
+                max_workers=BACKTEST_WORKERS,
+                mp_context=context,
+                initializer=_init_worker, initargs=(history_store.root,)
+            )
+        return _pool
+
+def _reset_executor(wait: bool = False):
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait, cancel_futures=True)
+        _pool = None
+
+def _run_chunks(chunks: List[List[str]], spec: BacktestSpec) -> List[Dict[str, Any]]:
+    if BACKTEST_WORKERS <= 1 or len(chunks) <= 1:
+        return [run_chunk(chunk, spec) for chunk in chunks]
+    try:
+        return list(_executor().map(run_chunk, chunks, repeat(spec)))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool next time
+        _reset_executor()
+        raise
+
+def _portfolio(chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Equal-weight portfolio over every chunk's symbols, on the union of their dates"""
+    parts = [chunk for chunk in chunks if len(chunk['dates'])]
+    if not parts:
+        return {'dates': [], 'equity': []}
+    dates = np.unique(np.concatenate([chunk['dates'] for chunk in parts]))
+    net_sum, active = np.zeros(len(dates)), np.zeros(len(dates))
+    for chunk in parts:
+        rows = np.searchsorted(dates, chunk['dates'])
+        np.add.at(net_sum, rows, chunk['net_sum'])
+        np.add.at(active, rows, chunk['active'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily = np.where(active > 0, net_sum / active, 0.0)[:, None]
+    metrics = performance(daily, np.ones_like(daily, dtype=bool))
+    return {
+        'total_return': _round(metrics['total_return'][0]),
+        'cagr': _round(metrics['cagr'][0]),
+        'sharpe': _round(metrics['sharpe'][0]),
+        'max_drawdown': _round(metrics['max_drawdown'][0]),
+        'dates': np.datetime_as_string(dates, unit='D').tolist(),
+        'equity': np.round(metrics['equity'][:, 0], 6),
+    }
+
+def run_backtest(symbols: Optional[List[str]], spec: BacktestSpec) -> Dict[str, Any]:
+    """
+    Backtest spec over symbols (default: the screener universe). Cached for
+    the history TTL. Symbols without bars are listed under `unavailable`.
+    """
+    symbols = symbols if symbols is not None else SCREENER_UNIVERSE
+    if not isinstance(symbols, list):
+        raise ValueError("symbols must be a list")
+    symbols = list(dict.fromkeys(s.upper().strip() for s in symbols if isinstance(s, str) and s.strip()))
+    if not symbols:
+        raise ValueError("No symbols to backtest")
+    if len(symbols) > BACKTEST_MAX_SYMBOLS:
+        raise ValueError(f"At most {BACKTEST_MAX_SYMBOLS} symbols per backtest")
+
+    request_key = json.dumps({'symbols': sorted(symbols), 'spec': asdict(spec)}, sort_keys=True)
+    cache_key = yahoo_finance.get_cache_key('backtest', hashlib.sha1(request_key.encode('utf-8')).hexdigest()[:16])
+    cached_data = yahoo_finance.get_cached_data(cache_key)
+    if cached_data:
+        return cached_data
+
+    started = time.time()
+    loaded = yahoo_finance.load_history_bars(symbols, spec.period, INTERVAL)
+    available = [s for s in symbols if len(loaded.get(s, ()))]
+    loaded_at = time.time()
+
+    unavailable = [s for s in symbols if not len(loaded.get(s, ()))]
+
+    chunks = [available[i:i + BACKTEST_CHUNK_SIZE] for i in range(0, len(available), BACKTEST_CHUNK_SIZE)]
+    results = _run_chunks(chunks, spec)
+    finished = time.time()
+    logger.info(f"Backtest of {len(available)} symbols ({spec.rule}, {spec.period}): "
+                f"bars {loaded_at - started:.2f}s, compute {finished - loaded_at:.2f}s in {len(chunks)} chunks")
+
+    result = {
+        'spec': asdict(spec),
+        'portfolio': _portfolio(results),
+        'symbols': sorted((r for chunk in results for r in chunk['symbols']),
+                          key=lambda r: -(r['total_return'] if r['total_return'] is not None else -math.inf)),
+        'unavailable': unavailable,
+        'generatedAt': finished,
+        'elapsed': {'bars': round(loaded_at - started, 3), 'compute': round(finished - loaded_at, 3)},
+    }
+    yahoo_finance.set_cached_data(cache_key, result, yahoo_finance.CACHE_DURATION['history'])
+    return result
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Durable on-disk store of historical bars for AlphaSphere.
+
+Bars live under BAR_STORE_DIR, partitioned by interval and symbol: one
+NumPy .npy file of BAR_DTYPE records per symbol (bar_data/1d/AAPL.npy)
+next to a small JSON sidecar recording how far back the store has asked
+Yahoo for and when it last checked for new bars. Files are opened with
+memory mapping, so slicing a period out of years of bars copies nothing
+and survives restarts, unlike the in-memory cache and its rotated pickle.
+
+Only missing ranges go upstream: older bars when a longer period than ever
+requested comes in, and the bars since the last stored one once the
+symbol hasn't been checked for BAR_STORE_REFRESH seconds. Prices are
+split/dividend adjusted, so each refresh re-reads the last complete stored
+bar too; if Yahoo's value for it changed, history was re-adjusted and the
+symbol is reloaded in full.
+
+Fetching stays with the caller (yahoo_finance): the store only decides
+which ranges are missing and merges what comes back. Files are replaced
+atomically, so readers holding an older mapping keep a consistent view.
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict, defaultdict
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+BAR_STORE_ENABLED = os.getenv('BAR_STORE', 'true').lower() == 'true'
+BAR_STORE_DIR = os.getenv('BAR_STORE_DIR', os.path.join(os.path.dirname(__file__), 'bar_data'))
+# Intervals kept on disk; anything else (intraday bars) is always fetched
+BAR_STORE_INTERVALS = tuple(i.strip() for i in os.getenv('BAR_STORE_INTERVALS', '1d').split(',') if i.strip())
+# Seconds before a symbol is checked upstream for new bars (same as the in-memory history TTL)
+BAR_STORE_REFRESH = float(os.getenv('BAR_STORE_REFRESH', '300'))
+# Memory maps kept open; least recently read symbols are unmapped first
+BAR_STORE_OPEN_FILES = int(os.getenv('BAR_STORE_OPEN_FILES', '256'))
+# Relative change in a stored close that means Yahoo re-adjusted the history
+ADJUSTMENT_TOLERANCE = 1e-4
+
+BAR_DTYPE = np.dtype([
+    ('date', 'M8[D]'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'i8'),
+])
+BAR_FIELDS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+# Start date meaning period='max'
+EARLIEST = np.datetime64('1900-01-01', 'D')
+
+PERIOD_OFFSETS = {
+    '1mo': pd.DateOffset(months=1),
+    '3mo': pd.DateOffset(months=3),
+    '6mo': pd.DateOffset(months=6),
+    '1y': pd.DateOffset(years=1),
+    '2y': pd.DateOffset(years=2),
+    '5y': pd.DateOffset(years=5),
+    '10y': pd.DateOffset(years=10),
+}
+TRADING_DAYS_PERIOD = re.compile(r'^(\d+)d$')
+
+# A missing range: (kind, start, end); end is exclusive, None means up to today
+Range = Tuple[str, np.datetime64, Optional[np.datetime64]]
+# fetch(symbols, start, end) -> {symbol: DataFrame of Open/High/Low/Close/Volume}
+FetchMany = Callable[[List[str], np.datetime64, Optional[np.datetime64]], Dict[str, pd.DataFrame]]
+
+def _today() -> np.datetime64:
+    return np.datetime64('today', 'D')
+
+def period_start(period: str) -> Optional[np.datetime64]:
+    """First date a Yahoo period covers, EARLIEST for 'max'; None for periods the store doesn't serve"""
+    today = pd.Timestamp(str(_today()))
+    match = TRADING_DAYS_PERIOD.match(period)
+    if match:
+        # N trading days fit in this many calendar days, holidays included
+        return np.datetime64((today - pd.Timedelta(days=int(match.group(1)) * 7 // 5 + 7)).date(), 'D')
+    if period == 'ytd':
+        return np.datetime64(f"{today.year}-01-01", 'D')
+    if period == 'max':
+        return EARLIEST
+    offset = PERIOD_OFFSETS.get(period)
+    if offset is None:
+        return None
+    return np.datetime64((today - offset).date(), 'D')
+
+def slice_period(bars: np.ndarray, period: str) -> np.ndarray:
+    """The bars a period covers, as a view: the last N bars for 'Nd', else everything from its start date"""
+    match = TRADING_DAYS_PERIOD.match(period)
+    if match:
+        return bars[-int(match.group(1)):]
+    start = period_start(period)
+    return bars[np.searchsorted(bars['date'], start):]
+
+def frame_to_bars(frame: Optional[pd.DataFrame]) -> np.ndarray:
+    """BAR_DTYPE records from a Yahoo history frame (rows without a close are dropped)"""
+    if frame is None or frame.empty or 'Close' not in frame.columns:
+        return np.empty(0, BAR_DTYPE)
+    frame = frame[frame['Close'].notna()]
+    index = frame.index
+    if getattr(index, 'tz', None) is not None:
+        # Exchange-local dates, as Yahoo labels daily bars
+        index = index.tz_localize(None)
+    bars = np.empty(len(frame), BAR_DTYPE)
+    bars['date'] = index.to_numpy().astype('M8[D]')
+    for field in BAR_FIELDS:
+        if field == 'Volume':
+            values = frame[field].fillna(0).to_numpy(dtype=np.int64) if field in frame.columns else 0
+        else:
+            values = frame[field].to_numpy(dtype=float) if field in frame.columns else np.nan
+        bars[field.lower()] = values
+    return _dedupe(bars)
+
+def _dedupe(bars: np.ndarray) -> np.ndarray:
+    """Sorted by date, keeping the last record of any repeated date"""
+    order = np.argsort(bars['date'], kind='stable')
+    bars = bars[order]
+    if len(bars) > 1:
+        last = np.append(bars['date'][1:] != bars['date'][:-1], True)
+        bars = bars[last]
+    return bars
+
+def merge_bars(current: np.ndarray, incoming: np.ndarray) -> np.ndarray:
+    """current with incoming's bars added; incoming wins on dates both have"""
+    if not len(incoming):
+        return current
+    if not len(current):
+        return incoming
+    return _dedupe(np.concatenate([current, incoming]))
+
+def bars_to_columns(bars: np.ndarray) -> Dict[str, Any]:
+    """Columns as get_historical_columns returns them (contiguous copies, detached from the file)"""
+    return {
+        'date': np.datetime_as_string(bars['date'], unit='D').tolist(),
+        'open': np.ascontiguousarray(bars['open']),
+        'high': np.ascontiguousarray(bars['high']),
+        'low': np.ascontiguousarray(bars['low']),
+        'close': np.ascontiguousarray(bars['close']),
+        'volume': np.ascontiguousarray(bars['volume']),
+    }
+
+def _reloaded(current: np.ndarray, tail: np.ndarray, anchor: np.datetime64) -> bool:
+    """True when tail's bar for anchor disagrees with the stored one (history was re-adjusted)"""
+    if not len(tail):
+        return False
+    stored = current['close'][current['date'] == anchor]
+    fetched = tail['close'][tail['date'] == anchor]
+    if not len(stored) or not len(fetched):
+        return True
+    return abs(fetched[0] - stored[0]) > ADJUSTMENT_TOLERANCE * abs(stored[0])
+
+class BarStore:
+    """Memory-mapped per-symbol bar files with upstream gap filling"""
+
+    def __init__(self, root: str = BAR_STORE_DIR, intervals: Iterable[str] = BAR_STORE_INTERVALS,
+                 refresh: float = BAR_STORE_REFRESH, enabled: bool = BAR_STORE_ENABLED):
+        self.root = root
+        self.intervals = tuple(intervals)
+        self.refresh = refresh
+        self.enabled = enabled
+        self._lock = Lock()
+        self._symbol_locks: Dict[Tuple[str, str], Lock] = {}
+        self._maps: 'OrderedDict[str, Tuple[Tuple[int, int], np.ndarray]]' = OrderedDict()
+        self._stats = {'reads': 0, 'fetches': 0, 'fetched_bars': 0, 'reloads': 0, 'errors': 0}
+
+    def serves(self, period: str, interval: str) -> bool:
+        """Whether requests for period / interval are answered from the store"""
+        return self.enabled and interval in self.intervals and period_start(period) is not None
+
+    def _paths(self, symbol: str, interval: str) -> Tuple[str, str]:
+        base = os.path.join(self.root, interval, quote(symbol.upper(), safe=''))
+        return f"{base}.npy", f"{base}.json"
+
+    def _symbol_lock(self, symbol: str, interval: str) -> Lock:
+        with self._lock:
+            return self._symbol_locks.setdefault((symbol, interval), Lock())
+
+    def read(self, symbol: str, interval: str = '1d') -> np.ndarray:
+        """Every stored bar for symbol, memory mapped (read-only); empty when none"""
+        path, _ = self._paths(symbol, interval)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return np.empty(0, BAR_DTYPE)
+        version = (stat.st_mtime_ns, stat.st_ino)
+        with self._lock:
+            self._stats['reads'] += 1
+            cached = self._maps.get(path)
+            if cached is not None and cached[0] == version:
+                self._maps.move_to_end(path)
+                return cached[1]
+        bars = np.load(path, mmap_mode='r')
+        with self._lock:
+            self._maps[path] = (version, bars)
+            self._maps.move_to_end(path)
+            while len(self._maps) > BAR_STORE_OPEN_FILES:
+                self._maps.popitem(last=False)
+        return bars
+
+    def version(self, symbol: str, interval: str = '1d') -> Optional[Tuple[int, int]]:
+        """Changes whenever symbol's bars are rewritten; None when none are stored"""
+        path, _ = self._paths(symbol, interval)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_ino)
+
+    def _meta(self, symbol: str, interval: str) -> Optional[Dict[str, Any]]:
+        _, path = self._paths(symbol, interval)
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable bar store metadata {path}: {e}")
+            return None
+
+    def write(self, symbol: str, interval: str, bars: np.ndarray, start: np.datetime64):
+        """
+        Replace symbol's bars, covering start..today as of now, atomically.
+        Data goes first: a crash leaves a stale sidecar, never a wrong one.
+        """
+        path, meta_path = self._paths(symbol, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if len(bars):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                np.save(f, np.ascontiguousarray(bars, dtype=BAR_DTYPE))
+            os.replace(tmp, path)
+        elif os.path.exists(path):
+            os.remove(path)
+        meta = {'start': str(start), 'checked_at': time.time(), 'bars': int(len(bars))}
+        tmp = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+    def missing_ranges(self, symbol: str, interval: str, start: np.datetime64) -> List[Range]:
+        """Ranges to fetch before symbol's bars cover start..today"""
+        meta = self._meta(symbol, interval)
+        bars = self.read(symbol, interval)
+        stale = meta is None or time.time() - meta.get('checked_at', 0) > self.refresh
+        if meta is None or (stale and not len(bars)):
+            return [('full', start, None)]
+        ranges = []
+        covered_from = np.datetime64(meta['start'], 'D')
+        if start < covered_from:
+            ranges.append(('head', start, bars['date'][0] + 1 if len(bars) else None))
+        if stale and len(bars):
+            # From the last complete bar: the newest one may be a partial session
+            ranges.append(('tail', bars['date'][-2 if len(bars) > 1 else -1], None))
+        return ranges
+
+    def _apply(self, symbol: str, interval: str, start: np.datetime64,
+               fetched: List[Tuple[Range, np.ndarray]]) -> bool:
+        """Merge fetched ranges into symbol's file; False when a re-adjustment calls for a full reload"""
+        meta = self._meta(symbol, interval) or {}
+        bars = self.read(symbol, interval)
+        covered_from = np.datetime64(meta['start'], 'D') if meta.get('start') else start
+        for (kind, range_start, _), incoming in fetched:
+            if kind == 'full':
+                bars, covered_from = incoming, range_start
+            elif kind == 'head':
+                bars, covered_from = merge_bars(bars, incoming), min(covered_from, range_start)
+            else:
+                if len(bars) > 1 and _reloaded(bars, incoming, range_start):
+                    return False
+                bars = merge_bars(bars, incoming)
+        self.write(symbol, interval, bars, covered_from)
+        return True
+
+    def _fetch(self, groups: Dict[Range, List[str]], fetch_many: FetchMany, batch_size: int,
+               errors: Dict[str, str]) -> Dict[str, List[Tuple[Range, np.ndarray]]]:
+        fetched: Dict[str, List[Tuple[Range, np.ndarray]]] = defaultdict(list)
+        batches = [
+            (bar_range, group[i:i + batch_size])
+            for bar_range, group in groups.items()
+            for i in range(0, len(group), batch_size)
+        ]
+        for bar_range, symbols in batches:
+            _, range_start, range_end = bar_range
+            try:
+                frames = fetch_many(symbols, range_start, range_end)
+            except Exception as e:
+                logger.warning(f"Bar fetch {range_start}..{range_end or 'today'} failed for {len(symbols)} symbols: {e}")
+                with self._lock:
+                    self._stats['errors'] += 1
+                for symbol in symbols:
+                    errors[symbol] = str(e)
+                continue
+            for symbol in symbols:
+                bars = frame_to_bars(frames.get(symbol))
+                fetched[symbol].append((bar_range, bars))
+                with self._lock:
+                    self._stats['fetched_bars'] += len(bars)
+            with self._lock:
+                self._stats['fetches'] += 1
+        return fetched
+
+    def load_many(self, symbols: Iterable[str], interval: str, period: str, fetch_many: FetchMany,
+                  batch_size: int = 100) -> Tuple[Dict[str, np.ndarray], Dict[str, str]]:
+        """
+        Bars covering period for each symbol, filling gaps upstream first with
+        one fetch_many call per distinct missing range and batch_size symbols.
+        Returns ({symbol: bars view}, {symbol: error}); a symbol whose fetch
+        failed keeps its stored bars, if any.
+        """
+        start = period_start(period)
+        symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        pending = [s for s in symbols if self.missing_ranges(s, interval, start)]
+        errors: Dict[str, str] = {}
+        if pending:
+            # Sorted acquisition, so overlapping batches can't deadlock
+            locks = [self._symbol_lock(s, interval) for s in sorted(pending)]
+            for lock in locks:
+                lock.acquire()
+            try:
+                self._fill(pending, interval, start, fetch_many, batch_size, errors)
+            finally:
+                for lock in reversed(locks):
+                    lock.release()
+        return {s: slice_period(self.read(s, interval), period) for s in symbols}, errors
+
+    def _fill(self, symbols: List[str], interval: str, start: np.datetime64, fetch_many: FetchMany,
+              batch_size: int, errors: Dict[str, str]):
+        groups: Dict[Range, List[str]] = defaultdict(list)
+        for symbol in symbols:
+            # Re-planned under the lock: another request may have filled it meanwhile
+            for bar_range in self.missing_ranges(symbol, interval, start):
+                groups[bar_range].append(symbol)
+        fetched = self._fetch(groups, fetch_many, batch_size, errors)
+
+        reloads: Dict[Range, List[str]] = defaultdict(list)
+        for symbol, ranges in fetched.items():
+            if symbol in errors:
+                continue
+            if not self._apply(symbol, interval, start, ranges):
+                meta = self._meta(symbol, interval) or {}
+                covered_from = min(start, np.datetime64(meta.get('start', str(start)), 'D'))
+                reloads[('full', covered_from, None)].append(symbol)
+        if reloads:
+            logger.info(f"Reloading re-adjusted history for {sum(len(s) for s in reloads.values())} symbols")
+            with self._lock:
+                self._stats['reloads'] += sum(len(s) for s in reloads.values())
+            for symbol, ranges in self._fetch(reloads, fetch_many, batch_size, errors).items():
+                if symbol not in errors:
+                    self._apply(symbol, interval, start, ranges)
+
+    def load(self, symbol: str, interval: str, period: str,
+             fetch: Callable[[np.datetime64, Optional[np.datetime64]], pd.DataFrame]) -> np.ndarray:
+        """
+        Bars covering period for one symbol. Raises the fetch error when
+        nothing is stored to fall back on.
+        """
+        symbol = symbol.upper()
+        loaded, errors = self.load_many([symbol], interval, period,
+                                        lambda _symbols, start, end: {symbol: fetch(start, end)})
+        bars = loaded[symbol]
+        if symbol in errors and not len(bars):
+            raise RuntimeError(errors[symbol])
+        return bars
+
+    def stats(self) -> Dict[str, Any]:
+        symbols, size = 0, 0
+        for interval in self.intervals:
+            directory = os.path.join(self.root, interval)
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                if entry.name.endswith('.npy'):
+                    symbols += 1
+                    size += entry.stat().st_size
+        with self._lock:
+            return {
+                **self._stats,
+                'enabled': self.enabled,
+                'intervals': list(self.intervals),
+                'symbols': symbols,
+                'bytes': size,
+                'open_files': len(self._maps),
+            }
+
+history_store = BarStore()
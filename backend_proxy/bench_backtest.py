@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the vectorized backtest engine.
+
+Seeds a temporary bar store with random-walk daily bars (500 symbols x 10
+years by default), then times both rules end to end through
+backtest.run_backtest: inline, and fanned out over the process pool with
+increasing worker counts. Nothing is fetched upstream.
+
+Usage: python bench_backtest.py [symbols] [years]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# The store location and cache settings are read at import
+os.environ['BAR_STORE_DIR'] = tempfile.mkdtemp(prefix='bench_bars_')
+os.environ.setdefault('YF_FILE_CACHE', 'false')
+
+import numpy as np
+
+import backtest
+import yahoo_finance
+from bar_store import BAR_DTYPE, EARLIEST, history_store
+
+TRADING_DAYS = 252
+
+def seed_store(symbols, years):
+    """Random-walk bars for every symbol, ending today (recorded as all the history there is)"""
+    rng = np.random.default_rng(42)
+    count = years * TRADING_DAYS
+    dates = np.busday_offset(np.datetime64('today', 'D'), -np.arange(count)[::-1], roll='backward')
+    for i in range(symbols):
+        close = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, count)))
+        bars = np.empty(count, BAR_DTYPE)
+        bars['date'] = dates
+        bars['open'] = close * (1 + rng.normal(0, 0.003, count))
+        bars['high'] = close * (1 + np.abs(rng.normal(0, 0.01, count)))
+        bars['low'] = close * (1 - np.abs(rng.normal(0, 0.01, count)))
+        bars['close'] = close
+        bars['volume'] = rng.integers(100_000, 10_000_000, count)
+        history_store.write(f"SYM{i}", '1d', bars, EARLIEST)
+    return [f"SYM{i}" for i in range(symbols)]
+
+def timed(symbols, spec, workers):
+    backtest.BACKTEST_WORKERS = workers
+    backtest._reset_executor()
+    if workers > 1:
+        # Start the pool outside the timing
+        list(backtest._executor().map(abs, range(workers)))
+    yahoo_finance.cache_storage.clear()
+    start = time.perf_counter()
+    result = backtest.run_backtest(symbols, spec)
+    return time.perf_counter() - start, result
+
+def run_benchmark():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    years = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    started = time.perf_counter()
+    symbols = seed_store(count, years)
+    print(f"Seeded {count} symbols x {years}y in {time.perf_counter() - started:.2f}s "
+          f"({history_store.stats()['bytes'] / 1e6:.1f} MB on disk)")
+
+    period = 'max'
+    specs = {
+        'recommendation': backtest.parse_spec({'period': period}),
+        'filter': backtest.parse_spec({'period': period, 'entry': 'rsi14 < 30', 'exit': 'rsi14 > 55',
+                                       'commission_per_share': 0.005}),
+    }
+    worker_counts = sorted({1, 2, os.cpu_count() or 1})
+    print(f"{'rule':>16} {'workers':>8} {'total s':>8} {'compute s':>10} {'portfolio':>10}")
+    for name, spec in specs.items():
+        for workers in worker_counts:
+            elapsed, result = timed(symbols, spec, workers)
+            print(f"{name:>16} {workers:>8} {elapsed:>8.2f} {result['elapsed']['compute']:>10.2f} "
+                  f"{result['portfolio']['total_return']:>10.4f}")
+    backtest._reset_executor(wait=True)
+
+if __name__ == "__main__":
+    run_benchmark()
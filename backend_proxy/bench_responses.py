@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark for response encoding on the history and options chain routes.
+
+Encodes payloads shaped like /api/yahoo/history (daily bars) and
+/api/options/chain responses with the stdlib json module and with
+FastJSONProvider, then compresses them with gzip (and brotli when
+installed). Reports encode time and bytes on the wire for each.
+
+Usage: python bench_responses.py
+"""
+
+import gzip
+import json
+import random
+import time
+
+from flask import Flask
+
+import response_encoding
+from response_encoding import FastJSONProvider
+
+REPEATS = 5
+HISTORY_DAYS = [252, 1260, 5040]   # 1y, 5y, 20y of daily bars
+CHAIN_STRIKES = [50, 200, 800]     # contracts per side
+
+def make_history(days):
+    """Daily bars as returned by yahoo_finance.get_historical_prices"""
+    rng = random.Random(42)
+    price = 100.0
+    bars = []
+    for i in range(days):
+        price *= 1 + rng.gauss(0.0004, 0.015)
+        bars.append({
+            'date': f"{2000 + i // 252}-{1 + (i // 21) % 12:02d}-{1 + i % 21:02d}",
+            'open': price * (1 + rng.gauss(0, 0.003)),
+            'high': price * (1 + abs(rng.gauss(0, 0.01))),
+            'low': price * (1 - abs(rng.gauss(0, 0.01))),
+            'close': price,
+            'volume': rng.randint(1_000_000, 50_000_000),
+        })
+    return bars
+
+def make_chain(strikes):
+    """An options chain response body with `strikes` contracts per side"""
+    rng = random.Random(7)
+    expiry = '2026-11-20'
+
+    def side(kind):
+        return [
+            {
+                'symbol': f"AAPL261120{kind}{int(strike * 1000):08d}",
+                'strike': strike,
+                'expiry': expiry,
+                'bid': round(rng.uniform(0.1, 30), 2),
+                'ask': round(rng.uniform(0.1, 30), 2),
+                'last': round(rng.uniform(0.1, 30), 2),
+                'volume': rng.randint(0, 20000),
+                'openInterest': rng.randint(0, 50000),
+                'impliedVolatility': rng.uniform(0.15, 0.9),
+                'percentChange': rng.uniform(-40, 40),
+            }
+            for strike in (50 + 2.5 * i for i in range(strikes))
+        ]
+
+    return {
+        'underlying': 'AAPL',
+        'underlyingPrice': 187.32,
+        'expirationDates': [expiry],
+        'calls': side('C'),
+        'puts': side('P'),
+        'timestamp': time.time(),
+    }
+
+def best_of(func, *args):
+    """Best wall time in milliseconds over REPEATS runs, and the last result"""
+    best, result = float('inf'), None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+def stdlib_encode(payload):
+    # What Flask's default provider does for a compact response
+    return json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+def run_benchmark():
+    app = Flask(__name__)
+    provider = FastJSONProvider(app)
+    encoder = 'orjson' if response_encoding.orjson is not None else 'json (orjson not installed)'
+    print(f"FastJSONProvider encoder: {encoder}")
+    header = f"{'payload':>16} {'json ms':>8} {'fast ms':>8} {'raw KB':>8} {'gzip ms':>8} {'gzip KB':>8}"
+    if response_encoding.brotli is not None:
+        header += f" {'br ms':>7} {'br KB':>7}"
+    print(header)
+
+    cases = [(f"history {days}d", make_history(days)) for days in HISTORY_DAYS]
+    cases += [(f"chain {strikes}x2", make_chain(strikes)) for strikes in CHAIN_STRIKES]
+    for label, payload in cases:
+        json_ms, reference = best_of(stdlib_encode, payload)
+        fast_ms, body = best_of(provider._encode, payload, True, False)
+        assert json.loads(body) == json.loads(reference)
+
+        gzip_ms, gzipped = best_of(gzip.compress, body, response_encoding.COMPRESS_GZIP_LEVEL)
+        row = (f"{label:>16} {json_ms:>8.2f} {fast_ms:>8.2f} {len(body) / 1024:>8.1f} "
+               f"{gzip_ms:>8.2f} {len(gzipped) / 1024:>8.1f}")
+        if response_encoding.brotli is not None:
+            br_ms, compressed = best_of(
+                lambda data: response_encoding.brotli.compress(data, quality=response_encoding.COMPRESS_BROTLI_QUALITY), body
+            )
+            row += f" {br_ms:>7.2f} {len(compressed) / 1024:>7.1f}"
+        print(row)
+
+if __name__ == "__main__":
+    run_benchmark()
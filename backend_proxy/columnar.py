@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Columnar response formats for AlphaSphere's bulk data routes.
+
+Clients that send `Accept: application/vnd.apache.arrow.stream` (Arrow IPC
+stream, needs pyarrow) or `Accept: application/msgpack` (needs msgpack) get
+one table of columns instead of a JSON array of per-row objects: key names
+appear once, numeric columns stay typed, and columns already held as NumPy
+arrays in the caches are encoded without building a dict per row.
+
+A table is {column name: list or 1-d array} plus a small metadata dict
+(underlying, timestamps, ...). Arrow carries the metadata as JSON strings
+in the schema metadata; MessagePack as {"metadata": {...}, "columns": {...}}.
+Both libraries are optional: without them the routes keep answering JSON.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from flask import Response, request
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+def _encoders() -> List[tuple]:
+    """(format, mimetypes) for every installed encoder"""
+    encoders = []
+    if pa is not None:
+        encoders.append(('arrow', (ARROW_MIMETYPE,)))
+    if msgpack is not None:
+        encoders.append(('msgpack', MSGPACK_MIMETYPES))
+    return encoders
+
+def negotiate_format() -> Optional[str]:
+    """
+    'arrow' or 'msgpack' when the request's Accept header names one of
+    them explicitly, at no lower quality than JSON, and its encoder is
+    installed; else None. Wildcards (*/*) keep meaning JSON.
+    """
+    accept = request.accept_mimetypes
+    listed = {value: quality for value, quality in accept}
+    best, best_quality = None, accept['application/json']
+    for name, mimetypes in _encoders():
+        quality = max((listed[m] for m in mimetypes if m in listed), default=0)
+        if quality > 0 and quality >= best_quality:
+            best, best_quality = name, quality
+    return best
+
+def rows_to_columns(rows: List[Dict[str, Any]], names: Optional[Sequence[str]] = None) -> Dict[str, List[Any]]:
+    """Columns from row dicts (for data that isn't already columnar)"""
+    names = list(names) if names is not None else list(rows[0].keys()) if rows else []
+    return {name: [row.get(name) for row in rows] for name in names}
+
+def concat_columns(tables: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Stack tables with the same columns"""
+    names = list(tables[0].keys())
+    columns = {}
+    for name in names:
+        parts = [table[name] for table in tables]
+        if all(isinstance(part, np.ndarray) for part in parts):
+            columns[name] = np.concatenate(parts)
+        else:
+            columns[name] = [value for part in parts for value in (part.tolist() if isinstance(part, np.ndarray) else part)]
+    return columns
+
+def encode_arrow(columns: Dict[str, Any], metadata: Dict[str, Any]) -> bytes:
+    table = pa.table({name: pa.array(values) for name, values in columns.items()})
+    table = table.replace_schema_metadata({key: json.dumps(value) for key, value in metadata.items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def encode_msgpack(columns: Dict[str, Any], metadata: Dict[str, Any]) -> bytes:
+    packed_columns = {
+        name: values.tolist() if isinstance(values, np.ndarray) else list(values)
+        for name, values in columns.items()
+    }
+    return msgpack.packb({'metadata': metadata, 'columns': packed_columns}, use_bin_type=True)
+
+def columnar_response(fmt: str, columns: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None) -> Response:
+    """Encode a table in fmt ('arrow' or 'msgpack') as a response"""
+    metadata = metadata or {}
+    if fmt == 'arrow':
+        response = Response(encode_arrow(columns, metadata), mimetype=ARROW_MIMETYPE)
+    else:
+        response = Response(encode_msgpack(columns, metadata), mimetype=MSGPACK_MIMETYPES[0])
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Technical indicators for AlphaSphere.
+
+Computes SMA, EMA, RSI, MACD and Bollinger Bands over the cached Yahoo
+Finance history. The first request for a series computes each indicator
+over the whole window with vectorized NumPy/pandas ops; the engine then
+keeps the indicator state (EMA values, Wilder averages) so that when the
+history gains a bar, or today's bar is revised, only that bar is stepped
+instead of recomputing the window. Daily series run over every bar the
+bar store holds, so their start stays put while the requested period
+slides; only a longer stored history or re-adjusted closes recompute them.
+
+Indicator names: sma<n>, ema<n>, rsi<n> (rsi = rsi14), macd (12/26/9) or
+macd<fast>_<slow>_<signal>, bb<n> or bb<n>_<k> (bb = bb20_2).
+"""
+
+import logging
+import math
+import os
+import re
+from dataclasses import dataclass
+from threading import RLock
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import yahoo_finance
+from bar_store import history_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDICATOR_SET = os.getenv('DEFAULT_INDICATOR_SET', 'sma20,sma50,ema20,rsi14,macd,bb20')
+MAX_INDICATOR_WINDOW = 500
+# More new bars than this and the series is rebuilt instead of stepped
+MAX_INCREMENTAL_BARS = 50
+
+_NAME_PATTERN = re.compile(r"^([a-z]+)(\d+(?:\.\d+)?(?:_\d+(?:\.\d+)?)*)?$")
+
+DEFAULT_PARAMS = {
+    'sma': (20,),
+    'ema': (20,),
+    'rsi': (14,),
+    'macd': (12, 26, 9),
+    'bb': (20, 2.0),
+}
+
+OUTPUTS = {
+    'sma': ('sma',),
+    'ema': ('ema',),
+    'rsi': ('rsi',),
+    'macd': ('macd', 'signal', 'histogram'),
+    'bb': ('middle', 'upper', 'lower'),
+}
+
+@dataclass(frozen=True)
+class IndicatorSpec:
+    """A parsed indicator request, e.g. rsi14 -> ('rsi', (14,))"""
+    name: str
+    kind: str
+    params: Tuple[float, ...]
+
+def parse_indicator_set(text: Optional[str]) -> List[IndicatorSpec]:
+    """Parse a comma-separated indicator list; raises ValueError on unknown names"""
+    specs = []
+    for raw in (text or DEFAULT_INDICATOR_SET).split(','):
+        name = raw.strip().lower()
+        if not name:
+            continue
+        match = _NAME_PATTERN.match(name)
+        if not match or match.group(1) not in DEFAULT_PARAMS:
+            raise ValueError(f"Unknown indicator: {raw.strip()}")
+        kind = match.group(1)
+        defaults = DEFAULT_PARAMS[kind]
+        given = [float(p) for p in match.group(2).split('_')] if match.group(2) else []
+        if len(given) > len(defaults):
+            raise ValueError(f"Too many parameters for {kind}: {raw.strip()}")
+        params = list(given) + list(defaults[len(given):])
+        # Every parameter except the Bollinger width is a bar count
+        windows = params[:1] if kind == 'bb' else params
+        if any(p != int(p) or p < 1 or p > MAX_INDICATOR_WINDOW for p in windows):
+            raise ValueError(f"Invalid window for {kind}: {raw.strip()}")
+        if kind == 'macd' and params[0] >= params[1]:
+            raise ValueError(f"MACD fast period must be shorter than slow: {raw.strip()}")
+        params = tuple(int(p) for p in windows) + tuple(params[len(windows):])
+        specs.append(IndicatorSpec(name, kind, params))
+    return list(dict.fromkeys(specs))
+
+# --- Vectorized full-window computation ---
+#
+# compute_full returns (outputs, state) where state is the recursive state
+# after the second-to-last bar, so the last bar can always be re-stepped.
+
+def _ema(values: np.ndarray, alpha: float) -> np.ndarray:
+    return pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+def _rolling(closes: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Rolling mean and population std; NaN until the window is full"""
+    rolling = pd.Series(closes).rolling(window)
+    return rolling.mean().to_numpy(), rolling.std(ddof=0).to_numpy()
+
+def _masked(values: np.ndarray, valid_from: int) -> np.ndarray:
+    values = values.copy()
+    values[:valid_from] = np.nan
+    return values
+
+def _rsi_value(gain: float, loss: float) -> float:
+    if loss == 0:
+        return 100.0 if gain > 0 else 50.0
+    return 100.0 - 100.0 / (1.0 + gain / loss)
+
+def compute_full(spec: IndicatorSpec, closes: np.ndarray) -> Tuple[Dict[str, np.ndarray], Optional[Dict[str, float]]]:
+    n = len(closes)
+    kind, params = spec.kind, spec.params
+
+    if kind == 'sma':
+        mean, _ = _rolling(closes, params[0])
+        return {'sma': mean}, None
+
+    if kind == 'bb':
+        mean, std = _rolling(closes, params[0])
+        return {'middle': mean, 'upper': mean + params[1] * std, 'lower': mean - params[1] * std}, None
+
+    if kind == 'ema':
+        ema = _ema(closes, 2.0 / (params[0] + 1))
+        state = {'ema': float(ema[-2])} if n >= 2 else None
+        return {'ema': _masked(ema, params[0] - 1)}, state
+
+    if kind == 'rsi':
+        window = params[0]
+        rsi = np.full(n, np.nan)
+        state = None
+        if n >= 2:
+            delta = np.diff(closes)
+            gains = _ema(np.clip(delta, 0, None), 1.0 / window)
+            losses = _ema(np.clip(-delta, 0, None), 1.0 / window)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = np.where(losses == 0, np.where(gains > 0, 100.0, 50.0), 100.0 - 100.0 / (1.0 + gains / losses))
+            rsi[1:] = values
+            rsi = _masked(rsi, window)
+            if n >= 3:
+                state = {'gain': float(gains[-2]), 'loss': float(losses[-2])}
+        return {'rsi': rsi}, state
+
+    if kind == 'macd':
+        fast, slow, signal_window = params
+        ema_fast = _ema(closes, 2.0 / (fast + 1))
+        ema_slow = _ema(closes, 2.0 / (slow + 1))
+        macd = ema_fast - ema_slow
+        signal = _ema(macd, 2.0 / (signal_window + 1))
+        outputs = {
+            'macd': _masked(macd, slow - 1),
+            'signal': _masked(signal, slow + signal_window - 2),
+            'histogram': _masked(macd - signal, slow + signal_window - 2),
+        }
+        state = {'fast': float(ema_fast[-2]), 'slow': float(ema_slow[-2]), 'signal': float(signal[-2])} if n >= 2 else None
+        return outputs, state
+
+    raise ValueError(f"Unknown indicator: {spec.name}")
+
+# --- Incremental step ---
+
+def step(spec: IndicatorSpec, state: Optional[Dict[str, float]], closes: List[float]) -> Tuple[Dict[str, float], Optional[Dict[str, float]]]:
+    """
+    Outputs for the last of `closes`, given the state after the bar before it.
+    Returns (outputs, state after this bar).
+    """
+    n = len(closes)
+    price = closes[-1]
+    kind, params = spec.kind, spec.params
+
+    if kind in ('sma', 'bb'):
+        window = params[0]
+        if n < window:
+            return {key: math.nan for key in OUTPUTS[kind]}, None
+        recent = np.asarray(closes[-window:], dtype=float)
+        mean = float(recent.mean())
+        if kind == 'sma':
+            return {'sma': mean}, None
+        std = float(recent.std())
+        return {'middle': mean, 'upper': mean + params[1] * std, 'lower': mean - params[1] * std}, None
+
+    if kind == 'ema':
+        alpha = 2.0 / (params[0] + 1)
+        ema = price if state is None else state['ema'] + alpha * (price - state['ema'])
+        return {'ema': ema if n >= params[0] else math.nan}, {'ema': ema}
+
+    if kind == 'rsi':
+        window = params[0]
+        if n < 2:
+            return {'rsi': math.nan}, None
+        delta = price - closes[-2]
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        if state is not None:
+            gain = state['gain'] + (gain - state['gain']) / window
+            loss = state['loss'] + (loss - state['loss']) / window
+        return {'rsi': _rsi_value(gain, loss) if n > window else math.nan}, {'gain': gain, 'loss': loss}
+
+    if kind == 'macd':
+        fast, slow, signal_window = params
+        if state is None:
+            ema_fast = ema_slow = price
+            signal = 0.0
+        else:
+            ema_fast = state['fast'] + 2.0 / (fast + 1) * (price - state['fast'])
+            ema_slow = state['slow'] + 2.0 / (slow + 1) * (price - state['slow'])
+            signal = state['signal'] + 2.0 / (signal_window + 1) * ((ema_fast - ema_slow) - state['signal'])
+        macd_value = ema_fast - ema_slow
+        signal_ready = n >= slow + signal_window - 1
+        outputs = {
+            'macd': macd_value if n >= slow else math.nan,
+            'signal': signal if signal_ready else math.nan,
+            'histogram': macd_value - signal if signal_ready else math.nan,
+        }
+        return outputs, {'fast': ema_fast, 'slow': ema_slow, 'signal': signal}
+
+    raise ValueError(f"Unknown indicator: {spec.name}")
+
+class IndicatorEngine:
+    """Per-series indicator state, stepped as new bars arrive"""
+
+    def __init__(self):
+        self._lock = RLock()
+        # key -> {'dates', 'closes', 'tracks', 'version'}
+        # tracks: spec -> {'state', 'outputs': {key: [values]}}
+        self._series: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+
+    @staticmethod
+    def _full_track(spec: IndicatorSpec, closes: List[float]) -> Dict[str, Any]:
+        outputs, state = compute_full(spec, np.asarray(closes, dtype=float))
+        return {'state': state, 'outputs': {key: values.tolist() for key, values in outputs.items()}}
+
+    def _rebuild(self, dates: List[str], closes: List[float], specs: List[IndicatorSpec]) -> Dict[str, Any]:
+        return {
+            'dates': list(dates),
+            'closes': list(closes),
+            'tracks': {spec: self._full_track(spec, closes) for spec in specs},
+        }
+
+    def _advance(self, series: Dict[str, Any], dates: List[str], closes: List[float]) -> bool:
+        """
+        Step every track through the bars from the last known one on; False
+        if a rebuild is needed. The recursive indicators depend on where the
+        series starts, so the new bars must extend it unchanged: same first
+        bar and same earlier closes. A moved start or a re-adjusted close is
+        rebuilt so the result always matches compute_full.
+        """
+        known_dates, known_closes = series['dates'], series['closes']
+        known = len(known_dates)
+        if known < 2 or len(dates) < known or len(dates) - known >= MAX_INCREMENTAL_BARS:
+            return False
+        if dates[0] != known_dates[0] or dates[known - 1] != known_dates[-1]:
+            return False
+        if list(closes[:known - 1]) != known_closes[:-1]:
+            return False
+        if len(dates) == known and closes[-1] == known_closes[-1]:
+            return True  # nothing new
+
+        # Drop the last bar and replay it (it may have been revised) plus any new ones
+        known_dates.pop()
+        known_closes.pop()
+        for track in series['tracks'].values():
+            for values in track['outputs'].values():
+                values.pop()
+
+        for i in range(known - 1, len(dates)):
+            known_dates.append(dates[i])
+            known_closes.append(closes[i])
+            is_last = i == len(dates) - 1
+            for spec, track in series['tracks'].items():
+                outputs, state = step(spec, track['state'], known_closes)
+                for key, value in outputs.items():
+                    track['outputs'][key].append(value)
+                if not is_last:
+                    track['state'] = state
+        return True
+
+    def update(self, key: Tuple[str, ...], dates: List[str], closes: List[float],
+               specs: List[IndicatorSpec]) -> Dict[str, Any]:
+        """Bring the series up to date with the bars and make sure every spec is tracked"""
+        with self._lock:
+            series = self._series.get(key)
+            if series is None or not self._advance(series, dates, closes):
+                series = self._rebuild(dates, closes, specs)
+                self._series[key] = series
+            for spec in specs:
+                if spec not in series['tracks']:
+                    series['tracks'][spec] = self._full_track(spec, series['closes'])
+            return series
+
+    def update_stored(self, symbol: str, interval: str, specs: List[IndicatorSpec]) -> Optional[Dict[str, Any]]:
+        """
+        Series over every bar the bar store holds for symbol, so the state
+        stays anchored however the requested period slides. An unchanged
+        file is not re-read. None when nothing is stored.
+        """
+        key = (symbol, interval)
+        version = history_store.version(symbol, interval)
+        if version is None:
+            return None
+        with self._lock:
+            series = self._series.get(key)
+            if series is not None and series.get('version') == version:
+                return self.update(key, series['dates'], series['closes'], specs)
+            bars = history_store.read(symbol, interval)
+            if not len(bars):
+                return None
+            series = self.update(key, np.datetime_as_string(bars['date'], unit='D').tolist(),
+                                 bars['close'].tolist(), specs)
+            series['version'] = version
+            return series
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+def _clean(value: float) -> Optional[float]:
+    return round(value, 6) if value is not None and math.isfinite(value) else None
+
+def get_indicators(symbol: str, indicator_set: Optional[str] = None, period: str = '1y',
+                   interval: str = '1d', points: int = 1) -> Optional[Dict[str, Any]]:
+    """
+    Indicators for a symbol over its cached history.
+
+    Returns the latest value of every output plus the last `points` values
+    (at most the period's bars) as series aligned with `dates`. None if
+    there is no history. Raises ValueError for an unknown indicator.
+    """
+    specs = parse_indicator_set(indicator_set)
+    symbol = symbol.upper()
+    series = None
+    with indicator_engine._lock:
+        if history_store.serves(period, interval):
+            # Brings the store up to date; indicators then run over all stored bars
+            columns = yahoo_finance.get_historical_columns(symbol, period, interval)
+            if columns:
+                series = indicator_engine.update_stored(symbol, interval, specs)
+                window = len(columns['date'])
+        else:
+            history = yahoo_finance.get_historical_prices(symbol, period, interval)
+            if history:
+                series = indicator_engine.update((symbol, period, interval), [bar['date'] for bar in history],
+                                                 [bar['close'] for bar in history], specs)
+                window = len(history)
+        if series is None:
+            return None
+
+        points = min(max(1, points), window)
+        dates = series['dates'][-points:]
+        indicators = {}
+        latest = {}
+        for spec in specs:
+            outputs = series['tracks'][spec]['outputs']
+            indicators[spec.name] = {key: [_clean(v) for v in values[-points:]] for key, values in outputs.items()}
+            latest[spec.name] = {key: _clean(values[-1]) for key, values in outputs.items()}
+
+    return {
+        'symbol': symbol,
+        'period': period,
+        'interval': interval,
+        'asOf': dates[-1],
+        'latest': latest,
+        'dates': dates,
+        'indicators': indicators,
+    }
+
+# Global instance
+indicator_engine = IndicatorEngine()
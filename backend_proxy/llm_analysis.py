@@ -5,18 +5,28 @@ Provides intelligent market analysis and trading recommendations.
 """
 
 import json
-import requests
-from typing import Dict, List, Any, Optional
+import hashlib
+import time
+import threading
+from typing import Dict, List, Any, Optional, Callable, Tuple, Union
 from datetime import datetime, timedelta
-import pandas as pd
 import numpy as np
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import logging
 
+import volatility
+import yahoo_finance
+from response_encoding import content_etag
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# How long intermediate analysis stages stay cached (seconds). The frontend
+# fans out across the /api/analyze* endpoints with the same payload, so a
+# short TTL is enough for them to share work.
+ANALYSIS_CACHE_DURATION = 60
+
 @dataclass
 class MarketContext:
     """Market context information"""
@@ -25,6 +35,7 @@ class MarketContext:
     sector_performance: Dict[str, float]
     market_trend: str
     key_events: List[str]
+    volatility_metrics: Dict[str, Dict[str, Any]] = field(default_factory=dict)
 
 @dataclass
 class TradingOpportunity:
@@ -52,13 +63,237 @@ class TradingRecommendation:
     priority: str  # 'high', 'medium', 'low'
     timeframe: str
 
+# Opportunity classes in evaluation order: (type, signal description, risk level)
+OPPORTUNITY_TYPES = [
+    ("momentum", "Strong bullish", "medium"),
+    ("dip_buying", "Moderate bullish", "low"),
+    ("mean_reversion", "Strong bearish", "high"),
+    ("breakout", "Moderate bearish", "medium"),
+]
+
+@dataclass
+class PredictionScores:
+    """Vectorized summary of RL predictions, computed in one pass"""
+    symbols: np.ndarray
+    predictions: np.ndarray
+    confidences: np.ndarray
+    opportunity_class: np.ndarray  # index into OPPORTUNITY_TYPES, -1 when none
+    bullish_count: int
+    bearish_count: int
+    neutral_count: int
+    low_confidence_count: int
+    mean_prediction: float
+    
+    @property
+    def total(self) -> int:
+        return len(self.predictions)
+
+def load_predictions(
+    rl_predictions: Union[List[Dict[str, Any]], Dict[str, List[Any]]]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Load RL predictions into (symbols, predictions, confidences) arrays.
+    Accepts the usual list of dicts or a columnar dict of lists.
+    """
+    if isinstance(rl_predictions, dict):
+        predictions = np.asarray(rl_predictions.get('prediction', []), dtype=float)
+        count = len(predictions)
+        symbols = np.asarray(rl_predictions.get('symbol', [''] * count), dtype=object)
+        confidences = np.asarray(rl_predictions.get('confidence', np.zeros(count)), dtype=float)
+        return symbols, np.nan_to_num(predictions), np.nan_to_num(confidences)
+    
+    rl_predictions = rl_predictions or []
+    count = len(rl_predictions)
+    symbols = np.fromiter((pred.get('symbol', '') for pred in rl_predictions), dtype=object, count=count)
+    predictions = np.fromiter((pred.get('prediction') or 0 for pred in rl_predictions), dtype=float, count=count)
+    confidences = np.fromiter((pred.get('confidence') or 0 for pred in rl_predictions), dtype=float, count=count)
+    return symbols, predictions, confidences
+
+def score_predictions(
+    symbols: np.ndarray,
+    predictions: np.ndarray,
+    confidences: np.ndarray
+) -> PredictionScores:
+    """Compute sentiment buckets, confidence counts, mean and opportunity classes"""
+    bullish = predictions > 0.3
+    bearish = predictions < -0.3
+    high_confidence = confidences > 0.7  # High confidence threshold
+    
+    opportunity_class = np.select(
+        [
+            high_confidence & (predictions > 0.5),
+            high_confidence & bullish,
+            high_confidence & (predictions < -0.5),
+            high_confidence & bearish,
+        ],
+        [0, 1, 2, 3],
+        default=-1
+    )
+    
+    bullish_count = int(np.count_nonzero(bullish))
+    bearish_count = int(np.count_nonzero(bearish))
+    
+    return PredictionScores(
+        symbols=symbols,
+        predictions=predictions,
+        confidences=confidences,
+        opportunity_class=opportunity_class,
+        bullish_count=bullish_count,
+        bearish_count=bearish_count,
+        neutral_count=len(predictions) - bullish_count - bearish_count,
+        low_confidence_count=int(np.count_nonzero(confidences < 0.6)),
+        mean_prediction=float(predictions.mean()) if len(predictions) else 0.0
+    )
+
 class LLMAnalysisService:
     """LLM-powered market analysis service"""
     
     def __init__(self, openai_api_key: Optional[str] = None):
         self.openai_api_key = openai_api_key
         self.analysis_cache = {}
+        self._cache_lock = threading.Lock()
+        self._fingerprint_locks: Dict[str, threading.RLock] = {}
+    
+    # --- Staged pipeline / memoization ---
+    
+    def request_fingerprint(
+        self,
+        symbols: List[str],
+        market_data: Dict[str, Any],
+        rl_predictions: List[Dict[str, Any]]
+    ) -> str:
+        """
+        Stable hash of an analysis request (symbols + market_data +
+        rl_predictions), over the canonical JSON of the raw payload: one pass
+        in the JSON encoder, so a cache hit never walks the predictions in
+        Python.
+        """
+        return content_etag({
+            'symbols': sorted(str(s).upper() for s in symbols or []),
+            'market_data': market_data or {},
+            'rl_predictions': rl_predictions or [],
+        })
+    
+    def _prepare_request(
+        self,
+        symbols: List[str],
+        market_data: Dict[str, Any],
+        rl_predictions: Union[List[Dict[str, Any]], Dict[str, List[Any]]]
+    ) -> Tuple[str, PredictionScores]:
+        """Fingerprint the request; predictions are loaded and scored only on a cache miss"""
+        fingerprint = self.request_fingerprint(symbols, market_data, rl_predictions)
+        
+        scores = self._run_stage(
+            fingerprint, 'predictions',
+            lambda: score_predictions(*load_predictions(rl_predictions))
+        )
+        return fingerprint, scores
+    
+    def _get_cached_stage(self, cache_key: str) -> Any:
+        """Return a cached stage result if it has not expired"""
+        with self._cache_lock:
+            entry = self.analysis_cache.get(cache_key)
+            if entry is None:
+                return None
+            if time.time() - entry['timestamp'] > entry['duration']:
+                del self.analysis_cache[cache_key]
+                return None
+            return entry['data']
+    
+    def _set_cached_stage(self, cache_key: str, data: Any, duration: int = ANALYSIS_CACHE_DURATION):
+        """Store a stage result with expiration"""
+        with self._cache_lock:
+            self.analysis_cache[cache_key] = {
+                'data': data,
+                'timestamp': time.time(),
+                'duration': duration
+            }
+    
+    def _fingerprint_lock(self, fingerprint: str) -> threading.RLock:
+        """Per-request lock so concurrent identical requests compute each stage once"""
+        with self._cache_lock:
+            lock = self._fingerprint_locks.get(fingerprint)
+            if lock is None:
+                lock = threading.RLock()
+                self._fingerprint_locks[fingerprint] = lock
+            return lock
+    
+    def _run_stage(self, fingerprint: str, stage: str, compute: Callable[[], Any]) -> Any:
+        """Memoize a pipeline stage per request fingerprint"""
+        cache_key = f"{stage}_{fingerprint}"
+        cached = self._get_cached_stage(cache_key)
+        if cached is not None:
+            return cached
+        
+        with self._fingerprint_lock(fingerprint):
+            # Another request may have finished this stage while we waited
+            cached = self._get_cached_stage(cache_key)
+            if cached is not None:
+                return cached
+            result = compute()
+            self._set_cached_stage(cache_key, result)
+            return result
+    
+    def cleanup_expired_cache(self):
+        """Remove expired stage results and idle fingerprint locks"""
+        current_time = time.time()
+        with self._cache_lock:
+            expired_keys = [
+                key for key, entry in self.analysis_cache.items()
+                if current_time - entry['timestamp'] > entry['duration']
+            ]
+            for key in expired_keys:
+                del self.analysis_cache[key]
+            
+            live_fingerprints = {key.rsplit('_', 1)[-1] for key in self.analysis_cache}
+            for fingerprint in list(self._fingerprint_locks):
+                if fingerprint not in live_fingerprints:
+                    del self._fingerprint_locks[fingerprint]
+        
+        if expired_keys:
+            logger.info(f"Cleaned up {len(expired_keys)} expired analysis cache entries")
+    
+    def run_pipeline(
+        self,
+        symbols: List[str],
+        market_data: Dict[str, Any],
+        rl_predictions: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Run (or reuse) every analysis stage for a request"""
+        fingerprint, scores = self._prepare_request(symbols, market_data, rl_predictions)
+        
+        market_context = self._context_stage(fingerprint, symbols, market_data, scores)
+        opportunities = self._opportunities_stage(fingerprint, scores)
+        risk_factors = self._risks_stage(fingerprint, symbols, market_data, scores)
+        recommendations = self._run_stage(
+            fingerprint, 'recommendations',
+            lambda: self.generate_recommendations(market_context, opportunities, risk_factors)
+        )
+        reasoning = self._run_stage(
+            fingerprint, 'reasoning',
+            lambda: self._generate_reasoning(market_context, opportunities, risk_factors)
+        )
         
+        return {
+            'fingerprint': fingerprint,
+            'market_context': market_context,
+            'opportunities': opportunities,
+            'risk_factors': risk_factors,
+            'recommendations': recommendations,
+            'reasoning': reasoning
+        }
+    
+    def analyze_recommendations(
+        self,
+        symbols: List[str],
+        market_data: Dict[str, Any],
+        rl_predictions: List[Dict[str, Any]]
+    ) -> List[TradingRecommendation]:
+        """Trading recommendations for a request, reusing cached stages"""
+        return self.run_pipeline(symbols, market_data, rl_predictions)['recommendations']
+    
+    # --- Analysis stages ---
+    
     def analyze_market_context(
         self, 
         symbols: List[str], 
@@ -66,38 +301,58 @@ class LLMAnalysisService:
         rl_predictions: List[Dict[str, Any]]
     ) -> MarketContext:
         """Analyze overall market context"""
+        fingerprint, scores = self._prepare_request(symbols, market_data, rl_predictions)
+        return self._context_stage(fingerprint, symbols, market_data, scores)
+    
+    def _context_stage(
+        self,
+        fingerprint: str,
+        symbols: List[str],
+        market_data: Dict[str, Any],
+        scores: PredictionScores
+    ) -> MarketContext:
+        return self._run_stage(
+            fingerprint, 'context',
+            lambda: self._compute_market_context(fingerprint, symbols, market_data, scores)
+        )
+    
+    def _compute_market_context(
+        self,
+        fingerprint: str,
+        symbols: List[str],
+        market_data: Dict[str, Any],
+        scores: PredictionScores
+    ) -> MarketContext:
+        """Compute the market context stage"""
         
-        # Analyze RL predictions
-        bullish_count = sum(1 for pred in rl_predictions if pred.get('prediction', 0) > 0.3)
-        bearish_count = sum(1 for pred in rl_predictions if pred.get('prediction', 0) < -0.3)
-        neutral_count = len(rl_predictions) - bullish_count - bearish_count
-        
+        # RL predictions were scored once in _prepare_request
         # Determine overall sentiment
-        if bullish_count > bearish_count:
+        if scores.bullish_count > scores.bearish_count:
             sentiment = "bullish"
-        elif bearish_count > bullish_count:
+        elif scores.bearish_count > scores.bullish_count:
             sentiment = "bearish"
         else:
             sentiment = "neutral"
         
         # Analyze volatility
-        volatility_level = self._analyze_volatility(market_data)
+        volatility_report = self._volatility_stage(fingerprint, symbols, market_data)
         
         # Analyze sector performance
         sector_performance = self._analyze_sector_performance(symbols, market_data)
         
         # Determine market trend
-        market_trend = self._determine_market_trend(rl_predictions)
+        market_trend = self._determine_market_trend(scores.mean_prediction)
         
         # Identify key events
         key_events = self._identify_key_events(symbols, market_data)
         
         return MarketContext(
             overall_sentiment=sentiment,
-            volatility_level=volatility_level,
+            volatility_level=volatility_report['level'],
             sector_performance=sector_performance,
             market_trend=market_trend,
-            key_events=key_events
+            key_events=key_events,
+            volatility_metrics=volatility_report['symbols']
         )
     
     def identify_trading_opportunities(
@@ -107,42 +362,40 @@ class LLMAnalysisService:
         market_data: Dict[str, Any]
     ) -> List[TradingOpportunity]:
         """Identify trading opportunities based on RL predictions and market data"""
+        fingerprint, scores = self._prepare_request(symbols, market_data, rl_predictions)
+        return self._opportunities_stage(fingerprint, scores)
+    
+    def _opportunities_stage(
+        self,
+        fingerprint: str,
+        scores: PredictionScores
+    ) -> List[TradingOpportunity]:
+        return self._run_stage(
+            fingerprint, 'opportunities',
+            lambda: self._compute_trading_opportunities(scores)
+        )
+    
+    def _compute_trading_opportunities(self, scores: PredictionScores) -> List[TradingOpportunity]:
+        """Compute the trading opportunities stage"""
         
         opportunities = []
         
-        for prediction in rl_predictions:
-            symbol = prediction.get('symbol', '')
-            pred_value = prediction.get('prediction', 0)
-            confidence = prediction.get('confidence', 0)
-            
-            if confidence > 0.7:  # High confidence threshold
-                if pred_value > 0.5:
-                    opportunity_type = "momentum"
-                    reasoning = f"Strong bullish signal with {confidence:.1%} confidence"
-                    risk_level = "medium"
-                elif pred_value > 0.3:
-                    opportunity_type = "dip_buying"
-                    reasoning = f"Moderate bullish signal with {confidence:.1%} confidence"
-                    risk_level = "low"
-                elif pred_value < -0.5:
-                    opportunity_type = "mean_reversion"
-                    reasoning = f"Strong bearish signal with {confidence:.1%} confidence"
-                    risk_level = "high"
-                elif pred_value < -0.3:
-                    opportunity_type = "breakout"
-                    reasoning = f"Moderate bearish signal with {confidence:.1%} confidence"
-                    risk_level = "medium"
-                else:
-                    continue
-                
-                opportunities.append(TradingOpportunity(
-                    symbol=symbol,
-                    opportunity_type=opportunity_type,
-                    confidence=confidence,
-                    reasoning=reasoning,
-                    risk_level=risk_level,
-                    time_horizon="1-3 days"
-                ))
+        # Only rows that were classified need a Python object
+        selected = np.flatnonzero(scores.opportunity_class >= 0)
+        for symbol, opportunity_class, confidence in zip(
+            scores.symbols[selected].tolist(),
+            scores.opportunity_class[selected].tolist(),
+            scores.confidences[selected].tolist()
+        ):
+            opportunity_type, signal, risk_level = OPPORTUNITY_TYPES[opportunity_class]
+            opportunities.append(TradingOpportunity(
+                symbol=symbol,
+                opportunity_type=opportunity_type,
+                confidence=confidence,
+                reasoning=f"{signal} signal with {confidence:.1%} confidence",
+                risk_level=risk_level,
+                time_horizon="1-3 days"
+            ))
         
         return opportunities
     
@@ -153,12 +406,35 @@ class LLMAnalysisService:
         rl_predictions: List[Dict[str, Any]]
     ) -> List[RiskFactor]:
         """Identify potential risk factors"""
+        fingerprint, scores = self._prepare_request(symbols, market_data, rl_predictions)
+        return self._risks_stage(fingerprint, symbols, market_data, scores)
+    
+    def _risks_stage(
+        self,
+        fingerprint: str,
+        symbols: List[str],
+        market_data: Dict[str, Any],
+        scores: PredictionScores
+    ) -> List[RiskFactor]:
+        return self._run_stage(
+            fingerprint, 'risks',
+            lambda: self._compute_risk_factors(fingerprint, symbols, market_data, scores)
+        )
+    
+    def _compute_risk_factors(
+        self,
+        fingerprint: str,
+        symbols: List[str],
+        market_data: Dict[str, Any],
+        scores: PredictionScores
+    ) -> List[RiskFactor]:
+        """Compute the risk factors stage"""
         
         risk_factors = []
         
         # Market volatility risk
-        volatility = self._analyze_volatility(market_data)
-        if volatility == "high":
+        volatility_report = self._volatility_stage(fingerprint, symbols, market_data)
+        if volatility_report['level'] == "high":
             risk_factors.append(RiskFactor(
                 factor="High Market Volatility",
                 impact="high",
@@ -176,8 +452,7 @@ class LLMAnalysisService:
             ))
         
         # Prediction confidence risk
-        low_confidence_count = sum(1 for pred in rl_predictions if pred.get('confidence', 0) < 0.6)
-        if low_confidence_count > len(rl_predictions) * 0.5:
+        if scores.low_confidence_count > scores.total * 0.5:
             risk_factors.append(RiskFactor(
                 factor="Low Prediction Confidence",
                 impact="medium",
@@ -191,7 +466,10 @@ class LLMAnalysisService:
             risk_factors.append(RiskFactor(
                 factor="Sector Concentration",
                 impact="medium",
-                description="High concentration in single sector",
+                description=(
+                    f"High concentration in single sector ({sector_analysis['max_sector']}, "
+                    f"{sector_analysis['max_sector_weight']:.0%} of symbols)"
+                ),
                 mitigation="Diversify across multiple sectors"
             ))
         
@@ -254,20 +532,14 @@ class LLMAnalysisService:
     ) -> Dict[str, Any]:
         """Generate comprehensive market analysis"""
         
-        # Analyze market context
-        market_context = self.analyze_market_context(symbols, market_data, rl_predictions)
-        
-        # Identify opportunities
-        opportunities = self.identify_trading_opportunities(symbols, rl_predictions, market_data)
-        
-        # Identify risks
-        risk_factors = self.identify_risk_factors(symbols, market_data, rl_predictions)
-        
-        # Generate recommendations
-        recommendations = self.generate_recommendations(market_context, opportunities, risk_factors)
-        
-        # Generate reasoning
-        reasoning = self._generate_reasoning(market_context, opportunities, risk_factors)
+        # Every stage is memoized per request, so this shares work with the
+        # individual /api/analyze/* endpoints
+        pipeline = self.run_pipeline(symbols, market_data, rl_predictions)
+        market_context = pipeline['market_context']
+        opportunities = pipeline['opportunities']
+        risk_factors = pipeline['risk_factors']
+        recommendations = pipeline['recommendations']
+        reasoning = pipeline['reasoning']
         
         return {
             "market_context": market_context.overall_sentiment,
@@ -281,7 +553,8 @@ class LLMAnalysisService:
                     "sentiment": market_context.overall_sentiment,
                     "volatility": market_context.volatility_level,
                     "trend": market_context.market_trend,
-                    "key_events": market_context.key_events
+                    "key_events": market_context.key_events,
+                    "volatility_metrics": market_context.volatility_metrics
                 },
                 "opportunities": [
                     {
@@ -311,21 +584,29 @@ class LLMAnalysisService:
             }
         }
     
-    def _analyze_volatility(self, market_data: Dict[str, Any]) -> str:
-        """Analyze market volatility"""
-        # Simplified volatility analysis
-        return "medium"  # Placeholder
+    def _volatility_stage(self, fingerprint: str, symbols: List[str], market_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Volatility analysis, shared by the context and risk stages"""
+        return self._run_stage(fingerprint, 'volatility', lambda: self._analyze_volatility(symbols, market_data))
+    
+    def _analyze_volatility(self, symbols: List[str], market_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Analyze market volatility from realized volatility of the requested symbols"""
+        try:
+            return volatility.analyze_symbols(symbols)
+        except Exception as e:
+            logger.error(f"Volatility analysis failed: {e}")
+            return {'level': "medium", 'annualized': None, 'symbols': {}}
     
     def _analyze_sector_performance(self, symbols: List[str], market_data: Dict[str, Any]) -> Dict[str, float]:
-        """Analyze sector performance"""
-        # Simplified sector analysis
-        sectors = ["Technology", "Healthcare", "Finance", "Consumer", "Energy"]
-        return {sector: np.random.uniform(-0.1, 0.1) for sector in sectors}
+        """Analyze sector performance (daily return of each sector ETF, as a fraction)"""
+        try:
+            sector_data = yahoo_finance.get_sector_performance()
+        except Exception as e:
+            logger.error(f"Sector performance lookup failed: {e}")
+            return {}
+        return {sector['name']: round(sector['change'] / 100, 6) for sector in sector_data}
     
-    def _determine_market_trend(self, rl_predictions: List[Dict[str, Any]]) -> str:
+    def _determine_market_trend(self, avg_prediction: float) -> str:
         """Determine overall market trend"""
-        avg_prediction = np.mean([pred.get('prediction', 0) for pred in rl_predictions])
-        
         if avg_prediction > 0.2:
             return "uptrend"
         elif avg_prediction < -0.2:
@@ -341,10 +622,31 @@ class LLMAnalysisService:
             "Economic data releases this week"
         ]
     
-    def _analyze_sector_concentration(self, symbols: List[str]) -> Dict[str, float]:
-        """Analyze sector concentration"""
-        # Simplified sector analysis
-        return {"max_sector_weight": 0.3}
+    def _analyze_sector_concentration(self, symbols: List[str]) -> Dict[str, Any]:
+        """Analyze sector concentration (equal-weighted across the requested symbols)"""
+        try:
+            sectors = yahoo_finance.get_symbol_sectors(symbols)
+        except Exception as e:
+            logger.error(f"Sector lookup failed: {e}")
+            sectors = {}
+        
+        if not sectors:
+            return {"max_sector_weight": 0.0, "max_sector": None, "sector_weights": {}, "unknown_weight": 0.0}
+        
+        total = len(sectors)
+        counts: Dict[str, int] = {}
+        for sector in sectors.values():
+            if sector:
+                counts[sector] = counts.get(sector, 0) + 1
+        
+        weights = {sector: count / total for sector, count in counts.items()}
+        max_sector = max(weights, key=weights.get) if weights else None
+        return {
+            "max_sector_weight": weights.get(max_sector, 0.0),
+            "max_sector": max_sector,
+            "sector_weights": weights,
+            "unknown_weight": 1 - sum(counts.values()) / total
+        }
     
     def _generate_reasoning(
         self, 
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+News normalization for AlphaSphere.
+
+Yahoo Finance returns news in two structures (the newer `content` form and
+the legacy flat form). Every item is parsed once into a compact NewsItem
+with an absolute timestamp; the market and symbol endpoint shapes are
+rendered from it at serve time, so relative times like "2 hours ago" are
+always computed against the current clock. Articles live once in a
+NewsStore indexed per feed, so any limit or page is answered by slicing.
+"""
+
+import hashlib
+import logging
+import time
+from bisect import bisect_right, insort
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class NewsItem:
+    """A normalized news article"""
+    id: str
+    title: str
+    summary: str
+    url: str  # empty when the source had no usable link
+    publisher: str
+    published_ts: Optional[float]  # epoch seconds (UTC)
+    image_url: Optional[str] = None
+    symbols: List[str] = field(default_factory=list)
+
+def article_id(url: str, title: str) -> str:
+    """Stable article ID: hash of the URL, or of the title when there is no URL"""
+    key = url if url else f"title:{title.strip().lower()}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+def _parse_iso_timestamp(value: str) -> Optional[float]:
+    try:
+        published = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if published.tzinfo is None:
+            published = published.replace(tzinfo=timezone.utc)
+        return published.timestamp()
+    except (ValueError, TypeError):
+        return None
+
+def normalize_news_item(raw: Dict[str, Any], symbol: Optional[str] = None) -> Optional[NewsItem]:
+    """Parse one Yahoo news item (either structure); None if it has no title or summary"""
+    if 'content' in raw:
+        content = raw.get('content') or {}
+        title = content.get('title', '')
+        summary = content.get('summary', '')
+        if not title or not summary:
+            return None
+
+        pub_date = content.get('pubDate', '')
+        published_ts = _parse_iso_timestamp(pub_date) if pub_date else None
+
+        click_through_url = content.get('clickThroughUrl') or {}
+        url = click_through_url.get('url', '') or ''
+
+        provider = content.get('provider') or {}
+        publisher = provider.get('displayName', 'Yahoo Finance') or 'Yahoo Finance'
+
+        thumbnail = content.get('thumbnail') or {}
+        image_url = thumbnail.get('url')
+    else:
+        # Legacy structure
+        title = raw.get('title', '')
+        summary = raw.get('summary', '')
+        if not title or not summary:
+            return None
+
+        timestamp = raw.get('providerPublishTime', 0)
+        published_ts = float(timestamp) if timestamp else None
+        url = raw.get('link', '') or ''
+        publisher = raw.get('publisher', 'Yahoo Finance') or 'Yahoo Finance'
+        image_url = None
+
+    if not url.startswith('http'):
+        url = ''
+
+    return NewsItem(
+        id=article_id(url, title),
+        title=title,
+        summary=summary,
+        url=url,
+        publisher=publisher,
+        published_ts=published_ts,
+        image_url=image_url,
+        symbols=[symbol] if symbol else []
+    )
+
+def dedupe_items(items: Iterable[NewsItem]) -> List[NewsItem]:
+    """Drop repeats by article ID or title, keeping the first occurrence"""
+    unique = []
+    seen = set()
+    for item in items:
+        title_key = item.title.strip().lower()
+        if item.id in seen or title_key in seen:
+            continue
+        seen.add(item.id)
+        seen.add(title_key)
+        unique.append(item)
+    return unique
+
+def normalize_news(raw_items: Iterable[Dict[str, Any]], symbol: Optional[str] = None) -> List[NewsItem]:
+    """Normalize and dedupe (by URL and by title) a batch of raw items"""
+    items = []
+    for raw in raw_items or []:
+        try:
+            item = normalize_news_item(raw, symbol)
+        except Exception as e:
+            logger.warning(f"Skipping malformed news item: {e}")
+            continue
+        if item is not None:
+            items.append(item)
+    return dedupe_items(items)
+
+def time_ago(published_ts: Optional[float], now: Optional[float] = None) -> str:
+    """Relative publish time, computed at serve time"""
+    if not published_ts:
+        return "Recently"
+    seconds = max(0.0, (now or time.time()) - published_ts)
+
+    if seconds < 3600:  # Less than 1 hour
+        minutes = int(seconds / 60)
+        return f"{minutes} minute{'s' if minutes != 1 else ''} ago"
+    elif seconds < 86400:  # Less than 24 hours
+        hours = int(seconds / 3600)
+        return f"{hours} hour{'s' if hours != 1 else ''} ago"
+    days = int(seconds / 86400)
+    return f"{days} day{'s' if days != 1 else ''} ago"
+
+def _iso_utc(published_ts: Optional[float]) -> Optional[str]:
+    if not published_ts:
+        return None
+    return datetime.fromtimestamp(published_ts, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+def render_market_item(item: NewsItem, now: Optional[float] = None) -> Dict[str, Any]:
+    """Shape used by /api/yahoo/news"""
+    return {
+        'id': item.id,
+        'title': item.title,
+        'description': item.summary,
+        'timeAgo': time_ago(item.published_ts, now),
+        'publishedAt': _iso_utc(item.published_ts),
+        'link': item.url or f"https://finance.yahoo.com/news?q={item.title.replace(' ', '+')}",
+        'source': item.publisher
+    }
+
+def render_symbol_item(item: NewsItem, symbol: str) -> Dict[str, Any]:
+    """Shape used by /api/yahoo/news/<symbol>"""
+    return {
+        'id': item.id,
+        'title': item.title,
+        'url': item.url or f"https://finance.yahoo.com/quote/{symbol}/news",
+        'publisher': item.publisher,
+        'publishedAt': _iso_utc(item.published_ts),
+        'summary': item.summary,
+        'imageUrl': item.image_url
+    }
+
+# Feed name for general market news in the store
+MARKET_FEED = '__market__'
+
+# Store limits
+NEWS_STORE_MAX_ARTICLES = 5000
+NEWS_STORE_MAX_AGE = 7 * 86400  # seconds
+
+def parse_cursor(value: Optional[str]) -> Optional[float]:
+    """A `before=` cursor given as epoch seconds or an ISO timestamp"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return _parse_iso_timestamp(value)
+
+class NewsStore:
+    """
+    In-memory article store. Each article is kept once by ID; feeds (a symbol
+    or MARKET_FEED) index article IDs newest first, so any limit or page is a
+    slice of an already sorted list.
+    """
+
+    def __init__(self, max_articles: int = NEWS_STORE_MAX_ARTICLES, max_age: int = NEWS_STORE_MAX_AGE):
+        self.max_articles = max_articles
+        self.max_age = max_age
+        self._lock = Lock()
+        self._articles: Dict[str, NewsItem] = {}
+        # feed -> [(-published_ts, article_id)] kept sorted (newest first)
+        self._feeds: Dict[str, List[Tuple[float, str]]] = {}
+        self._fetched_at: Dict[str, float] = {}
+
+    @staticmethod
+    def _sort_key(item: NewsItem) -> Tuple[float, str]:
+        return (-(item.published_ts or 0.0), item.id)
+
+    def add(self, feed: str, items: Iterable[NewsItem]):
+        """Merge articles into a feed and mark the feed as freshly fetched"""
+        with self._lock:
+            entries = self._feeds.setdefault(feed, [])
+            present = {article_id for _, article_id in entries}
+            for item in items:
+                existing = self._articles.get(item.id)
+                if existing is None:
+                    self._articles[item.id] = item
+                    existing = item
+                for symbol in item.symbols:
+                    if symbol not in existing.symbols:
+                        existing.symbols.append(symbol)
+                if existing.id not in present:
+                    insort(entries, self._sort_key(existing))
+                    present.add(existing.id)
+            self._fetched_at[feed] = time.time()
+
+    def is_fresh(self, feed: str, ttl: float) -> bool:
+        fetched_at = self._fetched_at.get(feed)
+        return fetched_at is not None and time.time() - fetched_at <= ttl
+
+    def fetched_at(self, feed: str) -> Optional[float]:
+        """When the feed was last fetched, or None if never"""
+        return self._fetched_at.get(feed)
+
+    def query(self, feed: str, limit: int, before: Optional[str] = None) -> List[NewsItem]:
+        """
+        Newest-first page of a feed. `before` is either the ID of the last
+        article on the previous page or a timestamp cursor.
+        """
+        with self._lock:
+            entries = self._feeds.get(feed, [])
+            start = 0
+            if before:
+                article = self._articles.get(before)
+                if article is not None:
+                    start = bisect_right(entries, self._sort_key(article))
+                else:
+                    cursor = parse_cursor(before)
+                    if cursor is not None:
+                        start = bisect_right(entries, (-cursor, '\uffff'))
+            return [self._articles[article_id] for _, article_id in entries[start:start + max(limit, 0)]]
+
+    def feed_symbols(self) -> List[str]:
+        with self._lock:
+            return [feed for feed in self._feeds if feed != MARKET_FEED]
+
+    def prune(self) -> int:
+        """
+        Drop articles past max_age and the oldest beyond max_articles, then
+        feeds left without articles (they are refetched on next request)
+        """
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            ordered = sorted(self._articles.values(), key=self._sort_key)
+            keep = {
+                item.id for item in ordered[:self.max_articles]
+                if (item.published_ts or time.time()) >= cutoff
+            }
+            removed = len(self._articles) - len(keep)
+            if removed:
+                self._articles = {article_id: item for article_id, item in self._articles.items() if article_id in keep}
+            feeds = {}
+            for feed, entries in self._feeds.items():
+                entries = [entry for entry in entries if entry[1] in keep] if removed else entries
+                if entries:
+                    feeds[feed] = entries
+                else:
+                    self._fetched_at.pop(feed, None)
+            dropped_feeds = len(self._feeds) - len(feeds)
+            self._feeds = feeds
+        if removed or dropped_feeds:
+            logger.info(f"Pruned {removed} articles and {dropped_feeds} empty feeds from the news store")
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._articles.clear()
+            self._feeds.clear()
+            self._fetched_at.clear()
+
+    def __len__(self) -> int:
+        return len(self._articles)
+
+# Global instance
+news_store = NewsStore()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Multi-leg options position P&L for AlphaSphere.
+
+Evaluates a position (spreads, condors, straddles, covered calls, ...) over
+a grid of underlying prices x dates x volatility shifts. Every leg at every
+grid point is priced in one broadcasted Black-Scholes call, shaped
+(vol shifts, dates, prices, legs), and summed over legs.
+
+A leg is {"type": "call" | "put" | "stock", "quantity": +long / -short,
+"strike", "expiry" (YYYY-MM-DD) or "days", "iv", "premium"}; premium
+defaults to the model price today, iv to DEFAULT_IMPLIED_VOLATILITY.
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import black_scholes
+
+DEFAULT_IMPLIED_VOLATILITY = float(os.getenv('DEFAULT_IMPLIED_VOLATILITY', '0.30'))
+CONTRACT_MULTIPLIER = 100
+MAX_LEGS = 8
+DEFAULT_PRICE_STEPS = 200
+DEFAULT_DATE_STEPS = 30
+DEFAULT_VOL_SHIFTS = (-0.10, -0.05, 0.0, 0.05, 0.10)
+DEFAULT_PRICE_RANGE = 0.30  # +/- fraction of spot
+MAX_GRID_POINTS = 2_000_000  # prices x dates x vol shifts x legs
+
+LEG_TYPES = ('call', 'put', 'stock')
+
+def _number(value: Any, name: str) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+    if not np.isfinite(number):
+        raise ValueError(f"{name} must be finite")
+    return number
+
+def _count(value: Any, name: str, default: int) -> int:
+    """Whole-number grid size; missing or null takes the default"""
+    if value is None:
+        return default
+    number = _number(value, name)
+    if number != int(number):
+        raise ValueError(f"{name} must be a whole number")
+    return int(number)
+
+def parse_legs(legs: List[Dict[str, Any]], today: datetime) -> Dict[str, np.ndarray]:
+    """Validate legs into per-leg arrays; raises ValueError on bad input"""
+    if not isinstance(legs, list) or not legs:
+        raise ValueError("Position needs at least one leg")
+    if len(legs) > MAX_LEGS:
+        raise ValueError(f"At most {MAX_LEGS} legs per position")
+
+    kinds, quantities, strikes, days, ivs, premiums = [], [], [], [], [], []
+    for i, leg in enumerate(legs):
+        label = f"leg {i + 1}"
+        if not isinstance(leg, dict):
+            raise ValueError(f"{label} must be an object")
+        kind = str(leg.get('type', '')).lower()
+        if kind not in LEG_TYPES:
+            raise ValueError(f"{label}: type must be one of {', '.join(LEG_TYPES)}")
+        quantity = _number(leg.get('quantity', 1), f"{label} quantity")
+        if 'side' in leg:
+            quantity = abs(quantity) * (-1 if str(leg['side']).lower() == 'short' else 1)
+
+        if kind == 'stock':
+            strike, expiry_days, iv = 0.0, np.inf, 0.0
+        else:
+            strike = _number(leg.get('strike'), f"{label} strike")
+            if strike <= 0:
+                raise ValueError(f"{label}: strike must be positive")
+            if leg.get('expiry'):
+                try:
+                    expiry = datetime.strptime(str(leg['expiry']), '%Y-%m-%d')
+                except ValueError:
+                    raise ValueError(f"{label}: expiry must be YYYY-MM-DD")
+                expiry_days = (expiry.date() - today.date()).days
+            else:
+                expiry_days = _number(leg.get('days'), f"{label} days")
+            if expiry_days < 0:
+                raise ValueError(f"{label}: already expired")
+            iv = _number(leg.get('iv', DEFAULT_IMPLIED_VOLATILITY), f"{label} iv")
+            if iv <= 0:
+                raise ValueError(f"{label}: iv must be positive")
+
+        kinds.append(kind)
+        quantities.append(quantity)
+        strikes.append(strike)
+        days.append(expiry_days)
+        ivs.append(iv)
+        premiums.append(_number(leg['premium'], f"{label} premium") if leg.get('premium') is not None else np.nan)
+
+    kinds = np.array(kinds)
+    return {
+        'is_call': kinds == 'call',
+        'is_stock': kinds == 'stock',
+        'quantity': np.array(quantities),
+        'strike': np.array(strikes),
+        'days': np.array(days, dtype=float),
+        'iv': np.array(ivs),
+        'premium': np.array(premiums),
+    }
+
+def leg_values(legs: Dict[str, np.ndarray], prices, days_elapsed, vol_shifts, rate: float) -> np.ndarray:
+    """
+    Per-share value of every leg, broadcast to (vol shifts, dates, prices, legs).
+    Options past their expiry are worth intrinsic value.
+    """
+    prices = np.asarray(prices, dtype=float)[None, None, :, None]
+    remaining = np.maximum(legs['days'][None, :] - np.asarray(days_elapsed, dtype=float)[:, None], 0.0)
+    time = (remaining / black_scholes.DAYS_PER_YEAR)[None, :, None, :]
+    vol = np.maximum(legs['iv'][None, :] + np.asarray(vol_shifts, dtype=float)[:, None], 0.01)[:, None, None, :]
+    strike = np.where(legs['is_stock'], 1.0, legs['strike'])
+    values = black_scholes.price(prices, strike, np.where(legs['is_stock'], 0.0, time), vol, legs['is_call'], rate)
+    return np.where(legs['is_stock'], prices, values)
+
+def _breakevens(prices: np.ndarray, pnl: np.ndarray) -> List[float]:
+    """
+    Prices where P&L crosses zero, by linear interpolation. A crossing that
+    lands on grid points with zero P&L is reported at the first of them.
+    """
+    sign = np.sign(pnl)
+    nonzero = np.nonzero(sign)[0]
+    crossings = nonzero[:-1][sign[nonzero[:-1]] != sign[nonzero[1:]]]
+    points = prices[crossings] - pnl[crossings] * (prices[crossings + 1] - prices[crossings]) / (pnl[crossings + 1] - pnl[crossings])
+    return [round(float(p), 2) for p in points]
+
+def evaluate_position(payload: Dict[str, Any], spot: Optional[float] = None) -> Dict[str, Any]:
+    """
+    P&L grid for a multi-leg position. `spot` overrides payload['spot'].
+    Returns the grid axes, pnl[vol_shift][date][price], the value at
+    expiry (unshifted vol) with max profit/loss and breakevens, and the
+    position's Greeks today.
+    """
+    today = datetime.now()
+    legs = parse_legs(payload.get('legs'), today)
+    spot = _number(spot if spot is not None else payload.get('spot'), "spot")
+    if spot <= 0:
+        raise ValueError("spot must be positive")
+    rate = _number(payload.get('rate', black_scholes.RISK_FREE_RATE), "rate")
+    multiplier = _number(payload.get('multiplier', CONTRACT_MULTIPLIER), "multiplier")
+
+    grid = payload.get('grid') or {}
+    if not isinstance(grid, dict):
+        raise ValueError("grid must be an object")
+    price_steps = _count(grid.get('priceSteps'), "priceSteps", DEFAULT_PRICE_STEPS)
+    date_steps = _count(grid.get('dateSteps'), "dateSteps", DEFAULT_DATE_STEPS)
+    price_range = _number(grid.get('priceRange', DEFAULT_PRICE_RANGE), "priceRange")
+    low = _number(grid.get('priceMin', spot * (1 - price_range)), "priceMin")
+    high = _number(grid.get('priceMax', spot * (1 + price_range)), "priceMax")
+    vol_shifts = grid.get('volShifts', DEFAULT_VOL_SHIFTS)
+    if not isinstance(vol_shifts, (list, tuple)):
+        raise ValueError("volShifts must be a list")
+    vol_shifts = np.array([_number(v, "volShifts") for v in vol_shifts], dtype=float)
+    if price_steps < 2 or date_steps < 1 or not len(vol_shifts) or not 0 < low < high:
+        raise ValueError("Invalid grid")
+    if price_steps * date_steps * len(vol_shifts) * len(legs['strike']) > MAX_GRID_POINTS:
+        raise ValueError("Grid too large")
+
+    option_days = legs['days'][~legs['is_stock']]
+    horizon = float(option_days.min()) if option_days.size else 30.0
+    prices = np.linspace(low, high, price_steps)
+    days_elapsed = np.linspace(0.0, horizon, date_steps) if date_steps > 1 else np.array([horizon])
+
+    # Entry prices: given premiums, else today's model value (stock at spot)
+    today_values = leg_values(legs, [spot], [0.0], [0.0], rate)[0, 0, 0]
+    entry = np.where(np.isnan(legs['premium']), today_values, legs['premium'])
+
+    values = leg_values(legs, prices, days_elapsed, vol_shifts, rate)
+    position_size = legs['quantity'] * np.where(legs['is_stock'], 1.0, multiplier)
+    pnl = ((values - entry) * position_size).sum(axis=-1)  # vol shifts x dates x prices
+
+    base = int(np.argmin(np.abs(vol_shifts)))
+    at_horizon = pnl[base, -1]
+    greeks = black_scholes.greeks(spot, np.where(legs['is_stock'], 1.0, legs['strike']),
+                                  np.where(legs['is_stock'], 0.0, legs['days']) / black_scholes.DAYS_PER_YEAR,
+                                  legs['iv'], legs['is_call'], rate)
+    position_greeks = {
+        name: float(np.sum(np.where(legs['is_stock'], 1.0 if name == 'delta' else 0.0, leg_greek) * position_size))
+        for name, leg_greek in greeks.items()
+    }
+
+    return {
+        'spot': spot,
+        'netPremium': round(float(np.sum(entry * position_size)), 2),  # > 0 paid, < 0 received
+        'prices': np.round(prices, 4).tolist(),
+        'days': np.round(days_elapsed, 4).tolist(),
+        'dates': [(today + timedelta(days=float(d))).strftime('%Y-%m-%d') for d in days_elapsed],
+        'volShifts': vol_shifts.tolist(),
+        'pnl': np.round(pnl, 2).tolist(),
+        'horizon': {
+            'days': horizon,
+            'pnl': np.round(at_horizon, 2).tolist(),
+            'maxProfit': round(float(at_horizon.max()), 2),
+            'maxLoss': round(float(at_horizon.min()), 2),
+            'breakevens': _breakevens(prices, at_horizon),
+        },
+        'greeks': {name: round(value, 4) for name, value in position_greeks.items()},
+    }
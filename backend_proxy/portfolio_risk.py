@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Portfolio risk for AlphaSphere.
+
+Takes Alpaca positions (stocks and OCC-symbol options), joins them with
+daily closes from the screener's shared price panel and prices option
+positions with the Black-Scholes engine (realized volatility as the vol
+input). Everything downstream is matrix math over the underlyings'
+return matrix:
+
+- historical and parametric 1-day VaR / CVaR (delta-gamma P&L per day),
+- beta of every underlying to SPY and the portfolio's beta-weighted delta,
+- correlation clusters (underlyings linked by correlation above a threshold),
+- aggregate Greeks.
+
+Results are cached per snapshot: the fingerprint covers positions, their
+prices and the panel version, so nothing is recomputed until one changes.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+import black_scholes
+import yahoo_finance
+from screener import screener
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_SYMBOL = 'SPY'
+RISK_LOOKBACK_DAYS = int(os.getenv('RISK_LOOKBACK_DAYS', '252'))
+# Underlyings with fewer daily returns than this are reported but not modeled
+RISK_MIN_OBSERVATIONS = 60
+CLUSTER_CORRELATION = float(os.getenv('RISK_CLUSTER_CORRELATION', '0.7'))
+CONFIDENCE_LEVELS = (0.95, 0.99)
+# Standard normal quantiles for CONFIDENCE_LEVELS
+_Z_SCORES = {0.95: 1.6448536269514722, 0.99: 2.3263478740408408}
+OPTION_MULTIPLIER = 100
+
+# OCC option symbol: root, YYMMDD, C/P, strike x 1000
+_OCC_PATTERN = re.compile(r"^([A-Z.]{1,6})(\d{6})([CP])(\d{8})$")
+
+def parse_positions(positions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Normalize Alpaca position JSON (string numbers, OCC option symbols)"""
+    today = datetime.now().date()
+    parsed = []
+    for position in positions or []:
+        symbol = str(position.get('symbol', '')).upper()
+        try:
+            qty = float(position.get('qty', 0))
+            market_value = float(position.get('market_value') or 0)
+            price = float(position.get('current_price') or 0)
+        except (TypeError, ValueError):
+            logger.warning(f"Skipping position with bad numbers: {symbol}")
+            continue
+        if not symbol or qty == 0:
+            continue
+        if position.get('side') == 'short' and qty > 0:
+            qty = -qty
+
+        entry = {'symbol': symbol, 'underlying': symbol, 'qty': qty, 'market_value': market_value,
+                 'price': price, 'is_option': False}
+        match = _OCC_PATTERN.match(symbol)
+        if match and (position.get('asset_class') in (None, 'us_option')):
+            expiry = datetime.strptime(match.group(2), '%y%m%d').date()
+            entry.update({
+                'underlying': match.group(1),
+                'is_option': True,
+                'is_call': match.group(3) == 'C',
+                'strike': int(match.group(4)) / 1000.0,
+                'days': max((expiry - today).days, 0),
+            })
+        parsed.append(entry)
+    return parsed
+
+def _fingerprint(positions: List[Dict[str, Any]], panel_version) -> str:
+    snapshot = sorted((p['symbol'], p['qty'], p['price']) for p in positions)
+    payload = json.dumps([snapshot, panel_version], separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+def correlation_clusters(corr: np.ndarray, threshold: float = CLUSTER_CORRELATION) -> np.ndarray:
+    """
+    Cluster label per asset: connected components of the graph linking
+    assets whose correlation is at least `threshold`.
+    """
+    reach = corr >= threshold
+    np.fill_diagonal(reach, True)
+    # Repeated squaring of the adjacency matrix reaches the transitive closure
+    while True:
+        expanded = (reach.astype(np.int64) @ reach.astype(np.int64)) > 0
+        if np.array_equal(expanded, reach):
+            break
+        reach = expanded
+    return np.argmax(reach, axis=1)  # lowest member index labels each component
+
+def _tail_metrics(pnl: np.ndarray, sigma: float) -> Dict[str, Any]:
+    historical_var, historical_cvar, parametric_var, parametric_cvar = {}, {}, {}, {}
+    for level in CONFIDENCE_LEVELS:
+        key = str(int(level * 100))
+        var = -float(np.quantile(pnl, 1 - level)) if pnl.size else 0.0
+        tail = pnl[pnl <= -var]
+        historical_var[key] = round(var, 2)
+        historical_cvar[key] = round(-float(tail.mean()), 2) if tail.size else round(var, 2)
+        z = _Z_SCORES[level]
+        parametric_var[key] = round(z * sigma, 2)
+        parametric_cvar[key] = round(sigma * math.exp(-0.5 * z * z) / math.sqrt(2 * math.pi) / (1 - level), 2)
+    return {
+        'var': {'historical': historical_var, 'parametric': parametric_var},
+        'cvar': {'historical': historical_cvar, 'parametric': parametric_cvar},
+    }
+
+def analyze_portfolio(raw_positions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Risk report for a set of Alpaca positions; cached per snapshot"""
+    positions = parse_positions(raw_positions)
+    underlyings = sorted({p['underlying'] for p in positions})
+    closes = screener.closes(underlyings + [BENCHMARK_SYMBOL]) if underlyings else None
+
+    fingerprint = _fingerprint(positions, screener.updated_at)
+    cache_key = yahoo_finance.get_cache_key('portfolio_risk', fingerprint)
+    cached_data = yahoo_finance.get_cached_data(cache_key)
+    if cached_data:
+        return cached_data
+
+    report = _compute_risk(positions, underlyings, closes)
+    report['snapshot'] = fingerprint
+    yahoo_finance.set_cached_data(cache_key, report, yahoo_finance.CACHE_DURATION['history'])
+    return report
+
+def _compute_risk(positions, underlyings, closes) -> Dict[str, Any]:
+    market_value = sum(p['market_value'] for p in positions)
+    report = {
+        'asOf': datetime.now().isoformat(),
+        'positions': len(positions),
+        'marketValue': round(market_value, 2),
+        'grossExposure': round(sum(abs(p['market_value']) for p in positions), 2),
+        'lookbackDays': RISK_LOOKBACK_DAYS,
+        'horizonDays': 1,
+    }
+    empty = {'var': {}, 'cvar': {}, 'beta': None, 'betaWeightedDelta': 0.0, 'greeks': {},
+             'exposures': [], 'clusters': [], 'unmodeled': underlyings}
+    if closes is None or closes.empty or BENCHMARK_SYMBOL not in closes:
+        report.update(empty)
+        return report
+
+    returns = closes.iloc[-(RISK_LOOKBACK_DAYS + 1):].pct_change().iloc[1:]
+    counts = returns.count()
+    modeled = [u for u in underlyings if counts.get(u, 0) >= RISK_MIN_OBSERVATIONS]
+    unmodeled = [u for u in underlyings if u not in modeled]
+    returns = returns[modeled + ([BENCHMARK_SYMBOL] if BENCHMARK_SYMBOL not in modeled else [])].dropna()
+    if not modeled or len(returns) < RISK_MIN_OBSERVATIONS:
+        report.update(empty)
+        return report
+
+    R = returns[modeled].to_numpy(dtype=float)  # days x underlyings
+    benchmark = returns[BENCHMARK_SYMBOL].to_numpy(dtype=float)
+    volatility = R.std(axis=0, ddof=1) * math.sqrt(252)
+    index = {u: i for i, u in enumerate(modeled)}
+    # Spot: the live price of a held share position, else the last panel close
+    spot = closes[modeled].ffill().iloc[-1].to_numpy(dtype=float, copy=True)
+    for p in positions:
+        if not p['is_option'] and p['underlying'] in index and p['price'] > 0:
+            spot[index[p['underlying']]] = p['price']
+
+    # Per-position Greeks in share terms; stocks have delta 1 per share
+    held = [p for p in positions if p['underlying'] in index]
+    u_idx = np.array([index[p['underlying']] for p in held], dtype=int)
+    qty = np.array([p['qty'] for p in held])
+    is_option = np.array([p['is_option'] for p in held], dtype=bool)
+    size = np.where(is_option, qty * OPTION_MULTIPLIER, qty)
+    greeks = black_scholes.greeks(
+        spot[u_idx],
+        np.array([p.get('strike', 1.0) for p in held]),
+        np.array([p.get('days', 0) for p in held], dtype=float) / black_scholes.DAYS_PER_YEAR,
+        volatility[u_idx],
+        np.array([p.get('is_call', True) for p in held], dtype=bool),
+    )
+    delta = np.where(is_option, greeks['delta'], 1.0) * size
+    gamma = np.where(is_option, greeks['gamma'], 0.0) * size
+    theta = np.where(is_option, greeks['theta'], 0.0) * size
+    vega = np.where(is_option, greeks['vega'], 0.0) * size
+
+    # Dollar delta / gamma per underlying
+    dollar_delta = np.zeros(len(modeled))
+    dollar_gamma = np.zeros(len(modeled))
+    np.add.at(dollar_delta, u_idx, delta * spot[u_idx])
+    np.add.at(dollar_gamma, u_idx, gamma * spot[u_idx] ** 2)
+
+    # Delta-gamma P&L for every historical day, parametric sigma from the covariance
+    pnl = R @ dollar_delta + 0.5 * (R * R) @ dollar_gamma
+    covariance = np.atleast_2d(np.cov(R, rowvar=False))
+    marginal = covariance @ dollar_delta
+    sigma = float(math.sqrt(max(dollar_delta @ marginal, 0.0)))
+
+    centered = R - R.mean(axis=0)
+    bench_centered = benchmark - benchmark.mean()
+    betas = centered.T @ bench_centered / (bench_centered @ bench_centered)
+    beta_weighted_delta = float(dollar_delta @ betas)
+    modeled_value = sum(p['market_value'] for p in held)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.atleast_2d(np.corrcoef(R, rowvar=False))
+    corr = np.nan_to_num(corr)
+    labels = correlation_clusters(corr)
+    gross_delta = np.abs(dollar_delta).sum()
+
+    clusters = []
+    for label in np.unique(labels):
+        members = np.nonzero(labels == label)[0]
+        block = corr[np.ix_(members, members)]
+        pairs = len(members) * (len(members) - 1)
+        clusters.append({
+            'symbols': [modeled[i] for i in members],
+            'dollarDelta': round(float(dollar_delta[members].sum()), 2),
+            'exposureShare': round(float(np.abs(dollar_delta[members]).sum() / gross_delta), 4) if gross_delta else 0.0,
+            'avgCorrelation': round(float((block.sum() - len(members)) / pairs), 4) if pairs else None,
+        })
+    clusters.sort(key=lambda c: -c['exposureShare'])
+
+    z = _Z_SCORES[0.95]
+    contribution = dollar_delta * marginal / sigma * z if sigma > 0 else np.zeros(len(modeled))
+    exposures = [
+        {
+            'symbol': symbol,
+            'dollarDelta': round(float(dollar_delta[i]), 2),
+            'beta': round(float(betas[i]), 4),
+            'volatility': round(float(volatility[i]), 4),
+            'var95Contribution': round(float(contribution[i]), 2),
+        }
+        for i, symbol in enumerate(modeled)
+    ]
+    exposures.sort(key=lambda e: -abs(e['dollarDelta']))
+
+    report.update(_tail_metrics(pnl, sigma))
+    report.update({
+        'observations': int(len(R)),
+        'beta': round(beta_weighted_delta / modeled_value, 4) if modeled_value else None,
+        'betaWeightedDelta': round(beta_weighted_delta, 2),
+        'greeks': {
+            'delta': round(float(delta.sum()), 4) + 0.0,
+            'dollarDelta': round(float(dollar_delta.sum()), 2) + 0.0,
+            'gamma': round(float(gamma.sum()), 4) + 0.0,
+            'theta': round(float(theta.sum()), 2) + 0.0,
+            'vega': round(float(vega.sum()), 2) + 0.0,
+        },
+        'exposures': exposures,
+        'clusters': clusters,
+        'unmodeled': unmodeled,
+        'volatilitySource': 'realized',
+    })
+    return report
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Server-sent quote stream for AlphaSphere.
+
+All /api/stream/quotes connections share one QuoteStreamHub. A single
+refresher thread fetches every subscribed symbol once per interval (in
+batches, via yahoo_finance.get_stock_quotes) and pushes only the quotes that
+changed to the subscribers watching them. Each subscriber holds at most one
+pending quote per symbol, so a slow client gets the latest values instead of
+an ever-growing backlog.
+"""
+
+import json
+import logging
+import os
+import time
+from itertools import count
+from threading import Condition, Event, Lock, Thread
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import yahoo_finance
+
+logger = logging.getLogger(__name__)
+
+# Seconds between refresher passes
+QUOTE_STREAM_INTERVAL = float(os.getenv('QUOTE_STREAM_INTERVAL', '5'))
+# Symbols per upstream batch request
+QUOTE_STREAM_BATCH_SIZE = int(os.getenv('QUOTE_STREAM_BATCH_SIZE', '50'))
+# Seconds without data before a heartbeat comment is sent
+QUOTE_STREAM_HEARTBEAT = float(os.getenv('QUOTE_STREAM_HEARTBEAT', '15'))
+# Limits per connection / per process
+QUOTE_STREAM_MAX_SYMBOLS = int(os.getenv('QUOTE_STREAM_MAX_SYMBOLS', '50'))
+QUOTE_STREAM_MAX_SUBSCRIBERS = int(os.getenv('QUOTE_STREAM_MAX_SUBSCRIBERS', '1000'))
+
+# Fields that make a quote "changed" for subscribers
+CHANGE_FIELDS = ('price', 'change', 'changePercent', 'volume')
+
+def format_event(event: str, data: Any) -> str:
+    """One SSE frame"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+class Subscriber:
+    """One stream connection: its symbols and the quotes not yet sent to it"""
+
+    def __init__(self, subscriber_id: int, symbols: List[str]):
+        self.id = subscriber_id
+        self.symbols = frozenset(symbols)
+        self._cond = Condition()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._closed = False
+
+    def offer(self, quotes: Dict[str, Dict[str, Any]]):
+        """Queue quotes, replacing any unsent quote for the same symbol"""
+        with self._cond:
+            self._pending.update(quotes)
+            self._cond.notify()
+
+    def take(self, timeout: float) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Wait up to timeout for pending quotes; None on timeout or close"""
+        with self._cond:
+            if not self._pending and not self._closed:
+                self._cond.wait(timeout)
+            if not self._pending:
+                return None
+            pending, self._pending = self._pending, {}
+            return pending
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+class QuoteStreamHub:
+    """Multiplexes quote subscriptions onto one shared refresher"""
+
+    def __init__(self, interval: float = QUOTE_STREAM_INTERVAL,
+                 batch_size: int = QUOTE_STREAM_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = Lock()
+        self._ids = count(1)
+        self._subscribers: Dict[int, Subscriber] = {}
+        self._refcounts: Dict[str, int] = {}
+        self._last_quotes: Dict[str, Dict[str, Any]] = {}
+        self._wake = Event()
+        self._thread: Optional[Thread] = None
+
+    # --- Subscriptions ---
+
+    def subscribe(self, symbols: Iterable[str]) -> Subscriber:
+        """Register a subscriber; it starts with the last known quotes"""
+        symbols = list(dict.fromkeys(s.upper().strip() for s in symbols if s and s.strip()))
+        with self._lock:
+            if len(self._subscribers) >= QUOTE_STREAM_MAX_SUBSCRIBERS:
+                raise RuntimeError("Too many quote stream subscribers")
+            subscriber = Subscriber(next(self._ids), symbols)
+            self._subscribers[subscriber.id] = subscriber
+            new_symbols = False
+            for symbol in symbols:
+                new_symbols |= symbol not in self._refcounts
+                self._refcounts[symbol] = self._refcounts.get(symbol, 0) + 1
+            snapshot = {s: self._last_quotes[s] for s in symbols if s in self._last_quotes}
+            self._ensure_refresher()
+
+        if snapshot:
+            subscriber.offer(snapshot)
+        if new_symbols:
+            # Fetch new symbols now rather than at the next interval
+            self._wake.set()
+        logger.info(f"Quote stream subscriber {subscriber.id} joined for {len(symbols)} symbols")
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscriber.close()
+        with self._lock:
+            if self._subscribers.pop(subscriber.id, None) is None:
+                return
+            for symbol in subscriber.symbols:
+                remaining = self._refcounts.get(symbol, 0) - 1
+                if remaining > 0:
+                    self._refcounts[symbol] = remaining
+                else:
+                    self._refcounts.pop(symbol, None)
+                    self._last_quotes.pop(symbol, None)
+        logger.info(f"Quote stream subscriber {subscriber.id} left")
+
+    def stream(self, subscriber: Subscriber, heartbeat: float = QUOTE_STREAM_HEARTBEAT) -> Iterator[str]:
+        """SSE frames for one subscriber; unsubscribes when the client goes away"""
+        try:
+            yield f"retry: {int(self.interval * 1000)}\n\n"
+            while not subscriber.closed:
+                quotes = subscriber.take(heartbeat)
+                if quotes:
+                    yield format_event('quotes', quotes)
+                else:
+                    yield ": heartbeat\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    # --- Refresher ---
+
+    def _ensure_refresher(self):
+        # Called with self._lock held
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = Thread(target=self._run, name='quote-stream-refresher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                symbols = list(self._refcounts)
+            if symbols:
+                started = time.time()
+                try:
+                    self.refresh(symbols)
+                except Exception as e:
+                    logger.error(f"Quote stream refresh failed: {e}")
+                wait = max(0.0, self.interval - (time.time() - started))
+            else:
+                wait = None  # idle until someone subscribes
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def refresh(self, symbols: List[str]) -> int:
+        """Fetch symbols in batches and fan out changed quotes; returns the change count"""
+        changed = {}
+        for start in range(0, len(symbols), self.batch_size):
+            batch = symbols[start:start + self.batch_size]
+            quotes = yahoo_finance.get_stock_quotes(batch, use_cache=False)
+            with self._lock:
+                for symbol, quote in quotes.items():
+                    if not quote or symbol not in self._refcounts:
+                        continue
+                    previous = self._last_quotes.get(symbol)
+                    if previous is None or any(previous.get(f) != quote.get(f) for f in CHANGE_FIELDS):
+                        self._last_quotes[symbol] = quote
+                        changed[symbol] = quote
+
+        if changed:
+            with self._lock:
+                subscribers = list(self._subscribers.values())
+            for subscriber in subscribers:
+                updates = {s: changed[s] for s in subscriber.symbols if s in changed}
+                if updates:
+                    subscriber.offer(updates)
+        return len(changed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'symbols': len(self._refcounts),
+                'interval': self.interval,
+                'refresher_running': self._thread is not None and self._thread.is_alive()
+            }
+
+# Global instance
+quote_hub = QuoteStreamHub()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Batch trade recommendations for AlphaSphere.
+
+Scores a whole universe at once: quotes come from the batched quote cache
+and history-derived features (momentum, trend, RSI, volume, volatility)
+from the screener's panel, then every factor is computed as an array over
+all symbols. The ranked result is cached as a whole, and each symbol's
+recommendation is also cached for the single-symbol endpoint.
+"""
+
+import hashlib
+import logging
+import os
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+import yahoo_finance
+from screener import screener
+from symbol_metadata import metadata_index
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_MAX_SYMBOLS = int(os.getenv('RECOMMENDATION_MAX_SYMBOLS', '200'))
+# Score beyond which a symbol is a BUY (or SELL when negative)
+SIGNAL_THRESHOLD = 0.2
+
+# Factor weights; scores stay within [-1, 1]
+FACTOR_WEIGHTS = {
+    'day': 0.25,       # today's move
+    'momentum': 0.25,  # 20-day return
+    'trend': 0.25,     # price vs 50-day average, 50 vs 200-day average
+    'rsi': 0.15,       # mean reversion from overbought / oversold
+    'volume': 0.10,    # volume confirming today's move
+}
+
+FACTOR_LABELS = {
+    'day': ('strong gain today', 'sharp loss today'),
+    'momentum': ('positive 20-day momentum', 'negative 20-day momentum'),
+    'trend': ('price above its moving averages', 'price below its moving averages'),
+    'rsi': ('oversold RSI', 'overbought RSI'),
+    'volume': ('heavy volume behind the rally', 'heavy volume behind the selloff'),
+}
+
+def _column(features, name: str, count: int) -> np.ndarray:
+    if name not in features:
+        return np.full(count, np.nan)
+    return features[name].to_numpy(dtype=float)
+
+def score_factors(change_pct: np.ndarray, price: np.ndarray, features) -> Dict[str, np.ndarray]:
+    """Every factor in [-1, 1] for every symbol; missing inputs score 0"""
+    count = len(change_pct)
+    sma50 = _column(features, 'sma50', count)
+    sma200 = _column(features, 'sma200', count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        day = np.tanh(change_pct / 2.0)
+        momentum = np.tanh(_column(features, 'return_20d', count) / 10.0)
+        trend = 0.5 * np.clip((price / sma50 - 1.0) * 10.0, -1, 1) + 0.5 * np.sign(sma50 - sma200)
+        rsi = np.clip((50.0 - _column(features, 'rsi14', count)) / 20.0, -1, 1)
+        volume = np.sign(change_pct) * np.clip((_column(features, 'volume_ratio', count) - 1.0) / 2.0, 0, 1)
+    factors = {'day': day, 'momentum': momentum, 'trend': trend, 'rsi': rsi, 'volume': volume}
+    return {name: np.nan_to_num(values, nan=0.0) for name, values in factors.items()}
+
+def _reasoning(signal: str, contributions: Dict[str, float], change_percent: float) -> str:
+    drivers = [
+        FACTOR_LABELS[name][0 if value > 0 else 1]
+        for name, value in sorted(contributions.items(), key=lambda item: -abs(item[1]))
+        if abs(value) >= 0.02
+    ][:2]
+    if signal == 'HOLD' or not drivers:
+        return f"Mixed signals ({change_percent:.2f}% today), maintaining current position"
+    return f"{'Bullish' if signal == 'BUY' else 'Bearish'}: {' and '.join(drivers)}"
+
+def get_trade_recommendations(symbols: List[str]) -> Dict[str, Any]:
+    """
+    Multi-factor recommendations for many symbols, ranked by score (most
+    bullish first). Symbols without a quote are listed under `unavailable`.
+    """
+    symbols = list(dict.fromkeys(s.upper().strip() for s in symbols if isinstance(s, str) and s.strip()))
+    if len(symbols) > RECOMMENDATION_MAX_SYMBOLS:
+        raise ValueError(f"At most {RECOMMENDATION_MAX_SYMBOLS} symbols per request")
+
+    digest = hashlib.sha1(','.join(sorted(symbols)).encode('utf-8')).hexdigest()[:16]
+    cache_key = yahoo_finance.get_cache_key('recommendations', digest)
+    cached_data = yahoo_finance.get_cached_data(cache_key)
+    if cached_data:
+        return cached_data
+
+    quotes = yahoo_finance.get_stock_quotes(symbols)
+    priced = [s for s in symbols if quotes.get(s)]
+    unavailable = [s for s in symbols if not quotes.get(s)]
+
+    try:
+        features = screener.features(priced).reindex(priced) if priced else {}
+    except Exception as e:
+        logger.warning(f"No history features for recommendations, scoring on quotes only: {e}")
+        features = {}
+
+    price = np.array([quotes[s]['price'] for s in priced], dtype=float)
+    change_pct = np.array([quotes[s]['changePercent'] for s in priced], dtype=float)
+    factors = score_factors(change_pct, price, features)
+    score = sum(FACTOR_WEIGHTS[name] * values for name, values in factors.items())
+
+    # Confidence grows with |score| and shrinks for volatile or history-less symbols
+    volatility = _column(features, 'volatility20', len(priced))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volatility_scale = np.where(np.isnan(volatility), 0.8, np.clip(0.3 / volatility, 0.5, 1.0))
+    confidence = np.round(50 + 45 * np.abs(score) * volatility_scale)
+    signal = np.where(score >= SIGNAL_THRESHOLD, 'BUY', np.where(score <= -SIGNAL_THRESHOLD, 'SELL', 'HOLD'))
+
+    order = np.argsort(-score, kind='stable')
+    recommendations = []
+    for i in order.tolist():
+        symbol = priced[i]
+        contributions = {name: FACTOR_WEIGHTS[name] * float(values[i]) for name, values in factors.items()}
+        recommendation = {
+            'symbol': symbol,
+            'name': metadata_index.get_name(symbol) or symbol,
+            'signal': str(signal[i]),
+            'confidence': int(confidence[i]),
+            'score': round(float(score[i]), 4),
+            'reasoning': _reasoning(str(signal[i]), contributions, float(change_pct[i])),
+            'current_price': float(price[i]),
+            'change_percent': float(change_pct[i]),
+            'factors': {name: round(value, 4) + 0.0 for name, value in contributions.items()},  # + 0.0 drops -0.0
+        }
+        recommendations.append(recommendation)
+        yahoo_finance.set_cached_data(
+            yahoo_finance.get_cache_key('recommendation', symbol),
+            recommendation, yahoo_finance.CACHE_DURATION['quote']
+        )
+
+    result = {
+        'generatedAt': time.time(),
+        'recommendations': recommendations,
+        'unavailable': unavailable,
+    }
+    yahoo_finance.set_cached_data(cache_key, result, yahoo_finance.CACHE_DURATION['quote'])
+    return result
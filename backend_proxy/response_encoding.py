@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Response encoding for AlphaSphere: fast JSON and compression.
+
+FastJSONProvider replaces Flask's JSON provider for every jsonify call. It
+encodes with orjson when installed (falling back to the stdlib json module)
+and understands NumPy and pandas values, so routes can return them as is.
+Output is equivalent to Flask's (sorted keys, compact unless debugging,
+dates as HTTP dates) except that orjson writes UTF-8 instead of ASCII escapes
+and NaN / Infinity as null.
+
+compress_response negotiates gzip (or brotli, when the brotli package is
+installed) on Accept-Encoding for responses above COMPRESS_MIN_SIZE.
+Streams and bodies that are already encoded are left alone. A strong ETag
+on a compressed body gets the content coding appended ("<etag>-gzip"), so
+each byte sequence has its own validator; matching_etag accepts either form.
+
+Both are optional extras: without orjson or brotli the app behaves the same,
+only slower or with larger responses.
+"""
+
+import dataclasses
+import decimal
+import gzip
+import hashlib
+import json
+import logging
+import os
+import uuid
+from datetime import date
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this go out uncompressed
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+# Level 1 compresses JSON within ~10% of level 6 at a quarter of the CPU time (see bench_responses.py)
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', '1'))
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', '5'))
+COMPRESSIBLE_MIMETYPES = (
+    'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript',
+    'application/vnd.apache.arrow.stream', 'application/msgpack',
+)
+
+def json_default(obj: Any) -> Any:
+    """Values neither encoder handles natively"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, pd.Series):
+        return obj.tolist()
+    if isinstance(obj, pd.DataFrame):
+        return obj.to_dict(orient='records')
+    if obj is pd.NaT:
+        return None
+    # Flask's own conversions
+    if isinstance(obj, date):
+        return http_date(obj)
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+if orjson is not None:
+    # Datetimes go through json_default so they serialize as Flask's do
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider using orjson when available"""
+
+    default = staticmethod(json_default)
+
+    def _encode(self, obj: Any, sort_keys: bool, indent: bool) -> bytes:
+        if orjson is not None:
+            option = _ORJSON_OPTIONS
+            if sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            try:
+                return orjson.dumps(obj, default=json_default, option=option)
+            except TypeError:
+                # e.g. integers beyond 64 bits; the stdlib encoder copes
+                pass
+        return json.dumps(
+            obj, default=json_default, sort_keys=sort_keys, ensure_ascii=self.ensure_ascii,
+            indent=2 if indent else None, separators=None if indent else (',', ':')
+        ).encode('utf-8')
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or kwargs.keys() - {'sort_keys', 'indent', 'separators'}:
+            kwargs.setdefault('default', json_default)
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj, kwargs.get('sort_keys', self.sort_keys), bool(kwargs.get('indent'))).decode('utf-8')
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._encode(obj, self.sort_keys, indent) + b'\n', mimetype=self.mimetype)
+
+def content_etag(data: Any) -> str:
+    """Entity tag (unquoted) over the canonical JSON form of data: sorted keys, compact"""
+    payload = None
+    if orjson is not None:
+        try:
+            payload = orjson.dumps(data, default=json_default, option=_ORJSON_OPTIONS | orjson.OPT_SORT_KEYS)
+        except TypeError:
+            pass
+    if payload is None:
+        payload = json.dumps(data, default=json_default, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()
+
+def _negotiate_encoding() -> str:
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br'] > 0:
+        return 'br'
+    if accepted['gzip'] > 0:
+        return 'gzip'
+    return ''
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """The strong ETag of etag's entity in a content coding ('' for identity)"""
+    return f"{etag}-{encoding}" if encoding else etag
+
+def matching_etag(etag: str) -> Optional[str]:
+    """
+    The form of etag the request's If-None-Match holds: as is, or with the
+    content coding this request would be compressed with. None if neither.
+    """
+    for candidate in (etag, encoded_etag(etag, _negotiate_encoding())):
+        if request.if_none_match.contains_weak(candidate):
+            return candidate
+    return None
+
+def compress_response(response):
+    """after_request hook: compress large enough, compressible, buffered bodies"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code in (204, 206, 304) or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _negotiate_encoding()
+    if not encoding:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(encoded_etag(etag, encoding))
+    return response
+
+def init_app(app):
+    """Install the JSON provider and the compression hook on app"""
+    app.json = FastJSONProvider(app)
+    app.after_request(compress_response)
+    logger.info(f"JSON encoder: {'orjson' if orjson is not None else 'json'}; "
+                f"compression: {'br, ' if brotli is not None else ''}gzip above {COMPRESS_MIN_SIZE} bytes")
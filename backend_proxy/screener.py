@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Stock screener for AlphaSphere.
+
+Keeps a shared daily price panel (dates x symbols per OHLCV field) built
+from batched Yahoo Finance downloads, and a derived field table (symbols x
+fields: price, RSI, moving averages, volume ratio, ...) recomputed for the
+whole panel at once after every refresh. A screen is a filter expression
+evaluated as vectorized comparisons over that table, so it never waits on
+upstream unless it asks for symbols the panel has not loaded yet.
+
+A background thread refreshes the panel incrementally: only the last few
+days are downloaded and merged over the existing bars.
+
+Filter expressions use field names, numbers, + - * /, comparisons and
+and/or/not, e.g. "rsi14 < 30 and volume > 2 * avg_volume20".
+"""
+
+import ast
+import logging
+import math
+import os
+import re
+import time
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import yahoo_finance
+from symbol_metadata import metadata_index
+
+logger = logging.getLogger(__name__)
+
+SCREENER_UNIVERSE = [s for s in os.getenv(
+    'SCREENER_UNIVERSE',
+    'AAPL,MSFT,GOOGL,AMZN,TSLA,NVDA,META,NFLX,AMD,INTC,SPY,QQQ'
+).split(',') if s.strip()]
+# Seconds between incremental panel refreshes
+SCREENER_REFRESH_INTERVAL = int(os.getenv('SCREENER_REFRESH_INTERVAL', '300'))
+# Symbols not screened for this long are dropped from the panel
+SCREENER_SYMBOL_TTL = int(os.getenv('SCREENER_SYMBOL_TTL', str(24 * 3600)))
+SCREENER_MAX_SYMBOLS = int(os.getenv('SCREENER_MAX_SYMBOLS', '1000'))
+# Bars kept per symbol (a year of daily bars plus slack)
+PANEL_MAX_BARS = 260
+HISTORY_PERIOD = '1y'
+REFRESH_PERIOD = '5d'
+
+# Derived fields available to filter and sort on
+SCREENER_FIELDS = (
+    'price', 'change_pct', 'volume', 'avg_volume20', 'volume_ratio',
+    'rsi14', 'sma20', 'sma50', 'sma200', 'return_5d', 'return_20d',
+    'return_1y', 'volatility20', 'high_52w', 'low_52w', 'pct_from_high', 'bars'
+)
+
+def compute_fields(panel: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Every screener field for every symbol, computed over the whole panel"""
+    closes = panel['Close'].ffill()
+    volumes = panel['Volume'].fillna(0)
+    if closes.empty:
+        return pd.DataFrame(columns=SCREENER_FIELDS)
+
+    close = closes.to_numpy(dtype=float)  # dates x symbols
+    valid = np.count_nonzero(~np.isnan(close), axis=0)
+
+    def lagged(days: int) -> np.ndarray:
+        values = close[-1 - days] if close.shape[0] > days else np.full(close.shape[1], np.nan)
+        return np.where(valid > days, values, np.nan)
+
+    def sma(window: int) -> np.ndarray:
+        return np.where(valid >= window, closes.iloc[-window:].mean().to_numpy(), np.nan)
+
+    last = close[-1]
+    volume = volumes.to_numpy(dtype=float)
+    avg_volume20 = volume[-21:-1].mean(axis=0) if volume.shape[0] > 1 else np.full(close.shape[1], np.nan)
+
+    delta = closes.diff()
+    gains = delta.clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean().iloc[-1].to_numpy()
+    losses = (-delta).clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean().iloc[-1].to_numpy()
+    log_returns = np.log(closes / closes.shift(1)).iloc[-20:]
+    high = panel['High'].iloc[-252:].max().to_numpy(dtype=float)
+    low = panel['Low'].iloc[-252:].min().to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = np.where(losses == 0, np.where(gains > 0, 100.0, 50.0), 100.0 - 100.0 / (1.0 + gains / losses))
+        fields = {
+            'price': last,
+            'change_pct': (last / lagged(1) - 1) * 100,
+            'volume': volume[-1],
+            'avg_volume20': avg_volume20,
+            'volume_ratio': volume[-1] / np.where(avg_volume20 > 0, avg_volume20, np.nan),
+            'rsi14': np.where(valid > 14, rsi, np.nan),
+            'sma20': sma(20),
+            'sma50': sma(50),
+            'sma200': sma(200),
+            'return_5d': (last / lagged(5) - 1) * 100,
+            'return_20d': (last / lagged(20) - 1) * 100,
+            'return_1y': (last / lagged(251) - 1) * 100,
+            'volatility20': np.where(valid > 20, log_returns.std().to_numpy() * math.sqrt(252), np.nan),
+            'high_52w': high,
+            'low_52w': low,
+            'pct_from_high': (last / high - 1) * 100,
+            'bars': valid.astype(float),
+        }
+    return pd.DataFrame(fields, index=closes.columns, columns=SCREENER_FIELDS)
+
+def overlay(current: pd.DataFrame, incoming: pd.DataFrame) -> pd.DataFrame:
+    """Union of both frames where incoming non-NaN values win (a block-wise combine_first)"""
+    if current.empty:
+        return incoming
+    index = current.index.union(incoming.index)
+    columns = current.columns.append(incoming.columns.difference(current.columns))
+    merged = current.reindex(index=index, columns=columns)
+    values = merged.to_numpy(dtype=float, copy=True)
+    rows = index.get_indexer(incoming.index)
+    cols = columns.get_indexer(incoming.columns)
+    block = incoming.to_numpy(dtype=float)
+    existing = values[np.ix_(rows, cols)]
+    values[np.ix_(rows, cols)] = np.where(np.isnan(block), existing, block)
+    return pd.DataFrame(values, index=index, columns=columns)
+
+# --- Filter expressions ---
+
+_BINARY_OPS = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+_COMPARE_OPS = {
+    ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater,
+    ast.GtE: np.greater_equal, ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_KEYWORDS = re.compile(r"\b(AND|OR|NOT)\b")
+_TOO_DEEP = "Filter expression is too deeply nested"
+
+def compile_filter(expression: str) -> Callable[[Dict[str, np.ndarray]], np.ndarray]:
+    """
+    Turn a filter expression into a function of the field columns returning a
+    boolean mask. Only field names, numbers, arithmetic, comparisons and
+    boolean operators are accepted; anything else raises ValueError.
+    """
+    text = _KEYWORDS.sub(lambda m: m.group(1).lower(), expression.strip())
+    try:
+        tree = ast.parse(text, mode='eval').body
+    except SyntaxError as e:
+        raise ValueError(f"Invalid filter expression: {e.msg}")
+    except (RecursionError, MemoryError):
+        raise ValueError(_TOO_DEEP)
+
+    def build(node):
+        if isinstance(node, ast.BoolOp):
+            parts = [build(v) for v in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            def evaluate(cols):
+                result = parts[0](cols)
+                for part in parts[1:]:
+                    result = combine(result, part(cols))
+                return result
+            return evaluate
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            operand = build(node.operand)
+            return lambda cols: np.logical_not(operand(cols))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            operand = build(node.operand)
+            return lambda cols: np.negative(operand(cols))
+        if isinstance(node, ast.Compare):
+            terms = [build(node.left)] + [build(c) for c in node.comparators]
+            ops = []
+            for op in node.ops:
+                if type(op) not in _COMPARE_OPS:
+                    raise ValueError("Unsupported comparison in filter")
+                ops.append(_COMPARE_OPS[type(op)])
+            def evaluate(cols):
+                values = [term(cols) for term in terms]
+                result = ops[0](values[0], values[1])
+                for i in range(1, len(ops)):
+                    result = np.logical_and(result, ops[i](values[i], values[i + 1]))
+                return result
+            return evaluate
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            left, right, op = build(node.left), build(node.right), _BINARY_OPS[type(node.op)]
+            return lambda cols: op(left(cols), right(cols))
+        if isinstance(node, ast.Name):
+            if node.id not in SCREENER_FIELDS:
+                raise ValueError(f"Unknown field: {node.id}")
+            name = node.id
+            return lambda cols: cols[name]
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            value = float(node.value)
+            return lambda cols: value
+        raise ValueError(f"Unsupported syntax in filter: {type(node).__name__}")
+
+    try:
+        evaluate = build(tree)
+    except (RecursionError, MemoryError):
+        raise ValueError(_TOO_DEEP)
+
+    def mask(cols: Dict[str, np.ndarray]) -> np.ndarray:
+        try:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result = np.asarray(evaluate(cols))
+        except (RecursionError, MemoryError):
+            raise ValueError(_TOO_DEEP)
+        if result.dtype != bool:
+            raise ValueError("Filter expression must be a comparison")
+        return np.broadcast_to(result, (len(cols['price']),))
+    return mask
+
+class Screener:
+    """Shared price panel and derived field table"""
+
+    def __init__(self, universe: Iterable[str] = SCREENER_UNIVERSE):
+        self._lock = Lock()
+        self._panel: Dict[str, pd.DataFrame] = {field: pd.DataFrame() for field in yahoo_finance.PANEL_FIELDS}
+        self._fields = pd.DataFrame(columns=SCREENER_FIELDS)
+        self._last_used: Dict[str, float] = {}
+        # Symbols a download returned nothing for -> when; not retried until the next refresh interval
+        self._unavailable: Dict[str, float] = {}
+        self._pinned = {s.upper().strip() for s in universe}
+        self._updated_at: Optional[float] = None
+        self._refresh_lock = Lock()
+        self._wake = Event()
+        self._thread: Optional[Thread] = None
+
+    def _merge(self, update: Dict[str, pd.DataFrame]):
+        """Merge downloaded bars over the panel (new values win) and recompute fields"""
+        with self._lock:
+            panel = {}
+            for field, current in self._panel.items():
+                incoming = update.get(field)
+                merged = current if incoming is None or incoming.empty else overlay(current, incoming)
+                panel[field] = merged.sort_index().iloc[-PANEL_MAX_BARS:]
+            fields = compute_fields(panel)
+            self._panel = panel
+            self._fields = fields
+            self._updated_at = time.time()
+
+    def load_symbols(self, symbols: List[str]) -> List[str]:
+        """Download full history for symbols not in the panel yet; returns the ones loaded"""
+        retry_before = time.time() - SCREENER_REFRESH_INTERVAL
+        with self._lock:
+            missing = [s for s in symbols if s not in self._fields.index
+                       and self._unavailable.get(s, 0) < retry_before]
+        if not missing:
+            return []
+        with self._refresh_lock:
+            update = yahoo_finance.download_history_panel(missing, HISTORY_PERIOD, '1d')
+            if not update['Close'].empty:
+                self._merge(update)
+        loaded = list(update['Close'].columns)
+        now = time.time()
+        with self._lock:
+            for symbol in missing:
+                if symbol in loaded:
+                    self._unavailable.pop(symbol, None)
+                else:
+                    self._unavailable[symbol] = now
+        logger.info(f"Screener loaded {len(loaded)} of {len(missing)} new symbols")
+        return loaded
+
+    def refresh(self):
+        """Download the last few days for every panel symbol and merge them in"""
+        with self._lock:
+            cutoff = time.time() - SCREENER_SYMBOL_TTL
+            symbols = [s for s in self._fields.index
+                       if s in self._pinned or self._last_used.get(s, 0) >= cutoff]
+            dropped = [s for s in self._fields.index if s not in symbols]
+            if dropped:
+                self._panel = {field: frame.drop(columns=dropped, errors='ignore') for field, frame in self._panel.items()}
+                self._fields = self._fields.drop(index=dropped)
+                for symbol in dropped:
+                    self._last_used.pop(symbol, None)
+        if not symbols:
+            return
+        with self._refresh_lock:
+            self._merge(yahoo_finance.download_history_panel(symbols, REFRESH_PERIOD, '1d'))
+        logger.info(f"Screener refreshed {len(symbols)} symbols")
+
+    def _ensure_refresher(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = Thread(target=self._run, name='screener-refresher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(SCREENER_REFRESH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Screener refresh failed: {e}")
+
+    def features(self, symbols: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Field table for the given symbols (rows in request order; symbols
+        without data are left out), or for the whole panel. Loads symbols the
+        panel does not have yet and starts the background refresher.
+        """
+        if not self._updated_at:
+            self.load_symbols(sorted(self._pinned))
+        if symbols:
+            self.load_symbols(symbols)
+        self._ensure_refresher()
+
+        with self._lock:
+            fields = self._fields
+            now = time.time()
+            for symbol in symbols or []:
+                self._last_used[symbol] = now
+        if symbols:
+            fields = fields.loc[fields.index.intersection(symbols, sort=False)]
+        return fields
+
+    def closes(self, symbols: List[str]) -> pd.DataFrame:
+        """Daily closes (dates x symbols) from the panel, loading any symbols it lacks"""
+        self.features(symbols)
+        with self._lock:
+            closes = self._panel['Close']
+        return closes.reindex(columns=[s for s in symbols if s in closes.columns])
+
+    @property
+    def updated_at(self) -> Optional[float]:
+        return self._updated_at
+
+    def screen(self, expression: Optional[str] = None, symbols: Optional[List[str]] = None,
+               sort: str = 'change_pct', descending: bool = True, limit: int = 50) -> Dict[str, Any]:
+        """
+        Evaluate a filter over the panel (or the given symbols) and return the
+        matches ranked by `sort`. Raises ValueError for a bad expression or field.
+        """
+        if sort not in SCREENER_FIELDS:
+            raise ValueError(f"Unknown sort field: {sort}")
+        mask_fn = compile_filter(expression) if expression and expression.strip() else None
+
+        if symbols:
+            symbols = list(dict.fromkeys(s.upper().strip() for s in symbols if s.strip()))
+            if len(symbols) > SCREENER_MAX_SYMBOLS:
+                raise ValueError(f"At most {SCREENER_MAX_SYMBOLS} symbols per screen")
+        fields = self.features(symbols)
+        updated_at = self._updated_at
+
+        universe_size = len(fields)
+        if mask_fn is not None and universe_size:
+            columns = {name: fields[name].to_numpy(dtype=float) for name in SCREENER_FIELDS}
+            fields = fields[mask_fn(columns)]
+        ranked = fields.sort_values(sort, ascending=not descending, na_position='last').head(max(limit, 0))
+
+        results = []
+        for symbol, row in zip(ranked.index, ranked.to_numpy(dtype=float)):
+            item = {'symbol': symbol, 'name': metadata_index.get_name(symbol) or symbol}
+            for name, value in zip(SCREENER_FIELDS, row):
+                item[name] = round(float(value), 4) if np.isfinite(value) else None
+            results.append(item)
+
+        return {
+            'filter': expression or None,
+            'sort': sort,
+            'universe': universe_size,
+            'matched': len(fields),
+            'updatedAt': updated_at,
+            'results': results,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'symbols': len(self._fields),
+                'bars': len(self._panel['Close']),
+                'updated_at': self._updated_at,
+            }
+
+# Global instance
+screener = Screener()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Persistent symbol metadata index for AlphaSphere.
+
+Holds static per-symbol metadata (name, sector, industry, exchange) on disk
+so hot paths can resolve names and sectors without a ticker.info call.
+Lookups are plain dict reads; ticker autocomplete uses bisect over sorted
+symbol and name-token lists. Fetching lives in yahoo_finance, which fills
+this index from company info and refreshes stale entries incrementally.
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from bisect import bisect_left
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METADATA_INDEX_ENABLED = os.getenv('YF_FILE_CACHE', 'true').lower() == 'true'
+METADATA_INDEX_FILE = os.getenv(
+    'SYMBOL_METADATA_FILE',
+    os.path.join(os.path.dirname(__file__), 'symbol_metadata.json')
+)
+# Entries older than this are refreshed in the background
+METADATA_MAX_AGE = int(os.getenv('SYMBOL_METADATA_MAX_AGE', str(24 * 3600)))
+
+METADATA_FIELDS = ('name', 'sector', 'industry', 'exchange')
+
+# Names known before any lookup (updated_at=0 so the refresher fills in the rest)
+SEED_NAMES = {
+    'AAPL': 'Apple',
+    'MSFT': 'Microsoft',
+    'GOOGL': 'Google',
+    'AMZN': 'Amazon',
+    'TSLA': 'Tesla',
+    'NVDA': 'NVIDIA',
+    'META': 'Meta',
+    'NFLX': 'Netflix',
+    'AMD': 'AMD',
+    'INTC': 'Intel'
+}
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+class SymbolMetadataIndex:
+    """On-disk symbol -> metadata map with bulk lookup and prefix search"""
+
+    def __init__(self, path: str = METADATA_INDEX_FILE, persist: bool = METADATA_INDEX_ENABLED):
+        self.path = path
+        self.persist = persist
+        self._lock = Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # Bumped on every change that affects search; the lazily rebuilt
+        # (version, sorted symbols, sorted name tokens) is swapped in whole
+        self._search_version = 1
+        self._search: Tuple[int, List[str], List[tuple]] = (0, [], [])
+        self._dirty = False
+
+    # --- Persistence ---
+
+    def load(self):
+        """Load the index from disk, seeding well-known names"""
+        entries = {}
+        try:
+            if self.persist and os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    entries = json.load(f)
+                logger.info(f"Loaded symbol metadata index with {len(entries)} symbols")
+        except Exception as e:
+            logger.error(f"Error loading symbol metadata index: {e}")
+            entries = {}
+
+        for symbol, name in SEED_NAMES.items():
+            entries.setdefault(symbol, {
+                'symbol': symbol, 'name': name, 'sector': None,
+                'industry': None, 'exchange': None, 'updated_at': 0
+            })
+
+        with self._lock:
+            self._entries = entries
+            self._search_version += 1
+
+    def save(self, force: bool = False):
+        """Write the index to disk if it changed"""
+        if not self.persist:
+            return
+        with self._lock:
+            if not (self._dirty or force):
+                return
+            snapshot = dict(self._entries)
+            self._dirty = False
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving symbol metadata index: {e}")
+            with self._lock:
+                self._dirty = True
+
+    # --- Reads ---
+
+    def get(self, symbol: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(symbol.upper())
+        return None if entry is None or entry.get('missing') else entry
+
+    def get_many(self, symbols: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Bulk lookup; unknown symbols (including failed lookups) map to None"""
+        entries = self._entries
+        return {
+            symbol: None if entry is None or entry.get('missing') else entry
+            for symbol, entry in ((s, entries.get(s)) for s in (s.upper() for s in symbols))
+        }
+
+    def unfetched(self, symbols: Iterable[str]) -> List[str]:
+        """Symbols never looked up: absent, or only seeded (failed lookups count as fetched)"""
+        entries = self._entries
+        return [symbol for symbol in (s.upper() for s in symbols)
+                if not entries.get(symbol, {}).get('updated_at')]
+
+    def get_name(self, symbol: str) -> Optional[str]:
+        entry = self._entries.get(symbol.upper())
+        return entry.get('name') if entry else None
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol.upper() in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def search(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Autocomplete: symbols starting with the prefix first, then symbols
+        whose name has a word starting with it.
+        """
+        prefix = (prefix or '').strip()
+        if not prefix:
+            return []
+        _, sorted_symbols, sorted_tokens = self._rebuild_search()
+
+        results = []
+        seen = set()
+        symbol_prefix = prefix.upper()
+        i = bisect_left(sorted_symbols, symbol_prefix)
+        while i < len(sorted_symbols) and len(results) < limit and sorted_symbols[i].startswith(symbol_prefix):
+            seen.add(sorted_symbols[i])
+            results.append(self._entries[sorted_symbols[i]])
+            i += 1
+
+        token_prefix = prefix.lower()
+        i = bisect_left(sorted_tokens, (token_prefix, ''))
+        while i < len(sorted_tokens) and len(results) < limit and sorted_tokens[i][0].startswith(token_prefix):
+            symbol = sorted_tokens[i][1]
+            if symbol not in seen:
+                seen.add(symbol)
+                results.append(self._entries[symbol])
+            i += 1
+
+        return results
+
+    def stale_symbols(self, max_age: int = METADATA_MAX_AGE, limit: Optional[int] = None) -> List[str]:
+        """Symbols whose metadata is older than max_age, oldest first"""
+        cutoff = time.time() - max_age
+        with self._lock:
+            stale = [(entry.get('updated_at', 0), symbol) for symbol, entry in self._entries.items()
+                     if entry.get('updated_at', 0) < cutoff]
+        stale.sort()
+        symbols = [symbol for _, symbol in stale]
+        return symbols[:limit] if limit else symbols
+
+    # --- Writes ---
+
+    def upsert(self, symbol: str, metadata: Dict[str, Any]) -> bool:
+        """Insert or update a symbol's metadata; returns True if anything changed"""
+        symbol = symbol.upper()
+        with self._lock:
+            is_new = symbol not in self._entries
+            current = self._entries.get(symbol, {'symbol': symbol})
+            updated = dict(current)
+            was_missing = updated.pop('missing', False)
+            for key in METADATA_FIELDS:
+                value = metadata.get(key)
+                if value and value != 'N/A':
+                    updated[key] = value
+                else:
+                    updated.setdefault(key, None)
+            updated['updated_at'] = time.time()
+
+            changed = was_missing or any(updated.get(key) != current.get(key) for key in METADATA_FIELDS)
+            self._entries[symbol] = updated
+            # A refresh with identical data still bumps updated_at on disk
+            self._dirty = True
+            if changed or is_new:
+                self._search_version += 1
+            return changed
+
+    def mark_missing(self, symbol: str):
+        """
+        Record a failed lookup so it is retried on the refresh schedule
+        rather than on every request. Known metadata is kept as is.
+        """
+        symbol = symbol.upper()
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is None:
+                entry = {'symbol': symbol, **{key: None for key in METADATA_FIELDS}, 'missing': True}
+            self._entries[symbol] = {**entry, 'updated_at': time.time()}
+            self._dirty = True
+
+    def _rebuild_search(self) -> Tuple[int, List[str], List[tuple]]:
+        """
+        The search lists for the current entries. Built outside the lock from
+        a snapshot; a build that finishes after a newer one is not swapped in.
+        """
+        search = self._search
+        if search[0] == self._search_version:
+            return search
+        with self._lock:
+            entries = dict(self._entries)
+            version = self._search_version
+        tokens = []
+        entries = {symbol: entry for symbol, entry in entries.items() if not entry.get('missing')}
+        for symbol, entry in entries.items():
+            for token in set(_TOKEN_PATTERN.findall((entry.get('name') or '').lower())):
+                tokens.append((token, symbol))
+        search = (version, sorted(entries), sorted(tokens))
+        with self._lock:
+            if version > self._search[0]:
+                self._search = search
+        return search
+
+# Global instance
+metadata_index = SymbolMetadataIndex()
+metadata_index.load()
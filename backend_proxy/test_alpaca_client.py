@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Offline tests for Alpaca order validation"""
+
+import pytest
+
+from alpaca_client import changes_account, validate_order
+
+def order(**fields):
+    return {'symbol': 'aapl', 'side': 'Buy', 'type': 'market', 'time_in_force': 'day', 'qty': 10, **fields}
+
+def test_normalizes_fields_and_assigns_client_order_id():
+    validated = validate_order(order())
+    assert validated['symbol'] == 'AAPL'
+    assert validated['side'] == 'buy'
+    assert validated['qty'] == '10'
+    assert validated['client_order_id']
+
+def test_keeps_given_client_order_id():
+    assert validate_order(order(client_order_id='abc-1'))['client_order_id'] == 'abc-1'
+
+@pytest.mark.parametrize('fields, message', [
+    ({'symbol': ' '}, 'symbol is required'),
+    ({'side': 'hold'}, 'side must be one of'),
+    ({'type': 'bracket'}, 'type must be one of'),
+    ({'notional': 500}, 'exactly one of qty or notional'),
+    ({'qty': 0}, 'qty must be positive'),
+    ({'qty': 'ten'}, 'qty must be a number'),
+    ({'type': 'limit'}, 'limit_price is required'),
+    ({'type': 'stop_limit', 'limit_price': 10}, 'stop_price is required'),
+    ({'client_order_id': 'x' * 129}, 'client_order_id is longer'),
+])
+def test_rejects_invalid_orders(fields, message):
+    with pytest.raises(ValueError, match=message):
+        validate_order(order(**fields))
+
+def test_rejects_non_object():
+    with pytest.raises(ValueError, match='must be an object'):
+        validate_order(['AAPL'], 'orders[0]')
+
+@pytest.mark.parametrize('fields', [{'trail_price': 1.5}, {'trail_percent': '2'}])
+def test_trailing_stop_accepts_one_trail(fields):
+    validated = validate_order(order(type='trailing_stop', time_in_force='gtc', **fields))
+    (field, value), = fields.items()
+    assert validated[field] == str(value)
+
+@pytest.mark.parametrize('fields, message', [
+    ({}, 'exactly one of trail_price or trail_percent'),
+    ({'trail_price': 1.5, 'trail_percent': 2}, 'exactly one of trail_price or trail_percent'),
+    ({'trail_price': 0}, 'trail_price must be positive'),
+    ({'trail_percent': -1}, 'trail_percent must be positive'),
+    ({'trail_percent': 'wide'}, 'trail_percent must be a number'),
+])
+def test_trailing_stop_requires_one_positive_trail(fields, message):
+    with pytest.raises(ValueError, match=message):
+        validate_order(order(type='trailing_stop', **fields))
+
+@pytest.mark.parametrize('method, path, expected', [
+    ('POST', 'v2/orders', True),
+    ('DELETE', '/v2/orders/abc', True),
+    ('PATCH', 'v2/orders/abc', True),
+    ('DELETE', 'v2/positions/AAPL', True),
+    ('delete', 'v2/positions', True),
+    ('GET', 'v2/orders', False),
+    ('POST', 'v2/watchlists', False),
+    ('PUT', 'v2/ordersx', False),
+])
+def test_changes_account(method, path, expected):
+    assert changes_account(method, path) is expected
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Offline tests for backtest positions, returns and request parsing"""
+
+import numpy as np
+import pytest
+
+import backtest
+from backtest import BacktestSpec, BarFields, hold_until_changed, parse_spec, strategy_returns, target_positions
+
+nan = np.nan
+
+def test_hold_until_changed_starts_flat_and_holds():
+    state = np.array([
+        [nan, 1.0, nan],
+        [1.0, nan, nan],
+        [nan, 0.0, -1.0],
+        [nan, nan, nan],
+        [0.0, 1.0, nan],
+    ])
+    assert hold_until_changed(state).tolist() == [
+        [0.0, 1.0, 0.0],
+        [1.0, 1.0, 0.0],
+        [1.0, 0.0, -1.0],
+        [1.0, 0.0, -1.0],
+        [0.0, 1.0, -1.0],
+    ]
+
+def test_hold_until_changed_leaves_input_untouched():
+    state = np.array([[nan], [1.0], [nan]])
+    hold_until_changed(state)
+    assert np.isnan(state[0, 0]) and np.isnan(state[2, 0])
+
+def fields_for(close):
+    close = np.asarray(close, dtype=float).reshape(-1, 1)
+    return BarFields(close, close, close, np.full_like(close, 1000.0))
+
+def test_filter_rule_enters_and_exits():
+    fields = fields_for([10, 9, 8, 12, 13, 7])
+    spec = BacktestSpec(rule='filter', entry='price < 9', exit='price > 12')
+    assert target_positions(fields, spec)[:, 0].tolist() == [0, 0, 1, 1, 0, 1]
+
+def test_positions_trade_from_the_next_bar():
+    fields = fields_for([100, 110, 121, 121])
+    target = np.array([[0.0], [1.0], [1.0], [0.0]])
+    result = strategy_returns(fields, target, BacktestSpec(slippage_bps=10, commission_bps=0))
+    # Entered at bar 1's close: bar 1's own 10% move is not captured
+    assert result['held'][:, 0].tolist() == [0, 0, 1, 1]
+    assert result['bar_returns'][:, 0] == pytest.approx([0, 0.1, 0.1, 0])
+    assert result['turnover'][:, 0].tolist() == [0, 1, 0, 1]
+    assert result['net'][:, 0] == pytest.approx([0, -0.001, 0.1, -0.001])
+
+def test_parse_spec_defaults():
+    spec = parse_spec({})
+    assert spec.rule == 'recommendation'
+    assert spec.long_only is True
+    assert parse_spec({'entry': 'rsi14 < 30'}).rule == 'filter'
+
+@pytest.mark.parametrize('payload, message', [
+    ({'rule': 'momentum'}, 'rule must be one of'),
+    ({'period': '3w'}, 'Unsupported backtest period'),
+    ({'rule': 'filter'}, 'entry is required'),
+    ({'entry': 'open > 1'}, 'Unknown field'),
+    ({'long_only': 'false'}, 'long_only must be true or false'),
+    ({'long_only': 0}, 'long_only must be true or false'),
+    ({'threshold': 'high'}, 'threshold must be a number'),
+    ({'slippage_bps': -1}, 'slippage_bps must be at least 0'),
+])
+def test_parse_spec_rejects(payload, message):
+    with pytest.raises(ValueError, match=message):
+        parse_spec(payload)
+
+def test_parse_spec_long_only_false():
+    assert parse_spec({'long_only': False}).long_only is False
+    assert parse_spec({'long_only': None}).long_only is True
+
+def test_parse_spec_needs_a_served_period(monkeypatch):
+    monkeypatch.setattr(backtest.history_store, 'enabled', False)
+    with pytest.raises(ValueError, match='Unsupported backtest period'):
+        parse_spec({'period': '1y'})
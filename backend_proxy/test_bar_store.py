@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Offline tests for BarStore gap planning and re-adjustment detection"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bar_store import BAR_DTYPE, EARLIEST, BarStore, _reloaded, frame_to_bars
+
+def make_frame(dates, scale=1.0):
+    close = np.linspace(100, 120, len(dates)) * scale
+    return pd.DataFrame({
+        'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close,
+        'Volume': np.full(len(dates), 1000),
+    }, index=pd.DatetimeIndex(dates))
+
+def business_days(start, count):
+    return pd.bdate_range(start, periods=count)
+
+def make_bars(start, count, scale=1.0):
+    return frame_to_bars(make_frame(business_days(start, count), scale))
+
+def day(text):
+    return np.datetime64(text, 'D')
+
+@pytest.fixture
+def store(tmp_path):
+    return BarStore(root=str(tmp_path), intervals=('1d',), refresh=300)
+
+def test_missing_everything_without_a_file(store):
+    assert store.missing_ranges('AAPL', '1d', day('2024-01-01')) == [('full', day('2024-01-01'), None)]
+
+def test_nothing_missing_when_fresh_and_covered(store):
+    store.write('AAPL', '1d', make_bars('2024-01-01', 20), day('2024-01-01'))
+    assert store.missing_ranges('AAPL', '1d', day('2024-01-01')) == []
+    assert store.missing_ranges('AAPL', '1d', day('2024-01-15')) == []
+
+def test_head_range_for_an_earlier_start(store):
+    bars = make_bars('2024-03-01', 20)
+    store.write('AAPL', '1d', bars, day('2024-03-01'))
+    assert store.missing_ranges('AAPL', '1d', EARLIEST) == [('head', EARLIEST, bars['date'][0] + 1)]
+
+def test_tail_range_from_the_last_complete_bar_when_stale(store):
+    bars = make_bars('2024-01-01', 20)
+    store.write('AAPL', '1d', bars, day('2024-01-01'))
+    store.refresh = 0
+    assert store.missing_ranges('AAPL', '1d', day('2024-01-01')) == [('tail', bars['date'][-2], None)]
+    assert store.missing_ranges('AAPL', '1d', EARLIEST) == [
+        ('head', EARLIEST, bars['date'][0] + 1), ('tail', bars['date'][-2], None),
+    ]
+
+def test_stale_symbol_without_bars_is_refetched_in_full(store):
+    store.write('NEW', '1d', np.empty(0, BAR_DTYPE), day('2024-01-01'))
+    assert store.missing_ranges('NEW', '1d', day('2024-01-01')) == []
+    store.refresh = 0
+    assert store.missing_ranges('NEW', '1d', day('2024-01-01')) == [('full', day('2024-01-01'), None)]
+
+def test_reloaded():
+    current = make_bars('2024-01-01', 10)
+    anchor = current['date'][-2]
+    tail = current[-2:].copy()
+    assert not _reloaded(current, tail, anchor)
+    assert not _reloaded(current, tail[:0], anchor)
+
+    nudged = tail.copy()
+    nudged['close'][0] *= 1 + 1e-6
+    assert not _reloaded(current, nudged, anchor)
+
+    adjusted = tail.copy()
+    adjusted['close'][0] *= 0.98
+    assert _reloaded(current, adjusted, anchor)
+    # Yahoo no longer returns the anchor bar
+    assert _reloaded(current, tail[1:], anchor)
+
+def test_load_many_reloads_readjusted_history(store):
+    dates = business_days('2024-01-01', 30)
+    calls = []
+    scale = {'value': 1.0}
+
+    def fetch_many(symbols, start, end):
+        calls.append((tuple(symbols), start, end))
+        return {symbol: make_frame(dates[dates >= pd.Timestamp(str(start))], scale['value']) for symbol in symbols}
+
+    loaded, errors = store.load_many(['aapl', 'MSFT', 'AAPL'], '1d', 'max', fetch_many)
+    assert not errors
+    assert calls == [(('AAPL', 'MSFT'), EARLIEST, None)]
+    assert len(loaded['AAPL']) == 30
+
+    # Fresh: served from the files
+    store.load_many(['AAPL', 'MSFT'], '1d', 'max', fetch_many)
+    assert len(calls) == 1
+
+    # Stale and re-adjusted: the tail fetch disagrees, so both reload in full
+    store.refresh = 0
+    scale['value'] = 0.5
+    loaded, _ = store.load_many(['AAPL', 'MSFT'], '1d', 'max', fetch_many)
+    assert [call[1] for call in calls[1:]] == [np.datetime64(dates[-2].date(), 'D'), EARLIEST]
+    assert loaded['AAPL']['close'][0] == pytest.approx(50.0)
+    assert store.stats()['reloads'] == 2
+
+def test_load_many_keeps_stored_bars_when_a_fetch_fails(store):
+    store.write('AAPL', '1d', make_bars('2024-01-01', 10), day('2024-01-01'))
+    store.refresh = 0
+
+    def failing(symbols, start, end):
+        raise ConnectionError("upstream down")
+
+    loaded, errors = store.load_many(['AAPL'], '1d', 'max', failing)
+    assert errors == {'AAPL': 'upstream down'}
+    assert len(loaded['AAPL']) == 10
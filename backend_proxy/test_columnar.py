@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Offline tests for the columnar (Arrow / MessagePack) response formats"""
+
+import numpy as np
+import pytest
+from flask import Flask
+
+import columnar
+
+app = Flask(__name__)
+
+ROWS = [
+    {'symbol': 'AAPL', 'price': 190.5, 'volume': 1200},
+    {'symbol': 'MSFT', 'price': 410.25, 'volume': 800},
+]
+METADATA = {'underlying': 'AAPL', 'timestamps': [1, 2]}
+
+def test_rows_to_columns_keeps_requested_order():
+    columns = columnar.rows_to_columns(ROWS, ['price', 'symbol', 'missing'])
+    assert list(columns) == ['price', 'symbol', 'missing']
+    assert columns['symbol'] == ['AAPL', 'MSFT']
+    assert columns['missing'] == [None, None]
+    assert columnar.rows_to_columns([]) == {}
+
+def test_concat_columns_mixes_arrays_and_lists():
+    first = {'close': np.array([1.0, 2.0]), 'date': ['2024-01-02', '2024-01-03']}
+    second = {'close': np.array([3.0]), 'date': np.array(['2024-01-04'])}
+    columns = columnar.concat_columns([first, second])
+    assert isinstance(columns['close'], np.ndarray)
+    assert columns['close'].tolist() == [1.0, 2.0, 3.0]
+    assert columns['date'] == ['2024-01-02', '2024-01-03', '2024-01-04']
+
+@pytest.mark.parametrize('accept, expected', [
+    ('application/msgpack', 'msgpack'),
+    ('application/x-msgpack', 'msgpack'),
+    ('application/vnd.apache.arrow.stream', 'arrow'),
+    ('application/json, application/msgpack;q=0.5', None),
+    ('*/*', None),
+    (None, None),
+])
+def test_negotiate_format(monkeypatch, accept, expected):
+    monkeypatch.setattr(columnar, '_encoders', lambda: [
+        ('arrow', (columnar.ARROW_MIMETYPE,)), ('msgpack', columnar.MSGPACK_MIMETYPES),
+    ])
+    headers = {'Accept': accept} if accept else {}
+    with app.test_request_context(headers=headers):
+        assert columnar.negotiate_format() == expected
+
+def test_negotiate_format_skips_missing_encoders(monkeypatch):
+    monkeypatch.setattr(columnar, '_encoders', lambda: [])
+    with app.test_request_context(headers={'Accept': 'application/msgpack'}):
+        assert columnar.negotiate_format() is None
+
+def test_msgpack_round_trip():
+    msgpack = pytest.importorskip('msgpack')
+    columns = {'symbol': ['AAPL', 'MSFT'], 'price': np.array([190.5, 410.25])}
+    with app.app_context():
+        response = columnar.columnar_response('msgpack', columns, METADATA)
+    assert response.mimetype == 'application/msgpack'
+    assert 'Accept' in response.vary
+    decoded = msgpack.unpackb(response.get_data(), raw=False)
+    assert decoded == {'metadata': METADATA, 'columns': {'symbol': ['AAPL', 'MSFT'], 'price': [190.5, 410.25]}}
+
+def test_arrow_round_trip():
+    pa = pytest.importorskip('pyarrow')
+    columns = {'symbol': ['AAPL', 'MSFT'], 'price': np.array([190.5, 410.25]), 'volume': np.array([1200, 800])}
+    with app.app_context():
+        response = columnar.columnar_response('arrow', columns, METADATA)
+    assert response.mimetype == columnar.ARROW_MIMETYPE
+    table = pa.ipc.open_stream(response.get_data()).read_all()
+    assert table.column_names == ['symbol', 'price', 'volume']
+    assert table.to_pydict() == {'symbol': ['AAPL', 'MSFT'], 'price': [190.5, 410.25], 'volume': [1200, 800]}
+    assert pa.types.is_int64(table.schema.field('volume').type)
+    assert {key.decode(): value.decode() for key, value in table.schema.metadata.items()} == {
+        'underlying': '"AAPL"', 'timestamps': '[1, 2]',
+    }
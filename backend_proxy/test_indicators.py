@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Offline tests for the incremental IndicatorEngine"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import bar_store
+import indicators
+import yahoo_finance
+from bar_store import BarStore, bars_to_columns, frame_to_bars, slice_period
+from indicators import IndicatorEngine, compute_full, parse_indicator_set
+
+SPECS = parse_indicator_set('sma20,ema20,ema200,rsi14,macd,bb20')
+KEY = ('X', '1y', '1d')
+
+def make_history(count, seed=7):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, count)))
+    dates = np.busday_offset(np.datetime64('2023-01-02', 'D'), np.arange(count), roll='forward')
+    return [str(date) for date in dates], closes.tolist()
+
+def assert_matches_cold(series, dates, closes):
+    assert series['dates'] == list(dates)
+    for spec in SPECS:
+        expected, _ = compute_full(spec, np.asarray(closes))
+        for key, values in expected.items():
+            warm = np.asarray(series['tracks'][spec]['outputs'][key])
+            assert np.array_equal(np.isnan(warm), np.isnan(values)), (spec.name, key)
+            assert warm[~np.isnan(warm)] == pytest.approx(values[~np.isnan(values)], rel=1e-9, abs=1e-9), (spec.name, key)
+
+def test_growing_history_matches_compute_full():
+    dates, closes = make_history(320)
+    engine = IndicatorEngine()
+    engine.update(KEY, dates[:250], closes[:250], SPECS)
+    for end in range(251, 321, 4):
+        assert_matches_cold(engine.update(KEY, dates[:end], closes[:end], SPECS), dates[:end], closes[:end])
+
+def test_sliding_window_matches_compute_full():
+    dates, closes = make_history(320)
+    engine = IndicatorEngine()
+    engine.update(KEY, dates[:252], closes[:252], SPECS)
+    for end in range(253, 320, 3):
+        window = slice(end - 252, end)
+        assert_matches_cold(engine.update(KEY, dates[window], closes[window], SPECS), dates[window], closes[window])
+
+def test_revised_last_bar_matches_compute_full():
+    dates, closes = make_history(260)
+    engine = IndicatorEngine()
+    engine.update(KEY, dates, closes, SPECS)
+    revised = closes[:-1] + [closes[-1] * 1.02]
+    assert_matches_cold(engine.update(KEY, dates, revised, SPECS), dates, revised)
+
+def test_readjusted_earlier_closes_are_recomputed():
+    dates, closes = make_history(260)
+    engine = IndicatorEngine()
+    engine.update(KEY, dates[:259], closes[:259], SPECS)
+    adjusted = [close * 0.97 for close in closes[:259]] + closes[259:]
+    assert_matches_cold(engine.update(KEY, dates, adjusted, SPECS), dates, adjusted)
+
+@pytest.fixture
+def stored(tmp_path, monkeypatch):
+    """A bar store behind get_indicators, holding 400 daily bars that end on 'today'"""
+    store = BarStore(root=str(tmp_path), intervals=('1d',), refresh=300)
+    dates, closes = make_history(401)
+    frame = pd.DataFrame({'Close': closes}, index=pd.DatetimeIndex(dates))
+    bars = frame_to_bars(frame)
+    today = {'value': bars['date'][399]}
+
+    def write(count):
+        store.write('X', '1d', bars[:count], bars['date'][0])
+        today['value'] = bars['date'][count - 1]
+
+    def get_historical_columns(symbol, period, interval):
+        return bars_to_columns(slice_period(store.read(symbol, interval), period))
+
+    monkeypatch.setattr(bar_store, '_today', lambda: today['value'])
+    monkeypatch.setattr(indicators, 'history_store', store)
+    monkeypatch.setattr(indicators, 'indicator_engine', IndicatorEngine())
+    monkeypatch.setattr(yahoo_finance, 'get_historical_columns', get_historical_columns)
+    write(400)
+    return write, bars
+
+def test_sliding_period_steps_the_stored_series(stored, monkeypatch):
+    write, bars = stored
+    first = indicators.get_indicators('X', 'ema20,rsi14,macd', '1y', '1d', points=1000)
+    assert first['dates'][-1] == str(bars['date'][399])
+    assert len(first['dates']) == len(slice_period(bars[:400], '1y'))
+
+    rebuilds = []
+    monkeypatch.setattr(indicators, 'compute_full', lambda *args: rebuilds.append(args))
+    write(401)
+    second = indicators.get_indicators('X', 'ema20,rsi14,macd', '1y', '1d', points=1000)
+    assert not rebuilds
+    # The period's start moved on, but the values still come from the whole stored series
+    window = slice_period(bars, '1y')
+    assert second['dates'] == [str(date) for date in window['date']]
+    assert second['dates'][0] != first['dates'][0]
+    for spec in parse_indicator_set('ema20,rsi14,macd'):
+        expected, _ = compute_full(spec, bars['close'].astype(float))
+        for key, values in expected.items():
+            assert second['indicators'][spec.name][key] == pytest.approx(values[-len(window):].tolist(), abs=1e-6)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Offline tests for news normalization and dedup"""
+
+from datetime import datetime, timezone
+
+import news
+from news import normalize_news, normalize_news_item
+
+def content_item(title, url='https://example.com/a', pub_date='2024-05-01T12:00:00Z', summary='Summary'):
+    return {'content': {
+        'title': title,
+        'summary': summary,
+        'pubDate': pub_date,
+        'clickThroughUrl': {'url': url},
+        'provider': {'displayName': 'Reuters'},
+        'thumbnail': {'url': 'https://example.com/a.jpg'},
+    }}
+
+def legacy_item(title, link='https://example.com/b', timestamp=1714564800, summary='Summary'):
+    return {'title': title, 'summary': summary, 'link': link, 'publisher': 'Bloomberg',
+            'providerPublishTime': timestamp}
+
+def test_content_structure():
+    item = normalize_news_item(content_item('Apple rises'), 'AAPL')
+    assert item.title == 'Apple rises'
+    assert item.url == 'https://example.com/a'
+    assert item.publisher == 'Reuters'
+    assert item.image_url == 'https://example.com/a.jpg'
+    assert item.published_ts == datetime(2024, 5, 1, 12, tzinfo=timezone.utc).timestamp()
+    assert item.symbols == ['AAPL']
+
+def test_legacy_structure():
+    item = normalize_news_item(legacy_item('Apple falls'))
+    assert item.publisher == 'Bloomberg'
+    assert item.published_ts == 1714564800.0
+    assert item.symbols == []
+
+def test_missing_fields():
+    assert normalize_news_item(content_item('', summary='x')) is None
+    assert normalize_news_item(legacy_item('Title', summary='')) is None
+    item = normalize_news_item(content_item('No link', url='/relative', pub_date='not a date'))
+    assert item.url == ''
+    assert item.published_ts is None
+    assert item.id == news.article_id('', 'No link')
+
+def test_dedupes_by_url_and_title():
+    items = normalize_news([
+        content_item('First', 'https://example.com/1'),
+        content_item('First again', 'https://example.com/1'),
+        legacy_item('  FIRST ', 'https://example.com/2'),
+        legacy_item('Second', 'https://example.com/3'),
+        {'content': None, 'title': 'malformed'},
+    ])
+    assert [item.title for item in items] == ['First', 'Second']
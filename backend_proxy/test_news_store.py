@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Offline tests for NewsStore paging and the per-feed index"""
+
+import time
+from datetime import datetime, timezone
+
+import news
+from news import NewsStore, normalize_news_item
+
+def legacy_item(title, link, timestamp):
+    return {'title': title, 'summary': 'Summary', 'link': link, 'publisher': 'Bloomberg',
+            'providerPublishTime': timestamp}
+
+def stored_item(n, ts, symbol='AAPL'):
+    return normalize_news_item(legacy_item(f"Story {n}", f"https://example.com/{n}", ts), symbol)
+
+def test_store_pages_newest_first_by_article_id():
+    store = NewsStore()
+    items = [stored_item(n, 1000 + n) for n in range(10)]
+    store.add('AAPL', items[:6])
+    store.add('AAPL', items[4:])
+    first = store.query('AAPL', 4)
+    assert [item.title for item in first] == ['Story 9', 'Story 8', 'Story 7', 'Story 6']
+    second = store.query('AAPL', 4, before=first[-1].id)
+    assert [item.title for item in second] == ['Story 5', 'Story 4', 'Story 3', 'Story 2']
+    assert len(store) == 10
+
+def test_store_timestamp_cursor():
+    store = NewsStore()
+    store.add('AAPL', [stored_item(n, 1000 + n) for n in range(5)])
+    assert [item.title for item in store.query('AAPL', 10, before='1003')] == ['Story 2', 'Story 1', 'Story 0']
+    iso = datetime.fromtimestamp(1002, timezone.utc).isoformat()
+    assert [item.title for item in store.query('AAPL', 10, before=iso)] == ['Story 1', 'Story 0']
+    # An unknown cursor pages from the start
+    assert len(store.query('AAPL', 10, before='nonsense')) == 5
+
+def test_store_shares_articles_across_feeds():
+    store = NewsStore()
+    item = stored_item(1, 1000)
+    store.add('AAPL', [item])
+    store.add(news.MARKET_FEED, [stored_item(1, 1000, 'MSFT')])
+    assert len(store) == 1
+    assert store.query(news.MARKET_FEED, 5)[0].symbols == ['AAPL', 'MSFT']
+    assert store.feed_symbols() == ['AAPL']
+
+def test_prune_drops_feeds_left_without_articles():
+    now = time.time()
+    store = NewsStore(max_articles=3)
+    store.add('AAPL', [stored_item(n, now - 600 + n) for n in range(3)])
+    store.add('MSFT', [stored_item(n, now - 60 + n, 'MSFT') for n in range(10, 13)])
+    store.add('EMPTY', [])
+    assert store.prune() == 3
+    assert store.feed_symbols() == ['MSFT']
+    assert store.fetched_at('AAPL') is None and store.fetched_at('EMPTY') is None
+    assert store.fetched_at('MSFT') is not None
+    assert store.query('AAPL', 10) == []
+    assert len(store.query('MSFT', 10)) == 3
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Offline tests for the multi-leg options payoff grid"""
+
+import numpy as np
+import pytest
+
+from option_payoff import evaluate_position
+
+GRID = {'priceSteps': 121, 'dateSteps': 5, 'priceMin': 70, 'priceMax': 130}
+
+def evaluate(legs, **payload):
+    return evaluate_position({'spot': 100, 'legs': legs, 'grid': GRID, **payload})
+
+def test_long_call_at_expiry_is_intrinsic_less_premium():
+    result = evaluate([{'type': 'call', 'strike': 100, 'days': 30, 'premium': 5}])
+    prices = np.array(result['prices'])
+    expected = (np.maximum(prices - 100, 0) - 5) * 100
+    assert result['horizon']['days'] == 30
+    assert result['horizon']['pnl'] == pytest.approx(expected.tolist(), abs=0.01)
+    assert result['horizon']['maxLoss'] == -500
+    assert result['horizon']['breakevens'] == [105.0]
+    assert result['netPremium'] == 500
+
+def test_grid_shape():
+    result = evaluate([{'type': 'put', 'strike': 95, 'days': 20}], grid={**GRID, 'volShifts': [-0.1, 0, 0.1]})
+    assert len(result['volShifts']) == 3
+    assert np.array(result['pnl']).shape == (3, 5, 121)
+    assert result['days'] == [0.0, 5.0, 10.0, 15.0, 20.0]
+    # Premium defaults to today's model value, so P&L at spot today is zero
+    assert result['pnl'][1][0][60] == pytest.approx(0, abs=0.01)
+
+def test_vertical_spread_is_bounded():
+    result = evaluate([
+        {'type': 'call', 'strike': 95, 'days': 30, 'premium': 7},
+        {'type': 'call', 'strike': 105, 'days': 30, 'premium': 2, 'quantity': -1},
+    ])
+    assert result['horizon']['maxProfit'] == pytest.approx(500)
+    assert result['horizon']['maxLoss'] == pytest.approx(-500)
+    assert result['horizon']['breakevens'] == [100.0]
+
+def test_stock_leg_is_linear():
+    result = evaluate([{'type': 'stock', 'quantity': 50}], multiplier=100)
+    prices = np.array(result['prices'])
+    assert result['horizon']['pnl'] == pytest.approx(((prices - 100) * 50).tolist(), abs=0.01)
+    assert result['greeks']['delta'] == 50
+    assert result['greeks']['gamma'] == 0
+
+def test_short_side_flips_quantity():
+    long_put = evaluate([{'type': 'put', 'strike': 100, 'days': 30, 'premium': 4}])
+    short_put = evaluate([{'type': 'put', 'strike': 100, 'days': 30, 'premium': 4, 'quantity': 1, 'side': 'short'}])
+    assert short_put['horizon']['pnl'] == pytest.approx([-v for v in long_put['horizon']['pnl']])
+
+@pytest.mark.parametrize('payload, message', [
+    ({'legs': []}, 'at least one leg'),
+    ({'legs': [{'type': 'future'}]}, 'type must be one of'),
+    ({'legs': [{'type': 'call', 'strike': -1, 'days': 5}]}, 'strike must be positive'),
+    ({'legs': [{'type': 'call', 'strike': 100, 'expiry': '2020-01-01'}]}, 'already expired'),
+    ({'legs': [{'type': 'call', 'strike': 100, 'expiry': 'soon'}]}, 'expiry must be YYYY-MM-DD'),
+    ({'spot': 0}, 'spot must be positive'),
+    ({'grid': {'priceSteps': 'many'}}, 'priceSteps must be a number'),
+    ({'grid': {'dateSteps': 2.5}}, 'dateSteps must be a whole number'),
+    ({'grid': {'priceSteps': 1}}, 'Invalid grid'),
+    ({'grid': {'volShifts': 0.1}}, 'volShifts must be a list'),
+    ({'grid': [200]}, 'grid must be an object'),
+    ({'grid': {'priceSteps': 100000, 'dateSteps': 1000}}, 'Grid too large'),
+])
+def test_rejects_invalid_input(payload, message):
+    position = {'spot': 100, 'legs': [{'type': 'call', 'strike': 100, 'days': 30}], **payload}
+    with pytest.raises(ValueError, match=message):
+        evaluate_position(position)
+
+def test_null_grid_sizes_take_defaults():
+    result = evaluate_position({'spot': 100, 'legs': [{'type': 'call', 'strike': 100, 'days': 30}],
+                                'grid': {'priceSteps': None, 'dateSteps': None}})
+    assert np.array(result['pnl']).shape[1:] == (30, 200)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Offline tests for portfolio risk clustering, tail metrics and position parsing"""
+
+import math
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from portfolio_risk import _tail_metrics, correlation_clusters, parse_positions
+
+def test_correlated_pair_plus_independent_asset_is_two_clusters():
+    rng = np.random.default_rng(3)
+    base = rng.normal(size=500)
+    returns = np.column_stack([base, base * 2.0, rng.normal(size=500)])
+    labels = correlation_clusters(np.corrcoef(returns, rowvar=False))
+    assert labels.tolist() == [0, 0, 2]
+    assert len(set(labels.tolist())) == 2
+
+def test_clusters_are_transitive():
+    # A-B and B-C are linked, A-C is not: still one cluster
+    corr = np.array([
+        [1.0, 0.8, 0.2, 0.0],
+        [0.8, 1.0, 0.9, 0.0],
+        [0.2, 0.9, 1.0, 0.0],
+        [0.0, 0.0, 0.0, 1.0],
+    ])
+    assert correlation_clusters(corr, threshold=0.7).tolist() == [0, 0, 0, 3]
+
+def test_tail_metrics_on_a_normal_sample():
+    sigma = 1000.0
+    pnl = np.random.default_rng(11).normal(0, sigma, 200_000)
+    metrics = _tail_metrics(pnl, sigma)
+    for key, z in (('95', 1.6448536269514722), ('99', 2.3263478740408408)):
+        level = int(key) / 100
+        expected_cvar = sigma * math.exp(-0.5 * z * z) / math.sqrt(2 * math.pi) / (1 - level)
+        assert metrics['var']['parametric'][key] == pytest.approx(z * sigma, abs=0.01)
+        assert metrics['cvar']['parametric'][key] == pytest.approx(expected_cvar, abs=0.01)
+        # The sample's own quantile and tail mean land on the same answers
+        assert metrics['var']['historical'][key] == pytest.approx(z * sigma, rel=0.02)
+        assert metrics['cvar']['historical'][key] == pytest.approx(expected_cvar, rel=0.02)
+    assert metrics['cvar']['parametric']['95'] > metrics['var']['parametric']['95']
+
+def test_tail_metrics_without_observations():
+    metrics = _tail_metrics(np.array([]), 0.0)
+    assert metrics['var']['historical'] == {'95': 0.0, '99': 0.0}
+    assert metrics['cvar']['historical'] == {'95': 0.0, '99': 0.0}
+
+def test_parse_occ_option_symbol():
+    [option] = parse_positions([{'symbol': 'AAPL301218C00187500', 'qty': '2', 'side': 'long',
+                                 'market_value': '1250.50', 'current_price': '6.2525', 'asset_class': 'us_option'}])
+    assert option['underlying'] == 'AAPL'
+    assert option['is_option'] is True
+    assert option['is_call'] is True
+    assert option['strike'] == 187.5
+    assert option['days'] == (date(2030, 12, 18) - datetime.now().date()).days
+    assert option['qty'] == 2
+    assert option['market_value'] == 1250.5
+
+def test_parse_short_put_and_expired_option():
+    [short_put, expired] = parse_positions([
+        {'symbol': 'spy301220p00450000', 'qty': '3', 'side': 'short', 'market_value': '-900', 'current_price': '3'},
+        {'symbol': 'QQQ200117P00100000', 'qty': '-1', 'market_value': '0', 'current_price': '0'},
+    ])
+    assert (short_put['underlying'], short_put['is_call'], short_put['strike'], short_put['qty']) == ('SPY', False, 450.0, -3)
+    assert expired['days'] == 0
+
+def test_parse_skips_flat_and_malformed_positions():
+    parsed = parse_positions([
+        {'symbol': 'MSFT', 'qty': '10', 'market_value': '4000', 'current_price': '400'},
+        {'symbol': 'TSLA', 'qty': '0'},
+        {'symbol': 'NVDA', 'qty': 'ten'},
+        # Looks like an OCC symbol but Alpaca says it is an equity
+        {'symbol': 'AAPL301218C00187500', 'qty': '1', 'asset_class': 'us_equity'},
+    ])
+    assert [(p['symbol'], p['underlying'], p['is_option']) for p in parsed] == [
+        ('MSFT', 'MSFT', False), ('AAPL301218C00187500', 'AAPL301218C00187500', False),
+    ]
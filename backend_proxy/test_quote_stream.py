@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Offline tests for quote stream coalescing, heartbeats and cleanup"""
+
+import json
+
+import pytest
+
+import quote_stream
+import yahoo_finance
+from quote_stream import QuoteStreamHub, Subscriber
+
+def quote(price, volume=1000):
+    return {'price': price, 'change': 0.0, 'changePercent': 0.0, 'volume': volume}
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Quotes the hub's refresh sees, set per test; refreshes are driven by hand"""
+    quotes = {}
+    monkeypatch.setattr(yahoo_finance, 'get_stock_quotes',
+                        lambda symbols, use_cache=True: {s: quotes[s] for s in symbols if s in quotes})
+    monkeypatch.setattr(QuoteStreamHub, '_ensure_refresher', lambda self: None)
+    return quotes
+
+def test_slow_subscriber_gets_only_the_latest_quote(upstream):
+    hub = QuoteStreamHub(batch_size=1)
+    subscriber = hub.subscribe(['aapl', 'MSFT'])
+    for price in (100.0, 101.0, 102.5):
+        upstream['AAPL'] = quote(price)
+        hub.refresh(['AAPL'])
+    upstream['MSFT'] = quote(300.0)
+    hub.refresh(['AAPL', 'MSFT'])
+    assert subscriber.take(0) == {'AAPL': quote(102.5), 'MSFT': quote(300.0)}
+    assert subscriber.take(0) is None
+
+def test_unchanged_quotes_are_not_resent(upstream):
+    hub = QuoteStreamHub()
+    subscriber = hub.subscribe(['AAPL'])
+    upstream['AAPL'] = quote(100.0)
+    assert hub.refresh(['AAPL']) == 1
+    subscriber.take(0)
+    assert hub.refresh(['AAPL']) == 0
+    assert subscriber.take(0) is None
+
+def test_new_subscriber_starts_with_the_last_quotes(upstream):
+    hub = QuoteStreamHub()
+    hub.subscribe(['AAPL'])
+    upstream['AAPL'] = quote(100.0)
+    hub.refresh(['AAPL'])
+    assert hub.subscribe(['AAPL', 'TSLA']).take(0) == {'AAPL': quote(100.0)}
+
+def test_stream_sends_heartbeat_when_idle(upstream):
+    hub = QuoteStreamHub(interval=2)
+    subscriber = hub.subscribe(['AAPL'])
+    frames = hub.stream(subscriber, heartbeat=0.01)
+    assert next(frames) == "retry: 2000\n\n"
+    assert next(frames) == ": heartbeat\n\n"
+
+    upstream['AAPL'] = quote(100.0)
+    hub.refresh(['AAPL'])
+    event, data = next(frames).rstrip('\n').split('\n')
+    assert event == 'event: quotes'
+    assert json.loads(data[len('data: '):]) == {'AAPL': quote(100.0)}
+    frames.close()
+    assert hub.stats()['subscribers'] == 0
+
+def test_unsubscribe_releases_symbols(upstream):
+    hub = QuoteStreamHub()
+    first = hub.subscribe(['AAPL', 'MSFT'])
+    second = hub.subscribe(['AAPL'])
+    upstream.update({'AAPL': quote(100.0), 'MSFT': quote(300.0)})
+    hub.refresh(['AAPL', 'MSFT'])
+
+    hub.unsubscribe(first)
+    assert first.closed
+    assert first.take(0) is not None  # quotes already queued are still handed over
+    stats = hub.stats()
+    assert (stats['subscribers'], stats['symbols']) == (1, 1)
+    assert set(hub._last_quotes) == {'AAPL'}
+    # A second unsubscribe is a no-op
+    hub.unsubscribe(first)
+    assert hub.stats()['symbols'] == 1
+
+    hub.unsubscribe(second)
+    assert hub.stats()['symbols'] == 0
+    assert not hub._last_quotes
+    # Quotes for symbols nobody watches any more are dropped
+    assert hub.refresh(['AAPL']) == 0
+
+def test_closed_subscriber_take_returns_at_once():
+    subscriber = Subscriber(1, ['AAPL'])
+    subscriber.close()
+    assert subscriber.take(60) is None
+
+def test_subscriber_limit(upstream, monkeypatch):
+    monkeypatch.setattr(quote_stream, 'QUOTE_STREAM_MAX_SUBSCRIBERS', 1)
+    hub = QuoteStreamHub()
+    hub.subscribe(['AAPL'])
+    with pytest.raises(RuntimeError, match='Too many'):
+        hub.subscribe(['MSFT'])
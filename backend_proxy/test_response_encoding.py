@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Offline tests for response compression and content-coded ETags"""
+
+import gzip
+
+import pytest
+from flask import Flask, Response, jsonify, request
+
+import response_encoding
+
+ETAG = 'abc123'
+PAYLOAD = {'rows': [{'symbol': f"SYM{i}", 'price': i * 1.5} for i in range(200)]}
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    response_encoding.init_app(app)
+
+    @app.route('/data')
+    def data():
+        matched = response_encoding.matching_etag(ETAG) if request.if_none_match else None
+        if matched is not None:
+            response = Response(status=304)
+            response.set_etag(matched)
+            return response
+        response = jsonify(PAYLOAD)
+        response.set_etag(ETAG, weak=request.args.get('weak') == '1')
+        return response
+
+    @app.route('/small')
+    def small():
+        response = jsonify({'ok': True})
+        response.set_etag(ETAG)
+        return response
+
+    return app.test_client()
+
+def test_identity_body_keeps_the_entity_tag(client):
+    response = client.get('/data', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_etag() == (ETAG, False)
+
+def test_gzip_body_gets_its_own_strong_tag(client):
+    response = client.get('/data', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.get_etag() == (f"{ETAG}-gzip", False)
+    assert 'Accept-Encoding' in response.vary
+    assert gzip.decompress(response.get_data()).startswith(b'{')
+
+def test_weak_tags_are_left_alone(client):
+    response = client.get('/data?weak=1', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.get_etag() == (ETAG, True)
+
+def test_uncompressed_small_body_keeps_the_tag(client):
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_etag() == (ETAG, False)
+
+@pytest.mark.parametrize('encoding, held', [
+    ('gzip', f'"{ETAG}-gzip"'),
+    ('gzip', f'"{ETAG}"'),
+    ('identity', f'"{ETAG}"'),
+])
+def test_conditional_get_matches_either_form(client, encoding, held):
+    response = client.get('/data', headers={'Accept-Encoding': encoding, 'If-None-Match': held})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == held
+
+def test_coded_tag_does_not_match_another_coding(client):
+    response = client.get('/data', headers={'Accept-Encoding': 'identity', 'If-None-Match': f'"{ETAG}-gzip"'})
+    assert response.status_code == 200
+    assert response.get_etag() == (ETAG, False)
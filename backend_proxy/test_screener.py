@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Offline tests for screener filter expressions"""
+
+import numpy as np
+import pytest
+
+from screener import SCREENER_FIELDS, compile_filter
+
+COLUMNS = {name: np.zeros(4) for name in SCREENER_FIELDS}
+COLUMNS.update({
+    'price': np.array([10.0, 50.0, 150.0, np.nan]),
+    'rsi14': np.array([25.0, 45.0, 75.0, 30.0]),
+    'sma50': np.array([12.0, 40.0, 140.0, 1.0]),
+    'volume': np.array([1e6, 0.0, 3e6, 2e6]),
+})
+
+@pytest.mark.parametrize('expression, expected', [
+    ('rsi14 < 30', [True, False, False, False]),
+    ('price > sma50 AND rsi14 < 80', [False, True, True, False]),
+    ('rsi14 < 30 OR rsi14 > 70', [True, False, True, False]),
+    ('NOT price > 20', [True, False, False, True]),
+    ('20 <= price < 100', [False, True, False, False]),
+    ('price / sma50 - 1 > 0.05', [False, True, True, False]),
+    ('-price < -100', [False, False, True, False]),
+    ('price * 2 >= 100 and not rsi14 == 75', [False, True, False, False]),
+    ('price / volume > 0', [True, True, True, False]),
+])
+def test_filters(expression, expected):
+    assert compile_filter(expression)(COLUMNS).tolist() == expected
+
+def test_constant_comparison_broadcasts():
+    assert compile_filter('1 < 2')(COLUMNS).tolist() == [True] * 4
+
+@pytest.mark.parametrize('expression, message', [
+    ('__import__("os").system("true")', 'Unsupported syntax'),
+    ('price.__class__ > 0', 'Unsupported syntax'),
+    ('price[0] > 1', 'Unsupported syntax'),
+    ('abs(price) > 1', 'Unsupported syntax'),
+    ('(lambda: 1)() > 0', 'Unsupported syntax'),
+    ('price ** 2 > 1', 'Unsupported syntax'),
+    ('"a" < "b"', 'Unsupported syntax'),
+    ('price > True', 'Unsupported syntax'),
+    ('price in sma50', 'Unsupported comparison'),
+    ('price is sma50', 'Unsupported comparison'),
+    ('market_cap > 1', 'Unknown field: market_cap'),
+    ('price >', 'Invalid filter expression'),
+    ('(' * 300 + 'price' + ')' * 300 + ' > 1', 'Invalid filter expression'),
+    ('not ' * 5000 + 'price > 1', 'too deeply nested'),
+    ('-' * 1500 + 'price > 1', 'too deeply nested'),
+])
+def test_rejects_anything_outside_the_allow_list(expression, message):
+    with pytest.raises(ValueError, match=message):
+        compile_filter(expression)
+
+def test_requires_a_comparison():
+    with pytest.raises(ValueError, match='must be a comparison'):
+        compile_filter('price + 1')(COLUMNS)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Offline tests for the symbol metadata index: search, missing entries and staleness"""
+
+import time
+
+import pytest
+
+import symbol_metadata
+from symbol_metadata import SEED_NAMES, SymbolMetadataIndex
+
+@pytest.fixture
+def index(tmp_path):
+    index = SymbolMetadataIndex(path=str(tmp_path / 'symbol_metadata.json'), persist=False)
+    index.load()
+    return index
+
+def symbols(results):
+    return [entry['symbol'] for entry in results]
+
+def test_search_puts_symbol_prefixes_before_name_tokens(index):
+    index.upsert('APP', {'name': 'AppLovin Corp'})
+    index.upsert('MU', {'name': 'Micron Technology'})
+    index.upsert('ZZZ', {'name': 'Applied Zeta Holdings'})
+    # APP by symbol, then name words in order: apple (AAPL), applied (ZZZ), applovin (APP, already listed)
+    assert symbols(index.search('ap')) == ['APP', 'AAPL', 'ZZZ']
+    assert symbols(index.search('ap', limit=1)) == ['APP']
+    assert symbols(index.search('micro')) == ['MU', 'MSFT']
+    assert symbols(index.search('ms')) == ['MSFT']
+    assert index.search('  ') == []
+
+def test_search_sees_upserts_after_a_rebuild(index):
+    assert symbols(index.search('BRK')) == []
+    index.upsert('BRK-B', {'name': 'Berkshire Hathaway'})
+    assert symbols(index.search('BRK')) == ['BRK-B']
+    assert symbols(index.search('hath')) == ['BRK-B']
+
+def test_search_during_a_rebuild_sees_current_entries(index, monkeypatch):
+    pattern = symbol_metadata._TOKEN_PATTERN
+    seen_mid_build = []
+
+    class Concurrent:
+        """Runs another search, then a write, while the search lists are being built"""
+        def findall(self, text):
+            monkeypatch.setattr(symbol_metadata, '_TOKEN_PATTERN', pattern)
+            seen_mid_build.append(symbols(index.search('NEW')))
+            index.upsert('LATE', {'name': 'Late Arrival'})
+            return pattern.findall(text)
+
+    index.upsert('NEW', {'name': 'Newco'})
+    monkeypatch.setattr(symbol_metadata, '_TOKEN_PATTERN', Concurrent())
+    assert symbols(index.search('NEW')) == ['NEW']
+    assert seen_mid_build == [['NEW']]
+    # The write made during the first build is picked up by the next search
+    assert symbols(index.search('arriv')) == ['LATE']
+    # Up to date now: the lists are reused
+    assert index._rebuild_search() is index._rebuild_search()
+
+def test_mark_missing_hides_entries(index):
+    index.mark_missing('nope')
+    assert 'NOPE' in index
+    assert index.get('NOPE') is None
+    assert index.get_many(['NOPE', 'AAPL'])['NOPE'] is None
+    assert index.search('NOPE') == []
+
+    # Known metadata survives a failed refresh
+    index.upsert('OLD', {'name': 'Oldco'})
+    index.mark_missing('OLD')
+    assert index.get('OLD')['name'] == 'Oldco'
+    assert symbols(index.search('oldco')) == ['OLD']
+
+    # A later successful lookup of a missing symbol makes it visible
+    assert index.upsert('NOPE', {'name': 'Nope Inc'}) is True
+    assert index.get('NOPE')['name'] == 'Nope Inc'
+    assert symbols(index.search('nope')) == ['NOPE']
+
+def test_unfetched_counts_seeded_entries_until_looked_up(index):
+    index.upsert('MSFT', {'name': 'Microsoft Corporation'})
+    index.mark_missing('GONE')
+    assert index.unfetched(['aapl', 'msft', 'gone', 'newco']) == ['AAPL', 'NEWCO']
+
+def test_stale_symbols_oldest_first(index, monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now - 1000)
+    index.upsert('OLDER', {'name': 'Older'})
+    monkeypatch.setattr(time, 'time', lambda: now - 500)
+    index.upsert('OLD', {'name': 'Old'})
+    monkeypatch.setattr(time, 'time', lambda: now)
+    index.upsert('FRESH', {'name': 'Fresh'})
+
+    stale = index.stale_symbols(max_age=100)
+    # Seeded entries (updated_at=0) come first, then by age
+    assert stale[:len(SEED_NAMES)] == sorted(SEED_NAMES)
+    assert stale[len(SEED_NAMES):] == ['OLDER', 'OLD']
+    assert index.stale_symbols(max_age=100, limit=2) == stale[:2]
+    assert index.stale_symbols(max_age=700)[len(SEED_NAMES):] == ['OLDER']
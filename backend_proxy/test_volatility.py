@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Offline tests for the incremental VolatilityTracker"""
+
+import numpy as np
+import pytest
+
+from bar_store import BAR_DTYPE
+from volatility import VolatilityTracker
+
+def make_history(count, seed=1):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, count)))
+    dates = np.busday_offset(np.datetime64('2024-01-02', 'D'), np.arange(count), roll='forward')
+    return [
+        {
+            'date': str(date),
+            'open': float(c * (1 + rng.normal(0, 0.004))),
+            'high': float(c * (1 + abs(rng.normal(0, 0.01)))),
+            'low': float(c * (1 - abs(rng.normal(0, 0.01)))),
+            'close': float(c),
+        }
+        for date, c in zip(dates, close)
+    ]
+
+def cold_estimate(history):
+    tracker = VolatilityTracker()
+    tracker.update('X', history)
+    return tracker.estimate(['X'])['X']
+
+def test_new_bars_match_a_cold_rebuild():
+    history = make_history(80)
+    tracker = VolatilityTracker()
+    tracker.update('X', history[:40])
+    for end in range(41, 81, 3):
+        tracker.update('X', history[:end])
+        assert tracker.estimate(['X'])['X'] == cold_estimate(history[:end])
+
+def test_revised_last_bar_is_rescored():
+    history = make_history(50)
+    tracker = VolatilityTracker()
+    tracker.update('X', history)
+    revised = [dict(bar) for bar in history]
+    revised[-1]['close'] *= 1.03
+    assert tracker.update('X', revised) == 1
+    assert tracker.estimate(['X'])['X'] == cold_estimate(revised)
+
+def test_readjusted_history_rebuilds_the_window():
+    history = make_history(60)
+    tracker = VolatilityTracker()
+    tracker.update('X', history[:59])
+    # A dividend re-adjusts every earlier bar; one new bar arrives
+    adjusted = [{**bar, **{f: bar[f] * 0.98 for f in ('open', 'high', 'low', 'close')}} for bar in history[:59]]
+    adjusted.append(history[59])
+    tracker.update('X', adjusted)
+    assert tracker.estimate(['X'])['X'] == cold_estimate(adjusted)
+
+def test_bar_store_records():
+    history = make_history(40)
+    records = np.empty(len(history), BAR_DTYPE)
+    for field in ('open', 'high', 'low', 'close'):
+        records[field] = [bar[field] for bar in history]
+    records['date'] = [np.datetime64(bar['date'], 'D') for bar in history]
+    records['volume'] = 0
+    tracker = VolatilityTracker()
+    tracker.update('X', records[:30])
+    tracker.update('X', records)
+    assert tracker.estimate(['X'])['X'] == pytest.approx(cold_estimate(history))
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Realized volatility estimators for AlphaSphere.
+
+Keeps a rolling window of per-bar volatility terms for each symbol, built
+from daily history loaded for all requested symbols in one batch (from the
+bar store when it serves daily bars). When new bars show up in the history
+only those bars are processed; if an earlier bar of the window changed
+(Yahoo re-adjusted the history) the window is rebuilt. The estimators for
+all requested symbols are computed together over a (symbols x window) panel.
+"""
+
+import logging
+import math
+import os
+import warnings
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import yahoo_finance
+from bar_store import history_store
+
+logger = logging.getLogger(__name__)
+
+# Rolling window (bars) for every estimator
+VOLATILITY_WINDOW = int(os.getenv('VOLATILITY_WINDOW', '20'))
+TRADING_DAYS_PER_YEAR = 252
+
+# History series the tracker reads; matches the /api/yahoo/history defaults
+# so it shares cache entries with the frontend
+HISTORY_PERIOD = '1y'
+HISTORY_INTERVAL = '1d'
+
+# Annualized volatility thresholds for the regime classification
+LOW_VOLATILITY_THRESHOLD = float(os.getenv('LOW_VOLATILITY_THRESHOLD', '0.20'))
+HIGH_VOLATILITY_THRESHOLD = float(os.getenv('HIGH_VOLATILITY_THRESHOLD', '0.40'))
+
+# Columns of the per-bar term buffer
+_RETURN, _PARKINSON, _GARMAN_KLASS, _TRUE_RANGE = range(4)
+_TERM_COUNT = 4
+
+_PARKINSON_SCALE = 1.0 / (4.0 * math.log(2.0))
+_GARMAN_KLASS_SCALE = 2.0 * math.log(2.0) - 1.0
+
+def _bar_key(bar) -> tuple:
+    """What identifies a bar's terms: its date and prices"""
+    return (bar['date'], float(bar['open']), float(bar['high']), float(bar['low']), float(bar['close']))
+
+def _bar_terms(bar: Dict[str, Any], prev_close: Optional[float]) -> np.ndarray:
+    """Per-bar volatility terms: log return, Parkinson, Garman-Klass, true range"""
+    open_, high, low, close = bar['open'], bar['high'], bar['low'], bar['close']
+    terms = np.full(_TERM_COUNT, np.nan)
+    if min(open_, high, low, close) <= 0:
+        return terms
+
+    log_hl = math.log(high / low)
+    log_co = math.log(close / open_)
+    terms[_PARKINSON] = log_hl * log_hl
+    terms[_GARMAN_KLASS] = 0.5 * log_hl * log_hl - _GARMAN_KLASS_SCALE * log_co * log_co
+
+    if prev_close and prev_close > 0:
+        terms[_RETURN] = math.log(close / prev_close)
+        terms[_TRUE_RANGE] = max(high - low, abs(high - prev_close), abs(low - prev_close))
+    else:
+        terms[_TRUE_RANGE] = high - low
+    return terms
+
+class VolatilityTracker:
+    """Rolling realized-volatility state per symbol, updated incrementally"""
+
+    def __init__(self, window: int = VOLATILITY_WINDOW):
+        self.window = window
+        self._lock = Lock()
+        # symbol -> {'terms', 'last_date', 'last_close', 'prev_close', 'seen'}
+        self._states: Dict[str, Dict[str, Any]] = {}
+
+    def _new_state(self) -> Dict[str, Any]:
+        return {
+            'terms': np.full((self.window, _TERM_COUNT), np.nan),
+            'last_date': None,
+            'last_close': None,
+            'prev_close': None,  # close before the last bar, for re-scoring an updated last bar
+            'seen': [],  # _bar_key of the bars behind the window, oldest first
+        }
+
+    def update(self, symbol: str, history) -> int:
+        """
+        Fold any bars newer than the last one seen into the symbol's window.
+        history is a date-ordered sequence of bars (dicts or bar store
+        records) with date, open, high, low and close. Returns the number
+        of bars processed.
+        """
+        if not len(history):
+            return 0
+
+        with self._lock:
+            state = self._states.get(symbol)
+            if state is None or state['last_date'] is None:
+                state = self._new_state()
+                new_bars = history[-(self.window + 1):]
+            else:
+                # Walk back from the end to the last bar we already have;
+                # usually that is zero or one step
+                start = len(history)
+                while start > 0 and history[start - 1]['date'] >= state['last_date']:
+                    start -= 1
+                new_bars = history[start:]
+                # Bars before the last one seen are final unless history was re-adjusted
+                seen = state['seen'][:-1]
+                earlier = min(len(seen), start)
+                changed = any(
+                    _bar_key(history[start - earlier + i]) != key
+                    for i, key in enumerate(seen[len(seen) - earlier:])
+                )
+                if len(new_bars) > self.window or changed:
+                    state = self._new_state()
+                    new_bars = history[-(self.window + 1):]
+
+            terms, seen = state['terms'], state['seen']
+            for bar in new_bars:
+                if bar['date'] == state['last_date']:
+                    # Today's bar was revised in place (intraday close moved)
+                    terms[-1] = _bar_terms(bar, state['prev_close'])
+                    seen[-1] = _bar_key(bar)
+                else:
+                    terms[:-1] = terms[1:]
+                    terms[-1] = _bar_terms(bar, state['last_close'])
+                    state['prev_close'] = state['last_close']
+                    state['last_date'] = bar['date']
+                    seen.append(_bar_key(bar))
+                state['last_close'] = float(bar['close'])
+            del seen[:-(self.window + 1)]
+
+            self._states[symbol] = state
+            return len(new_bars)
+
+    def estimate(self, symbols: List[str]) -> Dict[str, Dict[str, float]]:
+        """Annualized estimators for every tracked symbol, computed as one panel"""
+        with self._lock:
+            tracked = [s for s in symbols if s in self._states]
+            if not tracked:
+                return {}
+            panel = np.stack([self._states[s]['terms'] for s in tracked])  # symbols x window x terms
+            last_close = np.array([self._states[s]['last_close'] or np.nan for s in tracked])
+
+        annualize = math.sqrt(TRADING_DAYS_PER_YEAR)
+        returns = panel[:, :, _RETURN]
+        valid_returns = np.count_nonzero(~np.isnan(returns), axis=1)
+        # Symbols with too few bars come out as NaN; silence the warnings for them
+        with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            close_to_close = np.nanstd(returns, axis=1, ddof=1) * annualize
+            parkinson = np.sqrt(np.nanmean(panel[:, :, _PARKINSON], axis=1) * _PARKINSON_SCALE) * annualize
+            garman_klass = np.sqrt(np.clip(np.nanmean(panel[:, :, _GARMAN_KLASS], axis=1), 0, None)) * annualize
+            atr = np.nanmean(panel[:, :, _TRUE_RANGE], axis=1)
+            atr_percent = atr / last_close
+
+        results = {}
+        for i, symbol in enumerate(tracked):
+            results[symbol] = {
+                'close_to_close': _finite_or_none(close_to_close[i]),
+                'parkinson': _finite_or_none(parkinson[i]),
+                'garman_klass': _finite_or_none(garman_klass[i]),
+                'atr': _finite_or_none(atr[i]),
+                'atr_percent': _finite_or_none(atr_percent[i]),
+                'bars': int(valid_returns[i]),
+            }
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+def _finite_or_none(value: float) -> Optional[float]:
+    return round(float(value), 6) if np.isfinite(value) else None
+
+def classify_volatility(annualized: Optional[float]) -> str:
+    """Map an annualized volatility to 'low' / 'medium' / 'high'"""
+    if annualized is None:
+        return "medium"
+    if annualized >= HIGH_VOLATILITY_THRESHOLD:
+        return "high"
+    if annualized <= LOW_VOLATILITY_THRESHOLD:
+        return "low"
+    return "medium"
+
+def _regime_estimate(metrics: Dict[str, Any]) -> Optional[float]:
+    """
+    Volatility used for regimes: the larger of Garman-Klass (intraday range)
+    and close-to-close (catches overnight gaps the range estimators miss).
+    """
+    candidates = [metrics['garman_klass'], metrics['close_to_close']]
+    candidates = [c for c in candidates if c is not None]
+    return max(candidates) if candidates else None
+
+def load_histories(symbols: List[str]) -> Dict[str, Any]:
+    """
+    {symbol: date-ordered bars} for every symbol with data: bar store
+    records when the store serves daily bars, else rows of one batched
+    panel download.
+    """
+    if history_store.serves(HISTORY_PERIOD, HISTORY_INTERVAL):
+        loaded = yahoo_finance.load_history_bars(symbols, HISTORY_PERIOD, HISTORY_INTERVAL)
+        return {symbol: bars for symbol, bars in loaded.items() if len(bars)}
+
+    panel = yahoo_finance.download_history_panel(symbols, HISTORY_PERIOD, HISTORY_INTERVAL)
+    histories = {}
+    for symbol in panel['Close'].columns:
+        frame = pd.DataFrame({field.lower(): panel[field][symbol] for field in ('Open', 'High', 'Low', 'Close')})
+        frame = frame[frame['close'].notna()]
+        frame.insert(0, 'date', frame.index.strftime('%Y-%m-%d'))
+        histories[symbol] = frame.to_dict(orient='records')
+    return histories
+
+def analyze_symbols(symbols: List[str]) -> Dict[str, Any]:
+    """
+    Realized volatility for a set of symbols from their daily history,
+    loaded for all of them in one batch.
+
+    Returns the overall regime (median across symbols) plus the per-symbol
+    estimators.
+    """
+    symbols = list(dict.fromkeys(s.upper().strip() for s in symbols or [] if isinstance(s, str) and s.strip()))
+    try:
+        histories = load_histories(symbols)
+    except Exception as e:
+        logger.warning(f"Could not load history for volatility: {e}")
+        histories = {}
+    for symbol, history in histories.items():
+        try:
+            volatility_tracker.update(symbol, history)
+        except Exception as e:
+            logger.warning(f"Could not update volatility for {symbol}: {e}")
+
+    per_symbol = volatility_tracker.estimate(symbols)
+    estimates = []
+    for metrics in per_symbol.values():
+        estimate = _regime_estimate(metrics)
+        metrics['regime'] = classify_volatility(estimate)
+        if estimate is not None:
+            estimates.append(estimate)
+
+    market_volatility = float(np.median(estimates)) if estimates else None
+
+    return {
+        'level': classify_volatility(market_volatility),
+        'annualized': round(market_volatility, 6) if market_volatility is not None else None,
+        'symbols': per_symbol,
+    }
+
+# Global instance
+volatility_tracker = VolatilityTracker()
@@ -9,8 +9,17 @@ import json
 import os
 import pickle
 import random
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from threading import Lock
 
+import numpy as np
+
+import black_scholes
+import news
+from bar_store import EARLIEST, bars_to_columns, history_store
+from response_encoding import content_etag
+from symbol_metadata import metadata_index
+
 logging.basicConfig(level=logging.INFO)
 
 # Rate limiting configuration
@@ -55,8 +64,15 @@ CACHE_DURATION = {
     'info': 3600,  # 1 hour for company info
     'history': 300,  # 5 minutes for historical data
     'sectors': 1800,  # 30 minutes for sector data
+    'options': 120,  # 2 minutes for option chains
+    'expirations': 3600,  # 1 hour for listed option expiries
 }
 
+# Max symbols per batched quote / history download
+QUOTE_BATCH_SIZE = int(os.getenv('YF_QUOTE_BATCH_SIZE', '50'))
+HISTORY_BATCH_SIZE = int(os.getenv('YF_HISTORY_BATCH_SIZE', '100'))
+PANEL_FIELDS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
 # Cache persistence configuration
 # Set YF_FILE_CACHE=false to disable writing a pickle file to disk
 # Set YF_CACHE_FILE to override the cache file path
@@ -73,6 +89,33 @@ CACHE_ROTATE_MINUTES = int(os.getenv('YF_CACHE_ROTATE_MINUTES', '30'))
 # In-memory cache storage
 cache_storage = {}
 
+# How many stale metadata entries to refresh per cleanup pass (every 5 minutes)
+METADATA_REFRESH_BATCH = int(os.getenv('SYMBOL_METADATA_REFRESH_BATCH', '25'))
+METADATA_FETCH_WORKERS = int(os.getenv('SYMBOL_METADATA_FETCH_WORKERS', '8'))
+
+# Sector ETFs used for sector performance
+SECTOR_ETFS = [
+    {'name': 'Technology', 'etf': 'XLK'},
+    {'name': 'Healthcare', 'etf': 'XLV'},
+    {'name': 'Financial', 'etf': 'XLF'},
+    {'name': 'Consumer Discretionary', 'etf': 'XLY'},
+    {'name': 'Energy', 'etf': 'XLE'},
+    {'name': 'Industrials', 'etf': 'XLI'},
+    {'name': 'Consumer Staples', 'etf': 'XLP'},
+    {'name': 'Materials', 'etf': 'XLB'},
+    {'name': 'Real Estate', 'etf': 'XLRE'},
+    {'name': 'Utilities', 'etf': 'XLU'},
+    {'name': 'Communication Services', 'etf': 'XLC'}
+]
+
+# Yahoo's company sector names -> the sector ETF names above
+YAHOO_SECTOR_NAMES = {
+    'Financial Services': 'Financial',
+    'Consumer Cyclical': 'Consumer Discretionary',
+    'Consumer Defensive': 'Consumer Staples',
+    'Basic Materials': 'Materials',
+}
+
 def load_cache_from_file():
     """Load cache data from file on startup."""
     global cache_storage
@@ -140,12 +183,34 @@ def get_cached_data(cache_key):
         return cache_storage[cache_key]['data']
     return None
 
+def _entry_etag(data):
+    try:
+        return content_etag(data)
+    except (TypeError, ValueError) as e:
+        logging.warning(f"No ETag for cached data: {e}")
+        return None
+
+def get_cache_entry(cache_key):
+    """
+    The valid cache entry for cache_key (data, timestamp, duration, etag),
+    or None. Used for HTTP caching headers.
+    """
+    if not is_cache_valid(cache_key):
+        return None
+    entry = cache_storage[cache_key]
+    if 'etag' not in entry:
+        # Entries loaded from an older cache file
+        entry['etag'] = _entry_etag(entry['data'])
+    return entry
+
 def set_cached_data(cache_key, data, duration):
     """Store data in cache with expiration."""
     cache_storage[cache_key] = {
         'data': data,
         'timestamp': time.time(),
-        'duration': duration
+        'duration': duration,
+        # Computed once here so conditional requests never re-serialize the data
+        'etag': _entry_etag(data)
     }
     logging.info(f"Cached data for {cache_key} (expires in {duration}s)")
     
@@ -189,6 +254,21 @@ def rotate_cache_if_necessary():
     except Exception as e:
         logging.warning(f"Error while rotating cache: {e}")
 
+def normalize_sector(sector):
+    """Map a Yahoo sector name onto the sector ETF naming; None if unknown."""
+    if not sector or sector == 'N/A':
+        return None
+    return YAHOO_SECTOR_NAMES.get(sector, sector)
+
+def _metadata_from_info(info):
+    """Static metadata fields from a ticker.info dict or a company info record."""
+    return {
+        'name': info.get('longName') or info.get('shortName') or info.get('name'),
+        'sector': info.get('sector'),
+        'industry': info.get('industry'),
+        'exchange': info.get('exchange'),
+    }
+
 # Load cache on module import
 load_cache_from_file()
 
@@ -220,24 +300,44 @@ def get_stock_quote(symbol):
     
     try:
         ticker = get_ticker(symbol)
+        known_name = metadata_index.get_name(symbol)
         
         # Try multiple methods to get stock info
         info = None
-        try:
-            info = ticker.info
-        except Exception as e:
-            logging.warning(f"Failed to get info for {symbol}, trying fast_info: {e}")
+        if known_name:
+            # Static metadata is already indexed, so the lighter fast_info
+            # is enough for price data
             try:
                 fast_info = ticker.fast_info
                 info = {
                     'currentPrice': fast_info.get('last_price'),
-                    'previousClose': fast_info.get('previous_close'),
-                    'volume': fast_info.get('shares'),
-                    'longName': symbol
+                    'previousClose': fast_info.get('regular_market_previous_close') or fast_info.get('previous_close'),
+                    'volume': fast_info.get('last_volume'),
+                    'longName': known_name
                 }
-            except Exception as e2:
-                logging.error(f"Failed to get fast_info for {symbol}: {e2}")
-                raise e2
+            except Exception as e:
+                logging.warning(f"Failed to get fast_info for {symbol}, falling back to info: {e}")
+                info = None
+        
+        if not info:
+            try:
+                info = ticker.info
+                if info:
+                    # Flushed by the periodic cleanup, off the quote path
+                    metadata_index.upsert(symbol, _metadata_from_info(info))
+            except Exception as e:
+                logging.warning(f"Failed to get info for {symbol}, trying fast_info: {e}")
+                try:
+                    fast_info = ticker.fast_info
+                    info = {
+                        'currentPrice': fast_info.get('last_price'),
+                        'previousClose': fast_info.get('previous_close'),
+                        'volume': fast_info.get('shares'),
+                        'longName': known_name or symbol
+                    }
+                except Exception as e2:
+                    logging.error(f"Failed to get fast_info for {symbol}: {e2}")
+                    raise e2
 
         if not info:
             raise ValueError(f"No data available for symbol {symbol}")
@@ -284,9 +384,165 @@ def get_stock_quote(symbol):
         logging.error(f"Error fetching quote for {symbol}: {e}")
         return None
 
-def get_company_info(symbol):
+def _quote_from_bars(symbol, bars):
+    """Build a quote (same shape as get_stock_quote) from recent daily bars."""
+    bars = bars.dropna(subset=['Close'])
+    if bars.empty:
+        return None
+    price = float(bars['Close'].iloc[-1])
+    if price <= 0:
+        return None
+    prev_close = float(bars['Close'].iloc[-2]) if len(bars) > 1 else price
+    change = price - prev_close if prev_close > 0 else 0
+    change_percent = (change / prev_close) * 100 if prev_close > 0 else 0
+    volume = bars['Volume'].iloc[-1] if 'Volume' in bars else 0
+    return {
+        'symbol': symbol,
+        'name': metadata_index.get_name(symbol) or symbol,
+        'price': round(price, 2),
+        'change': round(change, 2),
+        'changePercent': round(change_percent, 2),
+        'volume': int(volume) if pd.notna(volume) else 0,
+        'timestamp': time.time()
+    }
+
+def get_stock_quotes(symbols, use_cache=True):
+    """
+    Batch quotes for many symbols.
+
+    Cached quotes are reused (unless use_cache=False); the rest are fetched
+    with one yf.download call per QUOTE_BATCH_SIZE symbols and written back
+    to the same cache entries get_stock_quote uses. Symbols the batch call
+    can't price fall back to get_stock_quote. Unknown symbols map to None.
+    """
+    symbols = list(dict.fromkeys(s.upper().strip() for s in symbols if isinstance(s, str) and s.strip()))
+    quotes = {}
+    missing = []
+    for symbol in symbols:
+        cached_data = get_cached_data(get_cache_key('quote', symbol)) if use_cache else None
+        if cached_data:
+            quotes[symbol] = cached_data
+        else:
+            missing.append(symbol)
+    
+    for start in range(0, len(missing), QUOTE_BATCH_SIZE):
+        batch = missing[start:start + QUOTE_BATCH_SIZE]
+        rate_limit()
+        try:
+            data = yf.download(
+                batch, period='5d', interval='1d', group_by='ticker',
+                auto_adjust=False, progress=False, threads=True
+            )
+        except Exception as e:
+            logging.error(f"Batch quote download failed for {len(batch)} symbols: {e}")
+            data = None
+        
+        for symbol in batch:
+            quote = None
+            if data is not None and not data.empty:
+                try:
+                    bars = data[symbol] if isinstance(data.columns, pd.MultiIndex) else data
+                    quote = _quote_from_bars(symbol, bars)
+                except (KeyError, IndexError, ValueError) as e:
+                    logging.warning(f"No batch quote data for {symbol}: {e}")
+            if quote is not None:
+                set_cached_data(get_cache_key('quote', symbol), quote, CACHE_DURATION['quote'])
+            else:
+                quote = get_stock_quote(symbol)
+            quotes[symbol] = quote
+    
+    return {symbol: quotes.get(symbol) for symbol in symbols}
+
+def _history_range(start, end):
+    """yfinance history arguments for a bar store range (EARLIEST: everything)"""
+    if start == EARLIEST:
+        return {'period': 'max'}
+    return {'start': str(start), 'end': str(end) if end is not None else None}
+
+def _fetch_history_frame(symbol, interval, start, end):
+    """One symbol's bars for the bar store"""
+    rate_limit()
+    return get_ticker(symbol).history(interval=interval, **_history_range(start, end))
+
+def _download_history_frames(symbols, interval, start, end):
+    """{symbol: bars frame} for one batch of symbols, for the bar store; raises on failure"""
+    rate_limit()
+    data = yf.download(
+        symbols, interval=interval, group_by='column', auto_adjust=True,
+        progress=False, threads=True, **_history_range(start, end)
+    )
+    if data is None or data.empty:
+        return {}
+    if not isinstance(data.columns, pd.MultiIndex):
+        return {symbols[0]: data}
+    return {symbol: data.xs(symbol, axis=1, level=1) for symbol in data.columns.get_level_values(1).unique()}
+
+def load_history_bars(symbols, period='1y', interval='1d'):
+    """
+    {symbol: bar store records covering period} for many symbols, downloading
+    only missing ranges (batched). Symbols without data map to empty arrays.
+    Requires history_store.serves(period, interval).
+    """
+    loaded, _ = history_store.load_many(
+        symbols, interval, period,
+        lambda batch, start, end: _download_history_frames(batch, interval, start, end),
+        batch_size=HISTORY_BATCH_SIZE
+    )
+    return loaded
+
+def _panel_from_bars(loaded):
+    """Panel frames from {symbol: bar store records}"""
+    panel = {}
+    for field in PANEL_FIELDS:
+        series = [
+            pd.Series(bars[field.lower()], index=pd.DatetimeIndex(bars['date'], name='Date'), name=symbol)
+            for symbol, bars in loaded.items() if len(bars)
+        ]
+        panel[field] = pd.concat(series, axis=1) if series else pd.DataFrame()
+    return panel
+
+def download_history_panel(symbols, period='1y', interval='1d'):
+    """
+    Split-adjusted OHLCV for many symbols as {field: DataFrame(dates x symbols)},
+    with one yf.download call per HISTORY_BATCH_SIZE symbols. Intervals the
+    bar store keeps are read from disk, downloading only missing ranges;
+    others are not cached: callers keep the panel themselves. Symbols without
+    data are left out.
+    """
+    symbols = list(dict.fromkeys(s.upper().strip() for s in symbols if isinstance(s, str) and s.strip()))
+    if history_store.serves(period, interval):
+        return _panel_from_bars(load_history_bars(symbols, period, interval))
+
+    parts = {field: [] for field in PANEL_FIELDS}
+    for start in range(0, len(symbols), HISTORY_BATCH_SIZE):
+        batch = symbols[start:start + HISTORY_BATCH_SIZE]
+        rate_limit()
+        try:
+            data = yf.download(
+                batch, period=period, interval=interval, group_by='column',
+                auto_adjust=True, progress=False, threads=True
+            )
+        except Exception as e:
+            logging.error(f"Batch history download failed for {len(batch)} symbols: {e}")
+            continue
+        if data is None or data.empty:
+            continue
+        if not isinstance(data.columns, pd.MultiIndex):
+            data.columns = pd.MultiIndex.from_product([data.columns, batch[:1]])
+        for field in PANEL_FIELDS:
+            if field in data.columns.get_level_values(0):
+                parts[field].append(data[field])
+    
+    panel = {}
+    for field in PANEL_FIELDS:
+        frame = pd.concat(parts[field], axis=1) if parts[field] else pd.DataFrame()
+        panel[field] = frame.dropna(axis=1, how='all')
+    return panel
+
+def get_company_info(symbol, save_index=True):
     """
     Fetches company profile information with caching.
+    Pass save_index=False when the caller persists the metadata index itself.
     """
     cache_key = get_cache_key('info', symbol.upper())
     cached_data = get_cached_data(cache_key)
@@ -331,12 +587,133 @@ def get_company_info(symbol):
 
         # Cache the company info
         set_cached_data(cache_key, company_info, CACHE_DURATION['info'])
+        metadata_index.upsert(symbol, _metadata_from_info(company_info))
+        if save_index:
+            metadata_index.save()
         return company_info
         
     except Exception as e:
         logging.error(f"Error fetching company info for {symbol}: {e}")
         return None
 
+def get_symbol_metadata(symbols, fetch_missing=True):
+    """
+    Bulk symbol metadata (name, sector, industry, exchange) lookup.
+
+    Resolves from the persistent metadata index first, then from cached
+    company info, and only fetches company info for symbols never seen
+    before, concurrently under the rate limiter. Unknown symbols map to None.
+    """
+    symbols = [s.upper().strip() for s in symbols if isinstance(s, str) and s.strip()]
+    # Seeded entries have a name but were never fetched; failed lookups wait for the refresher
+    missing = metadata_index.unfetched(symbols)
+
+    changed = False
+    still_missing = []
+    for symbol in missing:
+        cached_info = get_cached_data(get_cache_key('info', symbol))
+        if cached_info:
+            metadata_index.upsert(symbol, _metadata_from_info(cached_info))
+            changed = True
+        else:
+            still_missing.append(symbol)
+
+    if still_missing and fetch_missing:
+        logging.info(f"Fetching company info for {len(still_missing)} symbols missing from the metadata index")
+
+        def fetch(symbol):
+            rate_limit()
+            if get_company_info(symbol, save_index=False) is None:
+                metadata_index.mark_missing(symbol)
+
+        with ThreadPoolExecutor(max_workers=METADATA_FETCH_WORKERS) as executor:
+            list(executor.map(fetch, still_missing))
+        changed = True
+
+    if changed:
+        metadata_index.save()
+    return metadata_index.get_many(symbols)
+
+def get_symbol_sectors(symbols):
+    """Bulk symbol -> sector lookup (ETF sector naming); unknown sectors map to None."""
+    return {
+        symbol: normalize_sector(entry.get('sector')) if entry else None
+        for symbol, entry in get_symbol_metadata(symbols).items()
+    }
+
+def search_symbols(query, limit=10):
+    """Ticker autocomplete over the metadata index (no upstream calls)."""
+    return metadata_index.search(query, limit)
+
+def refresh_stale_metadata(batch_size=METADATA_REFRESH_BATCH):
+    """
+    Re-fetch company info for the oldest metadata entries past their daily
+    refresh, and flush any index changes made on the request path.
+    """
+    stale = metadata_index.stale_symbols(limit=batch_size)
+    if not stale:
+        metadata_index.save()
+        return 0
+    refreshed = 0
+    for symbol in stale:
+        try:
+            rate_limit()
+            info = get_company_info(symbol, save_index=False)
+            if info:
+                metadata_index.upsert(symbol, _metadata_from_info(info))
+                refreshed += 1
+            else:
+                metadata_index.mark_missing(symbol)
+        except Exception as e:
+            logging.warning(f"Metadata refresh failed for {symbol}: {e}")
+            metadata_index.mark_missing(symbol)
+    metadata_index.save()
+    logging.info(f"Refreshed metadata for {refreshed}/{len(stale)} stale symbols")
+    return refreshed
+
+def get_historical_columns(symbol, period='1y', interval='1d'):
+    """
+    Historical prices as columns: {'date': [YYYY-MM-DD, ...], 'open', 'high',
+    'low', 'close': float arrays, 'volume': int array}, cached. Daily bars
+    come from the on-disk bar store, which only fetches missing ranges.
+    Returns None when there is no data; raises on fetch errors.
+    """
+    cache_key = get_cache_key('history_columns', f"{symbol}_{period}_{interval}")
+    cached_data = get_cached_data(cache_key)
+    
+    if cached_data:
+        return cached_data
+    
+    if history_store.serves(period, interval):
+        bars = history_store.load(
+            symbol, interval, period,
+            lambda start, end: _fetch_history_frame(symbol, interval, start, end)
+        )
+        if not len(bars):
+            logging.warning(f"No historical data available for {symbol}")
+            return None
+        columns = bars_to_columns(bars)
+        set_cached_data(cache_key, columns, CACHE_DURATION['history'])
+        return columns
+    
+    ticker = get_ticker(symbol)
+    hist = ticker.history(period=period, interval=interval)
+    
+    if hist.empty:
+        logging.warning(f"No historical data available for {symbol}")
+        return None
+    
+    columns = {
+        'date': hist.index.strftime('%Y-%m-%d').tolist(),
+        'open': hist['Open'].to_numpy(dtype=float),
+        'high': hist['High'].to_numpy(dtype=float),
+        'low': hist['Low'].to_numpy(dtype=float),
+        'close': hist['Close'].to_numpy(dtype=float),
+        'volume': hist['Volume'].to_numpy(dtype=np.int64),
+    }
+    set_cached_data(cache_key, columns, CACHE_DURATION['history'])
+    return columns
+
 def get_historical_prices(symbol, period='1y', interval='1d'):
     """
     Fetches historical price data with caching.
@@ -348,24 +725,18 @@ def get_historical_prices(symbol, period='1y', interval='1d'):
         return cached_data
     
     try:
-        ticker = get_ticker(symbol)
-        hist = ticker.history(period=period, interval=interval)
-        
-        if hist.empty:
-            logging.warning(f"No historical data available for {symbol}")
+        columns = get_historical_columns(symbol, period, interval)
+        if not columns:
             return []
         
         # Convert to list of dictionaries
-        historical_data = []
-        for index, row in hist.iterrows():
-            historical_data.append({
-                'date': index.strftime('%Y-%m-%d'),
-                'open': float(row['Open']),
-                'high': float(row['High']),
-                'low': float(row['Low']),
-                'close': float(row['Close']),
-                'volume': int(row['Volume'])
-            })
+        historical_data = [
+            {'date': date, 'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}
+            for date, open_, high, low, close, volume in zip(
+                columns['date'], columns['open'].tolist(), columns['high'].tolist(),
+                columns['low'].tolist(), columns['close'].tolist(), columns['volume'].tolist()
+            )
+        ]
         
         # Cache the historical data
         set_cached_data(cache_key, historical_data, CACHE_DURATION['history'])
@@ -386,23 +757,8 @@ def get_sector_performance():
         return cached_data
     
     try:
-        # Define major sectors and their representative ETFs
-        sectors = [
-            {'name': 'Technology', 'etf': 'XLK'},
-            {'name': 'Healthcare', 'etf': 'XLV'},
-            {'name': 'Financial', 'etf': 'XLF'},
-            {'name': 'Consumer Discretionary', 'etf': 'XLY'},
-            {'name': 'Energy', 'etf': 'XLE'},
-            {'name': 'Industrials', 'etf': 'XLI'},
-            {'name': 'Consumer Staples', 'etf': 'XLP'},
-            {'name': 'Materials', 'etf': 'XLB'},
-            {'name': 'Real Estate', 'etf': 'XLRE'},
-            {'name': 'Utilities', 'etf': 'XLU'},
-            {'name': 'Communication Services', 'etf': 'XLC'}
-        ]
-        
         sector_data = []
-        for sector in sectors:
+        for sector in SECTOR_ETFS:
             try:
                 ticker = get_ticker(sector['etf'])
                 info = ticker.info
@@ -438,7 +794,8 @@ def get_sector_performance():
 
 def get_trade_recommendation(symbol):
     """
-    Generates trade recommendations with caching.
+    Generates a trade recommendation with caching (a batch of one through
+    recommendations.get_trade_recommendations).
     """
     cache_key = get_cache_key('recommendation', symbol.upper())
     cached_data = get_cached_data(cache_key)
@@ -447,51 +804,149 @@ def get_trade_recommendation(symbol):
         return cached_data
     
     try:
-        # Get current stock data
-        quote = get_stock_quote(symbol)
-        if not quote:
+        # Imported here: recommendations builds on this module
+        from recommendations import get_trade_recommendations
+        result = get_trade_recommendations([symbol])
+        if not result['recommendations']:
             return {'signal': 'HOLD', 'confidence': 0, 'reasoning': 'Unable to fetch stock data'}
-        
-        # Simple recommendation logic (in real app, this would be more sophisticated)
-        change_percent = quote['changePercent']
-        
-        if change_percent > 2:
-            signal = 'BUY'
-            confidence = min(85, 70 + abs(change_percent))
-            reasoning = f"Strong positive momentum with {change_percent:.2f}% gain"
-        elif change_percent > 0.5:
-            signal = 'BUY'
-            confidence = 60
-            reasoning = f"Moderate positive movement with {change_percent:.2f}% gain"
-        elif change_percent < -2:
-            signal = 'SELL'
-            confidence = min(85, 70 + abs(change_percent))
-            reasoning = f"Strong negative momentum with {change_percent:.2f}% loss"
-        elif change_percent < -0.5:
-            signal = 'SELL'
-            confidence = 60
-            reasoning = f"Moderate negative movement with {change_percent:.2f}% loss"
-        else:
-            signal = 'HOLD'
-            confidence = 50
-            reasoning = f"Minimal movement ({change_percent:.2f}%), maintaining current position"
-        
-        recommendation = {
-            'signal': signal,
-            'confidence': confidence,
-            'reasoning': reasoning,
-            'current_price': quote['price'],
-            'change_percent': change_percent
-        }
-        
-        # Cache the recommendation
-        set_cached_data(cache_key, recommendation, CACHE_DURATION['quote'])
-        return recommendation
+        return result['recommendations'][0]
         
     except Exception as e:
         logging.error(f"Error generating trade recommendation for {symbol}: {e}")
         return {'signal': 'HOLD', 'confidence': 0, 'reasoning': 'Error occurred during analysis'}
 
+# Option contract selection for get_options_recommendation
+OPTIONS_TARGET_DTE = int(os.getenv('OPTIONS_TARGET_DTE', '30'))
+OPTIONS_MIN_DTE = int(os.getenv('OPTIONS_MIN_DTE', '7'))
+OPTIONS_MIN_DELTA = float(os.getenv('OPTIONS_MIN_DELTA', '0.25'))
+OPTIONS_MAX_DELTA = float(os.getenv('OPTIONS_MAX_DELTA', '0.60'))
+OPTIONS_MIN_OPEN_INTEREST = int(os.getenv('OPTIONS_MIN_OPEN_INTEREST', '100'))
+OPTIONS_MAX_SPREAD = float(os.getenv('OPTIONS_MAX_SPREAD', '0.15'))  # (ask - bid) / mid
+# Annualized drift per unit of recommendation score when valuing contracts
+OPTIONS_SIGNAL_DRIFT = float(os.getenv('OPTIONS_SIGNAL_DRIFT', '0.5'))
+
+OPTION_CHAIN_FIELDS = ('strike', 'bid', 'ask', 'lastPrice', 'volume', 'openInterest', 'impliedVolatility', 'percentChange')
+
+def get_listed_expirations(symbol):
+    """
+    Listed option expiry dates (YYYY-MM-DD) with caching.
+    """
+    cache_key = get_cache_key('expirations', symbol.upper())
+    cached_data = get_cached_data(cache_key)
+    
+    if cached_data:
+        return cached_data
+    
+    try:
+        rate_limit()
+        expirations = list(get_ticker(symbol.upper()).options)
+        if expirations:
+            set_cached_data(cache_key, expirations, CACHE_DURATION['expirations'])
+        return expirations
+    except Exception as e:
+        logging.error(f"Error fetching option expirations for {symbol}: {e}")
+        return []
+
+def _chain_columns(frame):
+    """One side of a yfinance option chain as NumPy columns (missing values -> 0)"""
+    columns = {'contractSymbol': frame['contractSymbol'].astype(str).tolist() if 'contractSymbol' in frame else [''] * len(frame)}
+    for field in OPTION_CHAIN_FIELDS:
+        values = pd.to_numeric(frame[field], errors='coerce') if field in frame else pd.Series(0.0, index=frame.index)
+        columns[field] = values.fillna(0).to_numpy(dtype=float)
+    return columns
+
+def get_option_chain(symbol, expiry):
+    """
+    Calls and puts for one listed expiry with caching, kept as columns
+    ({'calls': {field: array}, 'puts': {...}}) so callers can filter and
+    price whole sides at once.
+    """
+    cache_key = get_cache_key('options', f"{symbol.upper()}_{expiry}")
+    cached_data = get_cached_data(cache_key)
+    
+    if cached_data:
+        return cached_data
+    
+    try:
+        rate_limit()
+        chain = get_ticker(symbol.upper()).option_chain(expiry)
+        chain_data = {
+            'expiry': expiry,
+            'calls': _chain_columns(chain.calls),
+            'puts': _chain_columns(chain.puts),
+            'timestamp': time.time()
+        }
+        set_cached_data(cache_key, chain_data, CACHE_DURATION['options'])
+        return chain_data
+    except Exception as e:
+        logging.error(f"Error fetching option chain for {symbol} {expiry}: {e}")
+        return None
+
+def select_option_contract(symbol, spot, is_call, drift):
+    """
+    Pick the listed contract with the best expected return for a directional
+    view. Uses the listed expiry closest to OPTIONS_TARGET_DTE, keeps
+    contracts inside the delta band with enough open interest and a tight
+    spread, and ranks them by expected value at expiry (underlying growing at
+    `drift`, volatility at the contract's IV) per dollar of premium paid at
+    the ask. Returns None when nothing qualifies.
+    """
+    today = datetime.now().date()
+    dated = []
+    for expiry in get_listed_expirations(symbol):
+        try:
+            days = (datetime.strptime(expiry, '%Y-%m-%d').date() - today).days
+        except ValueError:
+            continue
+        if days >= OPTIONS_MIN_DTE:
+            dated.append((abs(days - OPTIONS_TARGET_DTE), days, expiry))
+    if not dated:
+        return None
+    _, days_to_expiry, expiry = min(dated)
+    
+    chain = get_option_chain(symbol, expiry)
+    side = chain['calls' if is_call else 'puts'] if chain else None
+    if not side or not len(side['strike']):
+        return None
+    
+    strike, bid, ask = side['strike'], side['bid'], side['ask']
+    iv, open_interest = side['impliedVolatility'], side['openInterest']
+    time_to_expiry = days_to_expiry / black_scholes.DAYS_PER_YEAR
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mid = (bid + ask) / 2
+        spread = np.where(mid > 0, (ask - bid) / mid, np.inf)
+        delta = black_scholes.greeks(spot, strike, time_to_expiry, iv, is_call)['delta']
+        eligible = (
+            (bid > 0) & (ask >= bid) & (iv > 0.01) &
+            (np.abs(delta) >= OPTIONS_MIN_DELTA) & (np.abs(delta) <= OPTIONS_MAX_DELTA) &
+            (open_interest >= OPTIONS_MIN_OPEN_INTEREST) & (spread <= OPTIONS_MAX_SPREAD)
+        )
+        if not eligible.any():
+            return None
+        payoff = black_scholes.expected_payoff(spot, strike, time_to_expiry, iv, is_call, drift)
+        expected_value = payoff * np.exp(-black_scholes.RISK_FREE_RATE * time_to_expiry) - ask
+        expected_return = np.where(eligible, expected_value / ask, -np.inf)
+    
+    best = int(np.argmax(expected_return))
+    return {
+        'symbol': side['contractSymbol'][best],
+        'strikePrice': float(strike[best]),
+        'type': 'call' if is_call else 'put',
+        'expiryDate': expiry,
+        'daysToExpiry': days_to_expiry,
+        'premium': round(float(ask[best]), 2),
+        'bid': round(float(bid[best]), 2),
+        'ask': round(float(ask[best]), 2),
+        'openInterest': int(open_interest[best]),
+        'volume': int(side['volume'][best]),
+        'impliedVolatility': round(float(iv[best]), 4),
+        'delta': round(float(delta[best]), 4),
+        'expectedValue': round(float(expected_value[best]) * 100, 2),  # per contract
+        'expectedReturn': round(float(expected_return[best]) * 100, 2),  # % of premium
+        'candidates': int(np.count_nonzero(eligible)),
+    }
+
 def get_options_recommendation(symbol):
     """
     Generates options trading recommendations with caching.
@@ -513,51 +968,29 @@ def get_options_recommendation(symbol):
         if not quote:
             return {'strategy': 'UNAVAILABLE', 'summary': 'Unable to fetch stock data'}
         
-        current_price = quote['price']
-        
-        # Generate mock options data (in real app, this would fetch real options data)
-        import random
-        
-        # Mock expiration dates (next 4 fridays)
-        from datetime import datetime, timedelta
-        expirations = []
-        current_date = datetime.now()
-        for i in range(4):
-            days_ahead = 4 - current_date.weekday()  # Friday is 4
-            if days_ahead <= 0:  # Target day already happened this week
-                days_ahead += 7
-            target_date = current_date + timedelta(days=days_ahead + (i * 7))
-            expirations.append(target_date.strftime('%Y-%m-%d'))
-        
-        best_expiration = expirations[0]  # Use nearest expiration
+        is_call = trade_rec['signal'] == 'BUY'
+        score = trade_rec.get('score', 0.2 if is_call else -0.2)
+        drift = black_scholes.RISK_FREE_RATE + score * OPTIONS_SIGNAL_DRIFT
+        contract_details = select_option_contract(symbol.upper(), quote['price'], is_call, drift)
         
-        if trade_rec['signal'] == 'BUY':
-            # Suggest a Long Call
-            strike_price = current_price * 1.05  # 5% OTM
-            strategy = 'Long Call'
-            summary = f"A bullish outlook for {symbol} suggests buying a call option. This strategy profits if the stock price rises significantly before the option expires."
-        else: # signal == 'SELL'
-            # Suggest a Long Put
-            strike_price = current_price * 0.95  # 5% OTM
-            strategy = 'Long Put'
-            summary = f"A bearish outlook for {symbol} suggests buying a put option. This strategy profits if the stock price falls significantly before the option expires."
-
-        contract_details = {
-            'symbol': f"{symbol}{best_expiration}C{strike_price:.0f}" if trade_rec['signal'] == 'BUY' else f"{symbol}{best_expiration}P{strike_price:.0f}",
-            'strikePrice': strike_price,
-            'type': 'call' if trade_rec['signal'] == 'BUY' else 'put',
-            'expiryDate': best_expiration,
-            'premium': current_price * 0.05,  # 5% of stock price as premium
-            'openInterest': random.randint(100, 1000),
-            'volume': random.randint(50, 500),
-        }
-
-        recommendation = {
-            'strategy': strategy,
-            'summary': summary,
-            'contract': contract_details,
-            'confidence': trade_rec['confidence']
-        }
+        if contract_details is None:
+            recommendation = {
+                'strategy': 'UNAVAILABLE',
+                'summary': f"No listed {'call' if is_call else 'put'} contracts for {symbol} pass the liquidity, delta and spread filters."
+            }
+        else:
+            if is_call:
+                strategy = 'Long Call'
+                summary = f"A bullish outlook for {symbol} suggests buying a call option. This strategy profits if the stock price rises significantly before the option expires."
+            else:
+                strategy = 'Long Put'
+                summary = f"A bearish outlook for {symbol} suggests buying a put option. This strategy profits if the stock price falls significantly before the option expires."
+            recommendation = {
+                'strategy': strategy,
+                'summary': summary,
+                'contract': contract_details,
+                'confidence': trade_rec['confidence']
+            }
         
         # Cache the options recommendation
         set_cached_data(cache_key, recommendation, CACHE_DURATION['quote'])
@@ -567,336 +1000,170 @@ def get_options_recommendation(symbol):
         logging.error(f"Error generating options recommendation for {symbol}: {e}")
         return { 'strategy': 'UNAVAILABLE', 'summary': 'An error occurred during analysis.' }
 
-def get_market_news(limit=10):
+# Tickers whose news feeds are merged into general market news
+MARKET_NEWS_SOURCES = ['^GSPC', 'AAPL', 'MSFT', 'NVDA', 'TSLA']
+# Stop waiting for more sources once this many articles have arrived...
+MARKET_NEWS_MIN_ITEMS = int(os.getenv('YF_MARKET_NEWS_MIN_ITEMS', '10'))
+# ...or once this deadline (seconds) passes; stragglers merge in when they finish
+MARKET_NEWS_DEADLINE = float(os.getenv('YF_MARKET_NEWS_DEADLINE', '3'))
+NEWS_FETCH_WORKERS = int(os.getenv('YF_NEWS_FETCH_WORKERS', '8'))
+# Bulk (watchlist) news: cap on symbols per request and how long to wait for fetches
+BULK_NEWS_MAX_SYMBOLS = int(os.getenv('YF_BULK_NEWS_MAX_SYMBOLS', '50'))
+BULK_NEWS_DEADLINE = float(os.getenv('YF_BULK_NEWS_DEADLINE', '5'))
+
+news_executor = ThreadPoolExecutor(max_workers=NEWS_FETCH_WORKERS, thread_name_prefix='news')
+MARKET_NEWS_LOCK = Lock()
+
+def _fetch_news_items(source):
+    """Fetch and normalize one ticker's news; stock tickers also fill their own feed."""
+    rate_limit()
+    symbol = None if source.startswith('^') else source
+    items = news.normalize_news(get_ticker(source).news, symbol)
+    if symbol:
+        news.news_store.add(symbol, items)
+    return items
+
+def _merge_late_market_news(future):
+    """Merge a source that finished after the deadline into the market feed."""
+    try:
+        items = future.result()
+        if items:
+            news.news_store.add(news.MARKET_FEED, items)
+            logging.info(f"Merged {len(items)} late market news items")
+    except Exception as e:
+        logging.warning(f"Late market news source failed: {e}")
+
+def _refresh_market_news():
+    """Query all market news sources concurrently and merge what arrives before the deadline."""
+    futures = {news_executor.submit(_fetch_news_items, source): source for source in MARKET_NEWS_SOURCES}
+    pending = set(futures)
+    collected = []
+    deadline = time.time() + MARKET_NEWS_DEADLINE
+    
+    while pending:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                items = future.result()
+                collected.extend(items)
+                logging.info(f"Fetched {len(items)} news items from {futures[future]}")
+            except Exception as e:
+                logging.warning(f"Failed to fetch news from {futures[future]}: {e}")
+        if len(news.dedupe_items(collected)) >= MARKET_NEWS_MIN_ITEMS:
+            break
+    
+    for future in pending:
+        future.add_done_callback(_merge_late_market_news)
+    
+    collected = news.dedupe_items(collected)
+    if not collected:
+        logging.info("No real news available, using fallback news")
+    # Marks the feed fresh even when empty, so fallback isn't refetched every call
+    news.news_store.add(news.MARKET_FEED, collected)
+
+def get_market_news(limit=10, before=None):
     """
-    Fetches real market news from Yahoo Finance with caching.
+    Fetches real market news from Yahoo Finance, served from the news store.
+    Pass `before` (an article ID or timestamp) to page further back.
     """
-    cache_key = get_cache_key('news', f"market_{limit}")
-    cached_data = get_cached_data(cache_key)
+    store = news.news_store
+    if not store.is_fresh(news.MARKET_FEED, CACHE_DURATION['news']):
+        with MARKET_NEWS_LOCK:
+            # Another request may have refreshed the feed while we waited
+            if not store.is_fresh(news.MARKET_FEED, CACHE_DURATION['news']):
+                _refresh_market_news()
     
-    if cached_data:
-        return cached_data
+    now = time.time()
+    formatted_news = [news.render_market_item(item, now) for item in store.query(news.MARKET_FEED, limit, before)]
     
-    try:
-        # Try multiple approaches to get real news from Yahoo Finance
-        news_data = None
-        
-        # Approach 1: Try S&P 500
+    # If we don't have enough real news, supplement the first page with fallback
+    if len(formatted_news) < limit and not before:
+        formatted_news.extend(get_fallback_news(limit - len(formatted_news)))
+    
+    return formatted_news[:limit]
+
+def get_symbol_news(symbol, limit=10, before=None):
+    """
+    Fetches real news for a specific symbol from Yahoo Finance, served from the news store.
+    Pass `before` (an article ID or timestamp) to page further back.
+    """
+    store = news.news_store
+    if not store.is_fresh(symbol, CACHE_DURATION['news']):
+        items = []
         try:
-            ticker = yf.Ticker("^GSPC")
-            news_data = ticker.news
-            if news_data and len(news_data) > 0:
-                logging.info(f"Successfully fetched {len(news_data)} news items from S&P 500")
+            rate_limit()  # Apply rate limiting
+            ticker = yf.Ticker(symbol)
+            items = news.normalize_news(ticker.news, symbol)
+            if not items:
+                logging.info(f"No real news available for {symbol}, using fallback news")
         except Exception as e:
-            logging.warning(f"Failed to fetch news from S&P 500: {e}")
-        
-        # Approach 2: Try AAPL if S&P 500 failed
-        if not news_data or len(news_data) == 0:
-            try:
-                ticker = yf.Ticker("AAPL")
-                news_data = ticker.news
-                if news_data and len(news_data) > 0:
-                    logging.info(f"Successfully fetched {len(news_data)} news items from AAPL")
-            except Exception as e:
-                logging.warning(f"Failed to fetch news from AAPL: {e}")
-        
-        # Approach 3: Try MSFT if AAPL failed
-        if not news_data or len(news_data) == 0:
-            try:
-                ticker = yf.Ticker("MSFT")
-                news_data = ticker.news
-                if news_data and len(news_data) > 0:
-                    logging.info(f"Successfully fetched {len(news_data)} news items from MSFT")
-            except Exception as e:
-                logging.warning(f"Failed to fetch news from MSFT: {e}")
-        
-        # Approach 4: Try NVDA if MSFT failed
-        if not news_data or len(news_data) == 0:
-            try:
-                ticker = yf.Ticker("NVDA")
-                news_data = ticker.news
-                if news_data and len(news_data) > 0:
-                    logging.info(f"Successfully fetched {len(news_data)} news items from NVDA")
-            except Exception as e:
-                logging.warning(f"Failed to fetch news from NVDA: {e}")
-        
-        # Approach 5: Try TSLA if NVDA failed
-        if not news_data or len(news_data) == 0:
-            try:
-                ticker = yf.Ticker("TSLA")
-                news_data = ticker.news
-                if news_data and len(news_data) > 0:
-                    logging.info(f"Successfully fetched {len(news_data)} news items from TSLA")
-            except Exception as e:
-                logging.warning(f"Failed to fetch news from TSLA: {e}")
-        
-        if not news_data or len(news_data) == 0:
-            # If still no news, return comprehensive fallback data
-            logging.info("No real news available, using fallback news")
-            fallback_news = get_fallback_news(limit)
-            set_cached_data(cache_key, fallback_news, CACHE_DURATION['news'])
-            return fallback_news
-        
-        # Process and format the news data
-        formatted_news = []
-        for i, news_item in enumerate(news_data[:limit]):
-            # Check if news item has the new structure
-            if 'content' in news_item:
-                content = news_item['content']
-                title = content.get('title', '')
-                summary = content.get('summary', '')
-                
-                # Skip items with no title or summary
-                if not title or not summary:
-                    continue
-                    
-                # Extract timestamp and convert to relative time
-                pub_date = content.get('pubDate', '')
-                if pub_date:
-                    try:
-                        publish_time = datetime.fromisoformat(pub_date.replace('Z', '+00:00'))
-                        time_diff = datetime.now(publish_time.tzinfo) - publish_time
-                        
-                        if time_diff.total_seconds() < 3600:  # Less than 1 hour
-                            minutes = int(time_diff.total_seconds() / 60)
-                            time_ago = f"{minutes} minute{'s' if minutes != 1 else ''} ago"
-                        elif time_diff.total_seconds() < 86400:  # Less than 24 hours
-                            hours = int(time_diff.total_seconds() / 3600)
-                            time_ago = f"{hours} hour{'s' if hours != 1 else ''} ago"
-                        else:
-                            days = int(time_diff.total_seconds() / 86400)
-                            time_ago = f"{days} day{'s' if days != 1 else ''} ago"
-                    except:
-                        time_ago = "Recently"
-                else:
-                    time_ago = "Recently"
-                
-                # Get the link from the new structure
-                click_through_url = content.get('clickThroughUrl', {})
-                link = click_through_url.get('url', '') if click_through_url else ''
-                
-                # If no valid link, create a search link for the title
-                if not link or not link.startswith('http'):
-                    link = f"https://finance.yahoo.com/news?q={title.replace(' ', '+')}"
-                
-                # Get the provider/source
-                provider = content.get('provider', {})
-                source = provider.get('displayName', 'Yahoo Finance') if provider else 'Yahoo Finance'
-                
-                formatted_news.append({
-                    'title': title,
-                    'description': summary,
-                    'timeAgo': time_ago,
-                    'link': link,
-                    'source': source
-                })
-            else:
-                # Handle old structure for backward compatibility
-                title = news_item.get('title', '')
-                summary = news_item.get('summary', '')
-                
-                # Skip items with no title or summary
-                if not title or not summary:
-                    continue
-                    
-                # Extract timestamp and convert to relative time
-                timestamp = news_item.get('providerPublishTime', 0)
-                if timestamp:
-                    publish_time = datetime.fromtimestamp(timestamp)
-                    time_diff = datetime.now() - publish_time
-                    
-                    if time_diff.total_seconds() < 3600:  # Less than 1 hour
-                        minutes = int(time_diff.total_seconds() / 60)
-                        time_ago = f"{minutes} minute{'s' if minutes != 1 else ''} ago"
-                    elif time_diff.total_seconds() < 86400:  # Less than 24 hours
-                        hours = int(time_diff.total_seconds() / 3600)
-                        time_ago = f"{hours} hour{'s' if hours != 1 else ''} ago"
-                    else:
-                        days = int(time_diff.total_seconds() / 86400)
-                        time_ago = f"{days} day{'s' if days != 1 else ''} ago"
-                else:
-                    time_ago = "Recently"
-                
-                # Use the original link from Yahoo Finance if available
-                original_link = news_item.get('link', '')
-                if original_link and original_link.startswith('http'):
-                    # Use the original Yahoo Finance link
-                    link = original_link
-                else:
-                    # If no valid link, create a search link for the title
-                    link = f"https://finance.yahoo.com/news?q={title.replace(' ', '+')}"
-                
-                formatted_news.append({
-                    'title': title,
-                    'description': summary,
-                    'timeAgo': time_ago,
-                    'link': link,
-                    'source': news_item.get('publisher', 'Yahoo Finance')
-                })
-        
-        # If we don't have enough real news, supplement with fallback
-        if len(formatted_news) < limit:
-            fallback_news = get_fallback_news(limit - len(formatted_news))
-            formatted_news.extend(fallback_news)
-        
-        final_news = formatted_news[:limit]
-        
-        # Cache the news data
-        set_cached_data(cache_key, final_news, CACHE_DURATION['news'])
-        return final_news
-        
-    except Exception as e:
-        logging.error(f"Error fetching market news: {e}")
-        # Return comprehensive fallback data
-        fallback_news = get_fallback_news(limit)
-        set_cached_data(cache_key, fallback_news, CACHE_DURATION['news'])
-        return fallback_news
+            logging.error(f"Error fetching news for {symbol}: {e}")
+        store.add(symbol, items)
+    
+    formatted_news = [news.render_symbol_item(item, symbol) for item in store.query(symbol, limit, before)]
+    
+    # If we don't have enough real news, supplement the first page with fallback
+    if len(formatted_news) < limit and not before:
+        formatted_news.extend(get_symbol_fallback_news(symbol, limit - len(formatted_news)))
+    
+    return formatted_news[:limit]
 
-def get_symbol_news(symbol, limit=10):
+def get_bulk_symbol_news(symbols, limit=10):
     """
-    Fetches real news for a specific symbol from Yahoo Finance with caching.
+    News for many symbols in one call (watchlists).
+
+    Symbols already fresh in the news store are served from it; the rest are
+    fetched concurrently under the rate limiter. Fetches that miss the
+    deadline keep running and fill the store for the next call.
+
+    Returns a merged newest-first feed of real articles plus per-symbol
+    groupings (supplemented with fallback news like /news/<symbol>).
     """
-    cache_key = get_cache_key('news', f"symbol_{symbol}_{limit}")
-    cached_data = get_cached_data(cache_key)
+    symbols = list(dict.fromkeys(s.upper().strip() for s in symbols if isinstance(s, str) and s.strip()))
+    store = news.news_store
     
-    if cached_data:
-        return cached_data
+    stale = [s for s in symbols if not store.is_fresh(s, CACHE_DURATION['news'])]
+    if stale:
+        logging.info(f"Fetching news for {len(stale)} of {len(symbols)} symbols")
+        futures = {news_executor.submit(_fetch_news_items, symbol): symbol for symbol in stale}
+        done, _ = wait(futures, timeout=BULK_NEWS_DEADLINE)
+        for future in done:
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Error fetching news for {futures[future]}: {e}")
+                # Cache the failure like get_symbol_news does, serving fallback until the TTL passes
+                store.add(futures[future], [])
     
-    try:
-        rate_limit()  # Apply rate limiting
-        ticker = yf.Ticker(symbol)
-        news_data = ticker.news
-        
-        if not news_data or len(news_data) == 0:
-            # If no real news, return symbol-specific fallback
-            logging.info(f"No real news available for {symbol}, using fallback news")
-            fallback_news = get_symbol_fallback_news(symbol, limit)
-            set_cached_data(cache_key, fallback_news, CACHE_DURATION['news'])
-            return fallback_news
-        
-        # Process and format the news data
-        formatted_news = []
-        for i, news_item in enumerate(news_data[:limit]):
-            # Check if news item has the new structure
-            if 'content' in news_item:
-                content = news_item['content']
-                title = content.get('title', '')
-                summary = content.get('summary', '')
-                
-                # Skip items with no title or summary
-                if not title or not summary:
-                    continue
-                    
-                # Extract timestamp and convert to relative time
-                pub_date = content.get('pubDate', '')
-                if pub_date:
-                    try:
-                        publish_time = datetime.fromisoformat(pub_date.replace('Z', '+00:00'))
-                        time_diff = datetime.now() - publish_time.replace(tzinfo=None)
-                        
-                        if time_diff.total_seconds() < 3600:  # Less than 1 hour
-                            minutes = int(time_diff.total_seconds() / 60)
-                            time_ago = f"{minutes} minute{'s' if minutes != 1 else ''} ago"
-                        elif time_diff.total_seconds() < 86400:  # Less than 24 hours
-                            hours = int(time_diff.total_seconds() / 3600)
-                            time_ago = f"{hours} hour{'s' if hours != 1 else ''} ago"
-                        else:
-                            days = int(time_diff.total_seconds() / 86400)
-                            time_ago = f"{days} day{'s' if days != 1 else ''} ago"
-                    except Exception:
-                        time_ago = "Recently"
-                else:
-                    time_ago = "Recently"
-                
-                # Use the original link from content if available
-                clickThroughUrl = content.get('clickThroughUrl', {})
-                link = clickThroughUrl.get('url', '') if clickThroughUrl else ''
-                
-                # If no valid link, create a search link for the title
-                if not link or not link.startswith('http'):
-                    link = f"https://finance.yahoo.com/quote/{symbol}/news"
-                
-                # Get the provider/source
-                provider = content.get('provider', {})
-                source = provider.get('displayName', 'Yahoo Finance') if provider else 'Yahoo Finance'
-                
-                formatted_news.append({
-                    'title': title,
-                    'url': link,
-                    'publisher': source,
-                    'publishedAt': pub_date,
-                    'summary': summary,
-                    'imageUrl': content.get('thumbnail', {}).get('url') if content.get('thumbnail') else None
-                })
-            else:
-                # Handle old structure for backward compatibility
-                title = news_item.get('title', '')
-                summary = news_item.get('summary', '')
-                
-                # Skip items with no title or summary
-                if not title or not summary:
-                    continue
-                    
-                # Extract timestamp and convert to relative time
-                timestamp = news_item.get('providerPublishTime', 0)
-                published_at = None
-                if timestamp:
-                    publish_time = datetime.fromtimestamp(timestamp)
-                    published_at = publish_time.isoformat()
-                
-                # Use the original link from Yahoo Finance if available
-                original_link = news_item.get('link', '')
-                if original_link and original_link.startswith('http'):
-                    link = original_link
-                else:
-                    link = f"https://finance.yahoo.com/quote/{symbol}/news"
-                
-                formatted_news.append({
-                    'title': title,
-                    'url': link,
-                    'publisher': news_item.get('publisher', 'Yahoo Finance'),
-                    'publishedAt': published_at,
-                    'summary': summary,
-                    'imageUrl': None
-                })
-        
-        # If we don't have enough real news, supplement with fallback
-        if len(formatted_news) < limit:
-            fallback_news = get_symbol_fallback_news(symbol, limit - len(formatted_news))
-            formatted_news.extend(fallback_news)
-        
-        final_news = formatted_news[:limit]
-        
-        # Cache the news data
-        set_cached_data(cache_key, final_news, CACHE_DURATION['news'])
-        return final_news
-        
-    except Exception as e:
-        logging.error(f"Error fetching news for {symbol}: {e}")
-        # Return symbol-specific fallback data
-        fallback_news = get_symbol_fallback_news(symbol, limit)
-        set_cached_data(cache_key, fallback_news, CACHE_DURATION['news'])
-        return fallback_news
+    requested = set(symbols)
+    merged = {}
+    by_symbol = {}
+    for symbol in symbols:
+        items = store.query(symbol, limit)
+        group = [news.render_symbol_item(item, symbol) for item in items]
+        if len(group) < limit:
+            group.extend(get_symbol_fallback_news(symbol, limit - len(group)))
+        by_symbol[symbol] = group
+        for item in items:
+            merged.setdefault(item.id, (item, symbol))
+    
+    feed = []
+    for item, symbol in sorted(merged.values(), key=lambda pair: -(pair[0].published_ts or 0))[:limit]:
+        rendered = news.render_symbol_item(item, symbol)
+        rendered['symbols'] = [s for s in item.symbols if s in requested]
+        feed.append(rendered)
+    
+    return {'feed': feed, 'bySymbol': by_symbol}
 
 def get_symbol_fallback_news(symbol, limit=10):
     """
     Provides symbol-specific fallback news when Yahoo Finance API is unavailable.
     """
     # Get company name for more realistic news titles
-    company_names = {
-        'AAPL': 'Apple',
-        'MSFT': 'Microsoft', 
-        'GOOGL': 'Google',
-        'AMZN': 'Amazon',
-        'TSLA': 'Tesla',
-        'NVDA': 'NVIDIA',
-        'META': 'Meta',
-        'NFLX': 'Netflix',
-        'AMD': 'AMD',
-        'INTC': 'Intel'
-    }
-    
-    company_name = company_names.get(symbol, symbol)
+    company_name = metadata_index.get_name(symbol) or symbol
     
     fallback_news = []
     now = datetime.now()
@@ -1114,9 +1381,21 @@ def get_options_expirations(symbol):
         List of expiration dates
     """
     try:
-        # Generate next 4 Fridays as expiration dates
-        expirations = []
         current_date = datetime.now()
+        listed = get_listed_expirations(symbol)
+        if listed:
+            expirations = []
+            for date in listed:
+                expiration_date = datetime.strptime(date, '%Y-%m-%d')
+                expirations.append({
+                    'date': date,
+                    'daysToExpiry': (expiration_date.date() - current_date.date()).days,
+                    'formatted': expiration_date.strftime('%b %d, %Y')
+                })
+            return expirations
+        
+        # No listed options data: generate next 4 Fridays as expiration dates
+        expirations = []
         
         for i in range(4):
             # Find next Friday
@@ -1152,3 +1431,5 @@ def periodic_cache_cleanup():
     """Periodically clean up expired cache entries."""
     cleanup_expired_cache()
     rotate_cache_if_necessary()
+    refresh_stale_metadata()
+    news.news_store.prune()